@@ -4,8 +4,10 @@ from datetime import timezone
 import os
 from pathlib import Path
 import yaml
+import asyncio
 import json
 import hashlib
+from itertools import islice
 
 from ..api.schemas import (
     Project,
@@ -17,9 +19,17 @@ from ..api.schemas import (
     AggregationSummaryResponse,
     AggregationResultData,
     AggregationGroupResult,
+    VariationSet,
 )
-from ..engine.run import run_experiment
-from ..engine.storage import ProjectModel, JobModel, TaskModel, TaskStatus, AggregationResultModel
+from ..engine.run import run_experiment, reevaluate_experiment
+from ..engine.resume import prepare_resume, prepare_rerun_failed, job_stopped
+from ..engine.events import JobStatusSink
+from ..engine.task_source import TaskSource, group_tasks
+from ..engine.storage import ProjectModel, JobModel, TaskModel, TaskStatus, AggregationResultModel, VariationModel
+
+
+# Tasks of a group's source listed by get_available_tasks
+SOURCE_PREVIEW_SIZE = 100
 
 
 def background_job(
@@ -27,14 +37,16 @@ def background_job(
     job_id: str,
     challenge_id: str | None = None,
     group_id: str | None = None,
+    finished: Dict[str, TaskModel] | None = None,
+    reevaluate_job_id: str | None = None,
 ):
     """
     Execute a background job to run an experiment for the specified project.
 
     This function performs the following steps:
     1. Retrieves the project and job details from the database.
-    2. Runs the experiment and iterates through status updates.
-    3. Updates the job status in the database based on experiment progress.
+    2. Runs the experiment, consuming its progress events.
+    3. Updates the job status in the database through a JobStatusSink.
     4. Handles any exceptions by marking the job as failed.
 
     Args:
@@ -42,6 +54,10 @@ def background_job(
         job_id (str): The ID of the job to execute.
         challenge_id (str | None): If provided, only run the task with this challenge ID.
         group_id (str | None): If provided, only run tasks from the specified group.
+        finished (Dict[str, TaskModel] | None): Tasks finished in an earlier run,
+            keyed by challenge ID, carried over instead of running them again.
+        reevaluate_job_id (str | None): If provided, evaluate the stored outputs
+            of this job instead of running the tasks.
     """
     try:
         # Retrieve the project and job from the database
@@ -56,21 +72,30 @@ def background_job(
             config_file = Path(config_path).name
             project_dict["config_file"] = config_file
 
-        # Run the experiment and handle status updates
-        for update in run_experiment(project_dict, job, challenge_id, group_id):
-            # Add status map from TaskModel to the update
-            update["status_map"] = TaskModel.get_status_map(job_id)
-
-            # Update job status in the database
-            job.update(
-                status=update["status"],
-                total_tasks=update.get("total", 0),
-                current_task=update.get("current"),
-                details=update,
+        # Run the experiment; the status sink keeps the job row up to date
+        if reevaluate_job_id:
+            updates = reevaluate_experiment(
+                project_dict, job, reevaluate_job_id, sinks=[JobStatusSink(job)]
             )
-
-        # Mark the job as finished upon successful completion
-        job.finish()
+        else:
+            updates = run_experiment(
+                project_dict,
+                job,
+                challenge_id,
+                group_id,
+                sinks=[JobStatusSink(job)],
+                finished=finished,
+            )
+        update = None
+        for update in updates:
+            pass
+
+        # Mark the job as finished (or cancelled) upon completion
+        job.finish(
+            TaskStatus.CANCELLED
+            if update and update["status"] == TaskStatus.CANCELLED
+            else TaskStatus.COMPLETED
+        )
     except Exception as e:
         # raise e
         # Handle exceptions and update the job as failed
@@ -134,6 +159,158 @@ async def create_job(project_id: str, background_tasks: BackgroundTasks):
     )
 
 
+@api_router.post("/jobs/{project_id}/{job_id}/resume", response_model=JobDetails)
+async def resume_job(
+    project_id: str,
+    job_id: str,
+    background_tasks: BackgroundTasks,
+    force: bool = Query(False),
+):
+    """
+    Resume an interrupted job, running only the tasks that have not finished.
+
+    Args:
+        project_id (str): The ID of the project.
+        job_id (str): The ID of the job to resume.
+        background_tasks (BackgroundTasks): FastAPI BackgroundTasks for asynchronous
+        execution.
+        force (bool): Resume a job that still looks running, e.g. after its
+        process was killed.
+
+    Returns:
+        JobDetails: Details of the resumed job.
+
+    Raises:
+        HTTPException: If the project or job is not found, or 409 if the job
+        is still running.
+    """
+    job = JobModel.get_status(project_id, job_id)
+    if not job:
+        raise HTTPException(status_code=404, detail="Job not found")
+    if not force and not job_stopped(job):
+        raise HTTPException(status_code=409, detail="Job is still running")
+
+    finished = prepare_resume(job_id)
+    background_tasks.add_task(background_job, project_id, job_id, finished=finished)
+
+    return JobDetails(
+        project_id=project_id,
+        job_id=job_id,
+        status=TaskStatus.STARTING,
+        total_tasks=0,
+        task_status_map={task.id: task.status for task in finished.values()},
+        details={},
+    )
+
+
+@api_router.post("/jobs/{project_id}/{job_id}/rerun-failed", response_model=JobDetails)
+async def rerun_failed_tasks(
+    project_id: str, job_id: str, background_tasks: BackgroundTasks
+):
+    """
+    Start a new job that carries over the passing tasks of a job and runs the
+    failed (and missing) ones again.
+
+    Args:
+        project_id (str): The ID of the project.
+        job_id (str): The ID of the job whose failures are rerun.
+        background_tasks (BackgroundTasks): FastAPI BackgroundTasks for asynchronous
+        execution.
+
+    Returns:
+        JobDetails: Details of the new job.
+
+    Raises:
+        HTTPException: If the project or job is not found.
+    """
+    if not JobModel.get_status(project_id, job_id):
+        raise HTTPException(status_code=404, detail="Job not found")
+
+    new_job_id = JobModel.start(project_id)
+    finished = prepare_rerun_failed(job_id, new_job_id)
+    background_tasks.add_task(background_job, project_id, new_job_id, finished=finished)
+
+    return JobDetails(
+        project_id=project_id,
+        job_id=new_job_id,
+        status=TaskStatus.STARTING,
+        total_tasks=0,
+        task_status_map={task.id: task.status for task in finished.values()},
+        details={},
+    )
+
+
+@api_router.post("/jobs/{project_id}/{job_id}/reevaluate", response_model=JobDetails)
+async def reevaluate_job(
+    project_id: str, job_id: str, background_tasks: BackgroundTasks
+):
+    """
+    Start a new job that evaluates the stored outputs of a job again under the
+    current config, without running the tasks.
+
+    Args:
+        project_id (str): The ID of the project.
+        job_id (str): The ID of the job whose outputs are re-evaluated.
+        background_tasks (BackgroundTasks): FastAPI BackgroundTasks for asynchronous
+        execution.
+
+    Returns:
+        JobDetails: Details of the new job.
+
+    Raises:
+        HTTPException: If the project or job is not found.
+    """
+    if not JobModel.get_status(project_id, job_id):
+        raise HTTPException(status_code=404, detail="Job not found")
+
+    new_job_id = JobModel.start(project_id)
+    background_tasks.add_task(
+        background_job, project_id, new_job_id, reevaluate_job_id=job_id
+    )
+
+    return JobDetails(
+        project_id=project_id,
+        job_id=new_job_id,
+        status=TaskStatus.STARTING,
+        total_tasks=0,
+        task_status_map={},
+        details={"reevaluated_from": job_id},
+    )
+
+
+@api_router.post("/jobs/{project_id}/{job_id}/cancel", response_model=JobDetails)
+async def cancel_job(project_id: str, job_id: str):
+    """
+    Cancel a running job: the tasks in flight finish, and no new tasks start.
+    The job ends with the "cancelled" status once drained.
+
+    Args:
+        project_id (str): The ID of the project.
+        job_id (str): The ID of the job to cancel.
+
+    Returns:
+        JobDetails: Details of the job.
+
+    Raises:
+        HTTPException: If the job is not found, or 409 if it has already finished.
+    """
+    job = JobModel.get_status(project_id, job_id)
+    if not job:
+        raise HTTPException(status_code=404, detail="Job not found")
+    if not JobModel.request_cancel(job_id):
+        raise HTTPException(status_code=409, detail="Job has already finished")
+
+    job = JobModel.find(job_id)
+    return JobDetails(
+        project_id=project_id,
+        job_id=job_id,
+        status=job.status,
+        total_tasks=job.total_tasks or 0,
+        task_status_map=(job.details or {}).get("status_map", {}),
+        details=job.details or {},
+    )
+
+
 @api_router.get("/jobs/{project_id}/{job_id}/status", response_model=JobDetails)
 async def get_job_status(project_id: str, job_id: str):
     """
@@ -284,6 +461,8 @@ def _get_task_details(task: TaskModel):
         eval_score=task.eval_score,
         eval_details=task.eval_details,
         eval_logs={'logs': task.eval_logs} if task.eval_logs else None,
+        task_attempts=task.task_attempts,
+        eval_attempts=task.eval_attempts,
         created_at=task.created_at.replace(tzinfo=timezone.utc).isoformat(),
         executed_at=(
             task.executed_at.replace(tzinfo=timezone.utc).isoformat()
@@ -472,6 +651,32 @@ def _process_task(task: Dict[str, Any], group_id: str = None) -> Dict[str, Any]:
     return task_info
 
 
+def _group_info(group: Dict[str, Any], project_folder: Path) -> Dict[str, Any]:
+    """
+    Describe a group of config.yaml with its tasks; a source is streamed and
+    only its first tasks are listed.
+    """
+    group_id = group.get("id", "")
+    tasks = group_tasks(group, project_folder) or []
+    task_list = [
+        _process_task(task, group_id)
+        for task in islice(tasks, SOURCE_PREVIEW_SIZE)
+    ]
+
+    group_info = {
+        "id": group_id,
+        "name": group.get("name", ""),
+        "description": group.get("description", ""),
+        "task_count": (
+            tasks.count() if isinstance(tasks, TaskSource) else len(tasks)
+        ),
+        "tasks": task_list,
+    }
+    if isinstance(tasks, TaskSource):
+        group_info["source"] = group["source"]["path"]
+    return group_info
+
+
 @api_router.get("/tasks/{project_id}")
 async def get_available_tasks(project_id: str):
     """
@@ -509,26 +714,11 @@ async def get_available_tasks(project_id: str):
         # Extract root-level tasks only
         root_tasks = [_process_task(task) for task in config.get("tasks", [])]
 
-        # Extract groups and their tasks
-        groups = []
-        if "groups" in config:
-            for group in config["groups"]:
-                group_id = group.get("id", "")
-
-                # Process tasks in this group
-                group_tasks = [
-                    _process_task(task, group_id) for task in group.get("tasks", [])
-                ]
-
-                # Create group info
-                group_info = {
-                    "id": group_id,
-                    "name": group.get("name", ""),
-                    "description": group.get("description", ""),
-                    "task_count": len(group_tasks),
-                    "tasks": group_tasks,
-                }
-                groups.append(group_info)
+        # Extract groups and their tasks; sources are read off the event loop
+        groups = [
+            await asyncio.to_thread(_group_info, group, project_folder)
+            for group in config.get("groups", [])
+        ]
 
         return {"tasks": root_tasks, "groups": groups}
     except Exception as e:
@@ -651,3 +841,53 @@ async def get_job_aggregation_by_type(job_id: str, aggregation_type: str):
         )
     
     return _convert_aggregation_to_response(target_aggregation)
+
+
+@api_router.get("/variations", response_model=List[VariationSet])
+async def list_variation_sets():
+    """
+    Retrieve the stored sets of rephrased input variations.
+
+    Returns:
+        List[VariationSet]: One entry per input and rephrase prompt version.
+    """
+    return [VariationSet(**variation_set) for variation_set in VariationModel.list_sets()]
+
+
+@api_router.post("/variations/regenerate")
+async def regenerate_variations(
+    input_hash: str | None = Query(None),
+    include_pinned: bool = Query(False),
+):
+    """
+    Drop stored variations so that the next run generates new ones.
+
+    Args:
+        input_hash (str | None): Input hash (or prefix) of the set, all sets if omitted.
+        include_pinned (bool): Whether to drop pinned sets too. Defaults to False.
+
+    Returns:
+        Dict with the number of variations deleted.
+    """
+    return {"deleted": VariationModel.clear(input_hash, include_pinned)}
+
+
+@api_router.put("/variations/{input_hash}/pin")
+async def pin_variations(input_hash: str, pinned: bool = Query(True)):
+    """
+    Pin (or unpin) a variation set, so that runs reuse it as is.
+
+    Args:
+        input_hash (str): Input hash (or prefix) of the set.
+        pinned (bool): Whether to pin or unpin the set. Defaults to True.
+
+    Returns:
+        Dict with the number of variations updated.
+
+    Raises:
+        HTTPException: If no variations are stored for the input.
+    """
+    updated = VariationModel.set_pinned(input_hash, pinned)
+    if not updated:
+        raise HTTPException(status_code=404, detail="Variations not found")
+    return {"input_hash": input_hash, "pinned": pinned, "updated": updated}
@@ -1,5 +1,5 @@
 from pydantic import BaseModel, Field
-from typing import Optional, Dict, List
+from typing import Optional, Dict, List, Any
 
 
 class Project(BaseModel):
@@ -61,6 +61,8 @@ class TaskDetails(BaseModel):
     eval_score: Optional[float] = None
     eval_details: Optional[Dict] = None
     eval_logs: Optional[Dict] = None
+    task_attempts: Optional[int] = None
+    eval_attempts: Optional[int] = None
     created_at: str
     executed_at: Optional[str] = None
     evaluated_at: Optional[str] = None
@@ -123,3 +125,15 @@ class AggregationSummaryResponse(BaseModel):
     aggregations: List[AggregationResultResponse]
     task_count: int
     total_tasks: int
+
+
+class VariationSet(BaseModel):
+    """
+    Schema representing a stored set of rephrased variations of an input.
+    """
+    input_hash: str
+    prompt_version: str
+    source: Optional[Any] = None
+    count: int
+    pinned: bool
+    created_at: str
@@ -3,7 +3,8 @@ from pathlib import Path
 from rich.console import Console
 
 from ..utils import get_current_project
-from ...engine.storage import JobModel, TaskModel, AggregationResultModel
+from ...engine.storage import JobModel
+from ...engine.export import export_job
 
 
 def add_parser(subparsers):
@@ -36,32 +37,7 @@ def handle(args):
         console.print(f"[red]Error finding job: {e}[/red]")
         return
 
-    # Prepare export data
-    export_data = {
-        "job_id": job.id,
-        "project_id": job.project_id,
-        "created_at": job.created_at.isoformat(),
-        "finished_at": job.finished_at.isoformat() if job.finished_at else None,
-        "status": job.status,
-        "model": job.get_model_summary(),
-        "details": job.details,
-        "tasks": {}  # We'll populate this with detailed task info
-    }
-
-    # Get detailed task information
-    tasks = TaskModel.list(job.id)
-    for task in tasks:
-        export_data["tasks"][task.challenge_id] = task.to_dict()
-    
-    # Get aggregation results if available
-    aggregations = AggregationResultModel.find_by_job(job.id)
-    if aggregations:
-        export_data["aggregations"] = {}
-        for aggregation in aggregations:
-            export_data["aggregations"][aggregation.aggregation_type] = {
-                "results": aggregation.results,
-                "created_at": aggregation.created_at.isoformat()
-            }
+    export_data = export_job(job)
 
     # Determine output path
     output_path = args.output if args.output else f"{job.id}.json"
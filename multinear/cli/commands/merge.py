@@ -0,0 +1,54 @@
+import json
+from pathlib import Path
+from rich.console import Console
+
+from ..utils import get_current_project
+from ...engine.run import load_config
+from ...engine.shards import merge_shards
+
+
+def add_parser(subparsers):
+    parser = subparsers.add_parser(
+        'merge', help='Merge the shards of a sharded run into one job'
+    )
+    parser.add_argument(
+        'paths', nargs='+',
+        help='Shard exports, or folders of them (e.g. .multinear/shards/<job_id>)'
+    )
+    parser.add_argument('--config', type=str, help='Name of custom config.yaml file')
+    parser.set_defaults(func=handle)
+
+
+def handle(args):
+    project = get_current_project(args.config)
+    if not project:
+        return
+
+    console = Console()
+
+    files = []
+    for path in map(Path, args.paths):
+        files.extend(sorted(path.glob("shard-*.json")) if path.is_dir() else [path])
+
+    try:
+        shards = []
+        for file in files:
+            with open(file) as f:
+                shards.append(json.load(f))
+
+        project_dict = project.to_dict()
+        if args.config:
+            project_dict["config_file"] = args.config + ".yaml"
+
+        job = merge_shards(shards, project.id, load_config(project_dict), console)
+    except Exception as e:
+        console.print(f"[red]Error merging shards: {e}[/red]")
+        return
+
+    console.print(
+        f"[green]Merged {len(shards)} shards into job {job.id}: "
+        f"{job.current_task} tasks, {job.status}[/green]"
+    )
+    console.print(
+        f"For detailed information about this run, use: multinear details {job.id[-8:]}"
+    )
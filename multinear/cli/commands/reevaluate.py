@@ -0,0 +1,42 @@
+from rich.console import Console
+
+from .run import track_job
+from ..utils import get_current_project
+from ...engine.run import reevaluate_experiment
+from ...engine.storage import JobModel
+
+
+def add_parser(subparsers):
+    parser = subparsers.add_parser(
+        'reevaluate',
+        help='Evaluate the stored outputs of a job again, under the current config'
+    )
+    parser.add_argument('job_id', type=str, help='ID of the job to re-evaluate')
+    parser.add_argument('--config', type=str, help='Name of custom config.yaml file')
+    parser.set_defaults(func=handle)
+
+
+def handle(args):
+    project = get_current_project(args.config)
+    if not project:
+        return
+
+    console = Console()
+
+    source_job = JobModel.find_partial(args.job_id)
+    if not source_job or source_job.project_id != project.id:
+        console.print(f"[red]Error: Job {args.job_id} not found[/red]")
+        return
+
+    job = JobModel.find(JobModel.start(project.id))
+    console.print(
+        f"Re-evaluating the outputs of job {source_job.id[-8:]} in job {job.id[-8:]}"
+    )
+
+    project_dict = project.to_dict()
+    if args.config:
+        project_dict["config_file"] = args.config + ".yaml"
+
+    track_job(console, job, lambda sinks: reevaluate_experiment(
+        project_dict, job, source_job.id, sinks=sinks
+    ))
@@ -1,3 +1,5 @@
+import json
+import signal
 import tqdm
 from pathlib import Path
 from rich.console import Console
@@ -7,68 +9,239 @@ from .details import print_details
 from ..utils import get_current_project
 from ...engine.run import run_experiment
 from ...engine.storage import JobModel, TaskModel, TaskStatus
+from ...engine.resume import prepare_resume, prepare_rerun_failed, job_stopped
+from ...engine.output_cache import OFF, REFRESH
+from ...engine.export import export_job
+from ...engine.shards import parse_shard, shard_path
+from ...engine.events import (
+    EventType,
+    JobStatusSink,
+    ProgressEvent,
+    TASK_EVENTS,
+)
 
 
 def add_parser(subparsers):
     parser = subparsers.add_parser('run', help='Run experiment and track progress')
     parser.add_argument('--config', type=str, help='Name of custom config.yaml file')
     parser.add_argument('--group', type=str, help='Run only tasks from the specified group')
+    previous = parser.add_mutually_exclusive_group()
+    previous.add_argument(
+        '--resume', type=str, metavar='JOB_ID',
+        help='Resume an interrupted job, running only its unfinished tasks'
+    )
+    previous.add_argument(
+        '--rerun-failed', type=str, metavar='JOB_ID',
+        help='Start a new job that keeps the passing tasks of a job and reruns the rest'
+    )
+    previous.add_argument(
+        '--job', type=str, metavar='JOB_ID',
+        help='ID of the new job; the shards of a sharded run share it'
+    )
+    parser.add_argument(
+        '--force', action='store_true',
+        help='With --resume, resume a job that still looks running, e.g. after '
+             'its process was killed'
+    )
+    parser.add_argument(
+        '--shard', type=str, metavar='I/N',
+        help='Run only the I-th of N shards of the tasks, and export the shard '
+             'for multinear merge'
+    )
+    cache = parser.add_mutually_exclusive_group()
+    cache.add_argument(
+        '--no-cache', action='store_true', help='Do not use the output cache'
+    )
+    cache.add_argument(
+        '--refresh', action='store_true',
+        help='Run every task and overwrite the cached outputs'
+    )
     parser.set_defaults(func=handle)
 
 
+class ProgressSink:
+    """
+    Progress bar and log lines for the CLI, driven by progress events.
+    """
+
+    def __init__(self):
+        self.pbar = None
+
+    def __call__(self, event: ProgressEvent):
+        update = event.to_update()
+        if event.type in TASK_EVENTS and event.type not in (
+            EventType.FINISHED, EventType.CARRIED_OVER
+        ):
+            log_str = (
+                f"Task {update.get('current', 0)}/{update.get('total', 0)} "
+                f"status: {event.task_status()}"
+            )
+            self._write(log_str)
+
+        if event.type == EventType.GROUP_FINISHED:
+            summary = event.summary
+            log_str = (
+                f"Group {event.group_id} finished: {summary['passed']}/{summary['total']} passed"
+                + (f", score {summary['score']:.2f}" if summary["score"] is not None else "")
+            )
+            self._write(log_str)
+
+        # Initialize progress bar when we get total tasks
+        if self.pbar is None and event.type == EventType.JOB_STARTED:
+            self.pbar = tqdm.tqdm(total=event.total, desc="Running Experiment")
+
+        # Advance the progress bar as tasks finish
+        if self.pbar is not None and event.type == EventType.FINISHED:
+            # The total grows as generated tasks are yielded
+            if event.total and event.total != self.pbar.total:
+                self.pbar.total = event.total
+            self.pbar.update(1)
+
+    def _write(self, log_str: str):
+        if self.pbar is not None:
+            self.pbar.write(log_str)
+        else:
+            print(log_str)
+
+    def close(self):
+        if self.pbar is not None:
+            self.pbar.close()
+
+
+def cache_mode(args):
+    if args.no_cache:
+        return OFF
+    if args.refresh:
+        return REFRESH
+    return None
+
+
 def handle(args):
     project = get_current_project(args.config)
     if not project:
         return
-    job_id = JobModel.start(project.id)
-    job = JobModel.find(job_id)
 
     # Initialize Rich consoles
     console = Console()
+
+    shard = None
+    if args.shard:
+        try:
+            shard = parse_shard(args.shard)
+        except ValueError as e:
+            console.print(f"[red]Error: {e}[/red]")
+            return
+        if not (args.job or args.resume):
+            console.print(
+                "[red]Error: --shard needs --job (or --resume), so that all "
+                "shards share the job ID[/red]"
+            )
+            return
+
+    # Tasks finished in an earlier run are carried over instead of running again
+    finished = None
+    previous_id = args.resume or args.rerun_failed
+    if previous_id:
+        previous_job = JobModel.find_partial(previous_id)
+        if not previous_job or previous_job.project_id != project.id:
+            console.print(f"[red]Error: Job {previous_id} not found[/red]")
+            return
+
+    if args.resume:
+        job = previous_job
+        job_id = job.id
+        if not args.force and not job_stopped(job):
+            console.print(
+                f"[red]Error: Job {job_id[-8:]} is still running; cancel it first, "
+                f"or use --force if its process was killed[/red]"
+            )
+            return
+        finished = prepare_resume(job_id)
+        console.print(
+            f"Resuming job {job_id[-8:]}: {len(finished)} tasks already finished"
+        )
+    else:
+        if args.job and JobModel.find(args.job):
+            console.print(f"[red]Error: Job {args.job} already exists[/red]")
+            return
+        job_id = JobModel.start(project.id, args.job)
+        job = JobModel.find(job_id)
+        if previous_id:
+            finished = prepare_rerun_failed(previous_job.id, job_id)
+            console.print(
+                f"Rerunning failed tasks of job {previous_job.id[-8:]}: "
+                f"{len(finished)} passing tasks carried over"
+            )
+
+    # Add config file to project config if specified
+    project_dict = project.to_dict()
+    if args.config:
+        project_dict["config_file"] = args.config + ".yaml"
+
+    # Run the experiment with optional group filtering
+    track_job(console, job, lambda sinks: run_experiment(
+        project_dict,
+        job,
+        group_id=args.group,
+        sinks=sinks,
+        finished=finished,
+        cache_mode=cache_mode(args),
+        shard=shard,
+    ))
+
+    if shard:
+        path = shard_path(Path.cwd(), job_id, *shard)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        with open(path, "w") as f:
+            json.dump(export_job(JobModel.find(job_id)), f, indent=2)
+        console.print(f"[green]Exported shard {shard[0]}/{shard[1]} to {path}[/green]")
+
+
+def track_job(console: Console, job: JobModel, experiment):
+    """
+    Run a job with progress tracking, then print its summary and write it to
+    .multinear/last_output.txt.
+
+    Args:
+        console: Console to print to
+        job: The job being run
+        experiment: Callable taking the progress sinks and returning the
+            experiment's updates, e.g. a run_experiment call
+    """
+    job_id = job.id
     console_plain = Console(no_color=True, force_terminal=False, width=120)
 
     # Execute the experiment with progress tracking
     results = []
-    pbar = None
-
-    try:
-        # Add config file to project config if specified
-        project_dict = project.to_dict()
-        if args.config:
-            project_dict["config_file"] = args.config + ".yaml"
-
-        # Run the experiment with optional group filtering
-        for update in run_experiment(project_dict, job, group_id=args.group):
-            results.append(update)
+    progress = ProgressSink()
 
-            # Add status map from TaskModel to the update
-            update["status_map"] = TaskModel.get_status_map(job_id)
+    # The first Ctrl-C cancels the job: in-flight tasks finish, no new ones
+    # start. A second one interrupts right away.
+    def interrupt(signum, frame):
+        signal.signal(signal.SIGINT, signal.default_int_handler)
+        progress._write(
+            "Cancelling: waiting for the tasks in flight (Ctrl-C again to abort)"
+        )
+        JobModel.request_cancel(job_id)
 
-            # Update job status in the database
-            job.update(
-                status=update["status"],
-                total_tasks=update.get("total", 0),
-                current_task=update.get("current"),
-                details=update
-            )
-            log_str = f"Task {update.get('current', 0)}/{update.get('total', 0)} status: {update['status']}"
-            if pbar is not None:
-                pbar.write(log_str)
-            else:
-                print(log_str)
+    previous_handler = signal.signal(signal.SIGINT, interrupt)
 
-            # Initialize progress bar when we get total tasks
-            if pbar is None and update.get("total") is not None:
-                pbar = tqdm.tqdm(total=update["total"], desc="Running Experiment")
+    try:
+        # The sinks keep the job row and the progress bar up to date
+        for update in experiment([JobStatusSink(job), progress]):
+            results.append(update)
 
-            # Update progress bar if initialized
-            if pbar is not None and update.get("current") is not None:
-                completed_tasks = sum(1 for status in update["status_map"].values() 
-                    if status in [TaskStatus.COMPLETED, TaskStatus.FAILED])
-                pbar.n = completed_tasks
+        # Mark the job as finished (or cancelled) upon completion
+        job.finish(
+            TaskStatus.CANCELLED
+            if results and results[-1]["status"] == TaskStatus.CANCELLED
+            else TaskStatus.COMPLETED
+        )
 
-        # Mark the job as finished upon successful completion
-        job.finish()
+    except KeyboardInterrupt:
+        # Aborted with a second Ctrl-C: the job can be resumed
+        job.finish(TaskStatus.CANCELLED)
+        raise
 
     except Exception as e:
         # Handle exceptions and update the job as failed
@@ -81,9 +254,9 @@ def handle(args):
             }
         )
     finally:
+        signal.signal(signal.SIGINT, previous_handler)
         # Close progress bar if it was initialized
-        if pbar is not None:
-            pbar.close()
+        progress.close()
 
     # Generate summary
     summary_table = Table(title="Experiment Summary")
@@ -93,7 +266,12 @@ def handle(args):
     summary_table.add_row("Job ID", job_id)
     summary_table.add_row("Final Status", results[-1]["status"])
     summary_table.add_row("Total Tasks", str(results[-1].get("total", 0)))
-    summary_table.add_row("Completed Tasks", str(results[-1].get("current", 0)))
+    stopped = results[-1].get("summary")
+    if stopped:
+        summary_table.add_row("Completed Tasks", str(stopped["finished"]))
+        summary_table.add_row("Stopped", stopped["reason"])
+    else:
+        summary_table.add_row("Completed Tasks", str(results[-1].get("current", 0)))
 
     details_message = (
         f"For detailed information about this run, use: multinear details {job_id[-8:]}"
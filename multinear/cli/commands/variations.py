@@ -0,0 +1,78 @@
+from rich.console import Console
+from rich.table import Table
+
+from ..utils import get_current_project
+from ...engine.storage import VariationModel
+
+
+def add_parser(subparsers):
+    parser = subparsers.add_parser(
+        'variations', help='Manage stored variations of rephrased inputs'
+    )
+    parser.add_argument('--config', type=str, help='Name of custom config.yaml file')
+    actions = parser.add_subparsers(dest='action', help='Available actions')
+
+    actions.add_parser('list', help='List stored variation sets')
+
+    regenerate = actions.add_parser(
+        'regenerate', help='Drop stored variations so the next run generates new ones'
+    )
+    regenerate.add_argument(
+        'input_hash', nargs='?', help='Input hash (or prefix), all sets if omitted'
+    )
+    regenerate.add_argument(
+        '--include-pinned', action='store_true', help='Also drop pinned sets'
+    )
+
+    pin = actions.add_parser('pin', help='Pin a variation set so it is reused as is')
+    pin.add_argument('input_hash', help='Input hash (or prefix)')
+
+    unpin = actions.add_parser('unpin', help='Unpin a variation set')
+    unpin.add_argument('input_hash', help='Input hash (or prefix)')
+
+    parser.set_defaults(func=handle)
+
+
+def handle(args):
+    project = get_current_project(args.config)
+    if not project:
+        return
+
+    console = Console()
+
+    if args.action == 'regenerate':
+        deleted = VariationModel.clear(args.input_hash, args.include_pinned)
+        console.print(f"Deleted {deleted} stored variations")
+    elif args.action in ('pin', 'unpin'):
+        updated = VariationModel.set_pinned(args.input_hash, args.action == 'pin')
+        if not updated:
+            console.print(f"[red]Error: No variations found for {args.input_hash}[/red]")
+            return
+        console.print(f"{args.action.capitalize()}ned {updated} variations")
+    else:
+        print_variation_sets(console)
+
+
+def print_variation_sets(console: Console):
+    table = Table(
+        title="Stored Variations",
+        show_header=True,
+        header_style="bold cyan"
+    )
+    table.add_column("Input Hash", style="dim")
+    table.add_column("Input")
+    table.add_column("Variations", justify="right")
+    table.add_column("Pinned", justify="center")
+    table.add_column("Created")
+
+    for variation_set in VariationModel.list_sets():
+        source = str(variation_set["source"] or "")
+        table.add_row(
+            variation_set["input_hash"][:12],
+            source if len(source) <= 60 else source[:57] + "...",
+            str(variation_set["count"]),
+            "[green]✓[/green]" if variation_set["pinned"] else "",
+            variation_set["created_at"][:16].replace("T", " "),
+        )
+
+    console.print(table)
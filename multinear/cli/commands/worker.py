@@ -0,0 +1,75 @@
+import signal
+import threading
+from rich.console import Console
+
+from ..utils import get_current_project
+from ...engine.run import load_config
+from ...engine.worker import DEFAULT_LEASE_SECONDS, DEFAULT_POLL_INTERVAL, run_worker
+
+
+def add_parser(subparsers):
+    parser = subparsers.add_parser(
+        'worker', help='Run tasks of queued jobs (with meta.queue enabled)'
+    )
+    parser.add_argument('--config', type=str, help='Name of custom config.yaml file')
+    parser.add_argument(
+        '--batch-size', type=int,
+        help='Tasks leased at a time (default: meta.max_workers)'
+    )
+    parser.add_argument(
+        '--lease', type=float, default=DEFAULT_LEASE_SECONDS, metavar='SECONDS',
+        help='Seconds before the tasks of an unresponsive worker are leased again'
+    )
+    parser.add_argument(
+        '--poll-interval', type=float, default=DEFAULT_POLL_INTERVAL, metavar='SECONDS',
+        help='Seconds between polls of an empty queue'
+    )
+    parser.add_argument(
+        '--exit-when-idle', action='store_true',
+        help='Exit once the queue is empty instead of waiting for new jobs'
+    )
+    parser.set_defaults(func=handle)
+
+
+def handle(args):
+    project = get_current_project(args.config)
+    if not project:
+        return
+
+    console = Console()
+
+    project_dict = project.to_dict()
+    if args.config:
+        project_dict["config_file"] = args.config + ".yaml"
+
+    # Ctrl-C stops leasing new tasks once the current batch is done; a second
+    # one exits right away, and the batch is leased again after its lease expires
+    stop = threading.Event()
+
+    def interrupt(signum, frame):
+        signal.signal(signal.SIGINT, signal.default_int_handler)
+        console.print("[yellow]Stopping after the current batch (Ctrl-C again to exit)[/yellow]")
+        stop.set()
+
+    previous_handler = signal.signal(signal.SIGINT, interrupt)
+    try:
+        ran = run_worker(
+            project_dict,
+            load_config(project_dict),
+            batch_size=args.batch_size,
+            lease_seconds=args.lease,
+            poll_interval=args.poll_interval,
+            exit_when_idle=args.exit_when_idle,
+            stop=stop,
+            console=console,
+        )
+    except KeyboardInterrupt:
+        console.print("[yellow]Worker interrupted[/yellow]")
+        return
+    except Exception as e:
+        console.print(f"[red]Error running worker: {e}[/red]")
+        return
+    finally:
+        signal.signal(signal.SIGINT, previous_handler)
+
+    console.print(f"[green]Worker finished: {ran} tasks run[/green]")
@@ -1,6 +1,6 @@
 import argparse
 from importlib.metadata import version
-from .commands import init, run, recent, details, web, export
+from .commands import init, run, reevaluate, recent, details, web, export, merge, variations, worker
 
 
 def get_parser() -> argparse.ArgumentParser:
@@ -13,10 +13,14 @@ def get_parser() -> argparse.ArgumentParser:
     # Define commands
     init.add_parser(subparsers)
     run.add_parser(subparsers)
+    reevaluate.add_parser(subparsers)
     recent.add_parser(subparsers)
     details.add_parser(subparsers)
     web.add_parser(subparsers)
     export.add_parser(subparsers)
+    merge.add_parser(subparsers)
+    variations.add_parser(subparsers)
+    worker.add_parser(subparsers)
 
     return parser
 
@@ -28,11 +32,15 @@ def main():
     command_handlers = {
         'init': init.handle,
         'run': run.handle,
+        'reevaluate': reevaluate.handle,
         'recent': recent.handle,
         'details': details.handle,
         'web': web.handle,
         'web_dev': web.handle_dev,
         'export': export.handle,
+        'merge': merge.handle,
+        'variations': variations.handle,
+        'worker': worker.handle,
     }
 
     if args.command in command_handlers:
@@ -160,6 +160,32 @@ def compute_aggregations(job_id: str, config: Dict[str, Any]) -> Dict[str, Dict[
     return aggregated_results
 
 
+def compute_group_aggregation(group_summaries: Dict[str, Dict[str, Any]]) -> Dict[str, Any]:
+    """
+    Build an aggregation over the config groups of a job from their summaries.
+    
+    Args:
+        group_summaries: Summary of each group, as computed by the JobScheduler
+        
+    Returns:
+        Aggregation with the same structure as the configured groupings
+    """
+    results = {}
+    for group_id, summary in group_summaries.items():
+        if summary.get('score') is None:
+            continue
+        results[(str(group_id),)] = {
+            'score': summary['score'],
+            'count': summary['finished'] - summary['errors'],
+            'metadata': {'group_id': str(group_id)}
+        }
+    
+    return {
+        'fields': ['group_id'],
+        'results': results
+    }
+
+
 def save_aggregations(job_id: str, aggregations: Dict[str, Any]) -> None:
     """
     Save aggregation results to the database.
@@ -317,4 +343,48 @@ def get_aggregation_config(config: Dict[str, Any]) -> Dict[str, Any]:
     if not aggregations_config:
         return {}
     
-    return {**default_config, **aggregations_config}
\ No newline at end of file
+    return {**default_config, **aggregations_config}
+
+def aggregate_job(
+    job_id: str,
+    config: Dict[str, Any],
+    group_summaries: Dict[str, Dict[str, Any]],
+    total_tasks: int,
+    console: Console,
+) -> None:
+    """
+    Compute, save and display the aggregations of a job, if enabled.
+    
+    Args:
+        job_id: Job ID
+        config: Configuration dictionary containing aggregation settings
+        group_summaries: Summary of each config group of the job
+        total_tasks: Total number of tasks of the job
+        console: Console to display the aggregations on
+    """
+    if not should_compute_aggregations(config):
+        return
+
+    console.print("[yellow]Computing aggregations...[/yellow]")
+    aggregation_config = get_aggregation_config(config)
+    
+    try:
+        aggregations = compute_aggregations(job_id, config)
+        
+        # Per-group results, from the group summaries
+        by_group = compute_group_aggregation(group_summaries)
+        if by_group['results']:
+            aggregations.setdefault('task_count', sum(
+                data['count'] for data in by_group['results'].values()
+            ))
+            aggregations.setdefault('total_tasks', total_tasks)
+            aggregations['by_group'] = by_group
+        
+        if aggregations and aggregation_config.get('save_to_db', True):
+            save_aggregations(job_id, aggregations)
+        
+        if aggregations and aggregation_config.get('display', True):
+            display_aggregations(aggregations, console)
+        
+    except Exception as e:
+        console.print(f"[red]Warning: Failed to compute aggregations: {str(e)}[/red]")
@@ -0,0 +1,194 @@
+"""
+Micro-batching of task inputs for task runners with a batch API.
+
+A task runner can expose `run_tasks(inputs)`, sync or async, taking a list of
+inputs and returning the list of their results, in the same order and in the
+format of run_task. The scheduler then gathers the inputs of the tasks in
+flight into batches of up to `meta.batch_size` (default: `meta.max_workers`),
+and sends a batch once it is full or its first input waited `meta.batch_wait`
+seconds:
+
+    meta:
+      max_workers: 32       # Tasks in flight, so at least the batch size
+      batch_size: 16
+      batch_wait: 0.2
+
+Each task still gets its own record, output cache entry, retries and
+evaluation. An item of the returned list can be an exception, to fail only
+its task; when run_tasks raises, every task of the batch fails (and is
+retried on its own, in a later batch, per `meta.retry`).
+"""
+
+from concurrent.futures import Executor
+from typing import Dict, Any, List, Optional, Tuple
+import asyncio
+import inspect
+
+from ..utils.capture import OutputCapture
+from .process_pool import ProcessTaskRunner
+from .rate_limit import get_rate_limiter, RUN_TASK
+from .run_group import TaskExecution
+
+
+# Seconds the first input of a batch waits for the batch to fill up
+DEFAULT_BATCH_WAIT = 0.1
+
+
+def run_tasks_captured(
+    task_runner_module, inputs: List[Any]
+) -> Tuple[List[Any], List[Dict[str, Any]]]:
+    """
+    Run the task runner's sync run_tasks on a batch of inputs, capturing its output.
+
+    Args:
+        task_runner_module: Module with run_tasks function, or a ProcessTaskRunner
+        inputs: The task inputs
+
+    Returns:
+        Tuple of (task results, captured logs)
+    """
+    if isinstance(task_runner_module, ProcessTaskRunner):
+        # Output is captured inside the worker process
+        return task_runner_module.run_tasks_captured(inputs)
+
+    with OutputCapture() as capture:
+        task_results = task_runner_module.run_tasks(inputs)
+    return task_results, capture.logs
+
+
+class TaskBatcher:
+    """
+    Gather task inputs into batches for run_tasks, on the scheduler's event
+    loop, and hand each task its own result.
+    """
+
+    def __init__(
+        self,
+        task_runner_module,
+        batch_size: int,
+        batch_wait: float,
+        executor: Optional[Executor] = None,
+    ):
+        self.task_runner_module = task_runner_module
+        # Runs a sync run_tasks; the default executor if None
+        self.executor = executor
+        self.batch_size = batch_size
+        self.batch_wait = batch_wait
+        self.is_async = not isinstance(
+            task_runner_module, ProcessTaskRunner
+        ) and inspect.iscoroutinefunction(task_runner_module.run_tasks)
+        # Inputs waiting for the next batch, with the futures of their results
+        self._pending: List[Tuple[Any, asyncio.Future]] = []
+        self._timer: Optional[asyncio.TimerHandle] = None
+        self._batches = set()
+        # Sizes of the batches sent so far
+        self.sizes: List[int] = []
+
+    @classmethod
+    def from_config(
+        cls,
+        task_runner_module,
+        config: Dict[str, Any],
+        max_workers: int,
+        executor: Optional[Executor] = None,
+    ) -> Optional["TaskBatcher"]:
+        """
+        A batcher for a task runner with run_tasks, or None without one. A
+        sync run_tasks runs on `executor`, the scheduler's execution pool.
+        """
+        if getattr(task_runner_module, "run_tasks", None) is None:
+            return None
+        meta = config.get("meta", {})
+        batch_size = max(1, meta.get("batch_size", max_workers))
+        batch_wait = meta.get("batch_wait", DEFAULT_BATCH_WAIT)
+        return cls(task_runner_module, batch_size, batch_wait, executor)
+
+    async def submit(self, input: Any) -> Tuple[Dict[str, Any], List[Dict[str, Any]]]:
+        """
+        Add an input to the next batch and wait for its result.
+
+        Returns:
+            Tuple of (task result, logs captured while running the batch)
+        """
+        future = asyncio.get_running_loop().create_future()
+        self._pending.append((input, future))
+        if len(self._pending) >= self.batch_size:
+            self._flush()
+        elif self._timer is None:
+            self._timer = asyncio.get_running_loop().call_later(
+                self.batch_wait, self._flush
+            )
+        return await future
+
+    def _flush(self):
+        if self._timer is not None:
+            self._timer.cancel()
+            self._timer = None
+        batch, self._pending = self._pending, []
+        if not batch:
+            return
+        self.sizes.append(len(batch))
+        task = asyncio.ensure_future(self._run(batch))
+        # Keep a reference until the batch is done
+        self._batches.add(task)
+        task.add_done_callback(self._batches.discard)
+
+    async def _run(self, batch: List[Tuple[Any, asyncio.Future]]):
+        inputs = [input for input, _ in batch]
+        try:
+            if self.is_async:
+                with OutputCapture() as capture:
+                    task_results = await self.task_runner_module.run_tasks(inputs)
+                logs = capture.logs
+            else:
+                task_results, logs = await asyncio.get_running_loop().run_in_executor(
+                    self.executor, run_tasks_captured, self.task_runner_module, inputs
+                )
+            task_results = list(task_results)
+            if len(task_results) != len(inputs):
+                raise ValueError(
+                    f"run_tasks returned {len(task_results)} results "
+                    f"for {len(inputs)} inputs"
+                )
+        except Exception as e:
+            for _, future in batch:
+                if not future.done():
+                    future.set_exception(e)
+            return
+
+        for (_, future), task_result in zip(batch, task_results):
+            if future.done():  # The task timed out meanwhile
+                continue
+            if isinstance(task_result, BaseException):
+                future.set_exception(task_result)
+            else:
+                future.set_result((task_result, logs))
+
+
+async def run_execution_batched(execution: TaskExecution, batcher: TaskBatcher):
+    """
+    Execution stage running the task in a batch of run_tasks. Database writes
+    are moved off the event loop.
+
+    Args:
+        execution: The task execution
+        batcher: The job's batcher
+    """
+    await asyncio.to_thread(execution.start)
+
+    cache = execution.output_cache
+    if cache is not None:
+        cached = await asyncio.to_thread(cache.get, execution.cache_key())
+        if cached is not None:
+            await asyncio.to_thread(execution.executed, *cached)
+            return
+
+    async def attempt():
+        return await get_rate_limiter().call_async(
+            RUN_TASK, 0, batcher.submit, execution.input
+        )
+
+    task_result, logs = await execution.task_retry.call_async(attempt)
+    if cache is not None:
+        await asyncio.to_thread(cache.put, execution.cache_key(), task_result, logs)
+    await asyncio.to_thread(execution.executed, task_result, logs)
@@ -0,0 +1,94 @@
+"""
+Timeouts and cooperative cancellation of tasks.
+
+Timeouts are set in seconds in `meta.timeout` and can be overridden per task,
+either for run_task only or for each stage:
+
+    meta:
+      timeout: 120          # run_task
+    tasks:
+      - input: ...
+        timeout:
+          run_task: 300
+          evaluators: 60    # The whole evaluation of the task
+
+An async run_task is cancelled when it times out. A sync one can not be
+interrupted: the task is marked as timed out right away, its worker thread is
+only given to the next task once it returns, and the task runner can check
+`is_cancelled()` to stop early. A timeout starts when the stage starts, not
+while the task waits for a worker.
+"""
+
+from typing import Dict, Any, Awaitable, Optional
+import asyncio
+import contextvars
+import threading
+
+
+# Stages that can have a timeout
+STAGES = ("run_task", "evaluators")
+
+# Cancel event of the task running in the current thread
+_cancel_event: contextvars.ContextVar[Optional[threading.Event]] = (
+    contextvars.ContextVar("multinear_cancel_event", default=None)
+)
+
+
+class TaskTimeoutError(TimeoutError):
+    """
+    A stage of a task exceeded its timeout.
+    """
+
+
+def get_timeouts(task: Dict[str, Any], config: Dict[str, Any]) -> Dict[str, Optional[float]]:
+    """
+    Resolve the timeouts of a task's stages, from the task or `meta.timeout`.
+
+    Returns:
+        Dict of stage name to timeout in seconds, or None for no timeout
+    """
+    def resolve(value):
+        if value is None:
+            return {}
+        if isinstance(value, dict):
+            return {stage: value[stage] for stage in STAGES if stage in value}
+        return {"run_task": value}
+
+    timeouts = dict.fromkeys(STAGES)
+    timeouts.update(resolve(config.get("meta", {}).get("timeout")))
+    timeouts.update(resolve(task.get("timeout")))
+    return timeouts
+
+
+async def with_timeout(awaitable: Awaitable, seconds: Optional[float], stage: str):
+    """
+    Await a stage of a task, raising TaskTimeoutError after `seconds`.
+    """
+    if not seconds:
+        return await awaitable
+    try:
+        return await asyncio.wait_for(awaitable, seconds)
+    except asyncio.TimeoutError:
+        raise TaskTimeoutError(f"{stage} timed out after {seconds}s") from None
+
+
+def set_cancel_event(event: threading.Event):
+    """
+    Bind the cancel event of the task about to run in the current thread.
+    """
+    _cancel_event.set(event)
+
+
+def is_cancelled() -> bool:
+    """
+    Whether the task running in the current thread was cancelled, e.g. after
+    timing out. A long-running task runner can check it to stop early:
+
+        from multinear.engine.cancellation import is_cancelled
+
+        for step in steps:
+            if is_cancelled():
+                break
+    """
+    event = _cancel_event.get()
+    return event is not None and event.is_set()
@@ -0,0 +1,210 @@
+"""
+Concurrency limits of the scheduler's pipeline stages.
+
+A stage limit is either fixed (`meta.max_workers: 8`) or adaptive
+(`meta.max_workers: auto`). An adaptive limit follows AIMD: it starts low,
+grows by one slot after every healthy round of tasks, and is halved on rate
+limit errors, timeouts, a high error rate or a latency spike.
+
+    meta:
+      max_workers: auto
+      max_eval_workers: auto   # defaults to max_workers
+      auto_workers:
+        initial: 2
+        max: 32
+"""
+
+from typing import Dict, Any, List, Awaitable, Optional
+import asyncio
+import statistics
+import time
+
+from .rate_limit import is_rate_limit_error
+
+
+AUTO = "auto"
+
+# Defaults of `meta.auto_workers`
+DEFAULT_INITIAL_WORKERS = 2
+DEFAULT_MAX_WORKERS = 32
+
+# A round with a higher error rate than this backs off
+MAX_ERROR_RATE = 0.1
+
+# A round whose p95 latency exceeds the best p95 seen by this factor backs off
+LATENCY_SPIKE_FACTOR = 2.0
+
+
+def get_worker_limits(config: Dict[str, Any]) -> Dict[str, Dict[str, Any]]:
+    """
+    Resolve the concurrency settings of the execution and evaluation stages.
+
+    Args:
+        config: Configuration dictionary
+
+    Returns:
+        Dict with an "execution" and an "evaluation" entry, each holding the
+        initial limit, the maximum limit and whether the limit is adaptive
+    """
+    meta = config.get("meta", {})
+    auto = meta.get("auto_workers", {})
+    initial = max(1, auto.get("initial", DEFAULT_INITIAL_WORKERS))
+    maximum = max(initial, auto.get("max", DEFAULT_MAX_WORKERS))
+
+    def resolve(value):
+        if value == AUTO:
+            return {"initial": initial, "max": maximum, "adaptive": True}
+        value = max(1, value)
+        return {"initial": value, "max": value, "adaptive": False}
+
+    max_workers = meta.get("max_workers", 1)
+    return {
+        "execution": resolve(max_workers),
+        "evaluation": resolve(meta.get("max_eval_workers", max_workers)),
+    }
+
+
+def is_overload_error(error: BaseException) -> bool:
+    """
+    Whether an error signals that the stage is overloaded: a 429 or a timeout.
+    """
+    return (
+        is_rate_limit_error(error)
+        or isinstance(error, (TimeoutError, asyncio.TimeoutError))
+        or "Timeout" in type(error).__name__
+    )
+
+
+class StageLimit:
+    """
+    Bound on the number of tasks in a pipeline stage, used as an async
+    context manager around the stage. Only used from the scheduler's event loop.
+
+    When adaptive, the stage's calls are timed with `measure` and the limit is
+    adjusted once per round, i.e. every `limit` completed calls.
+    """
+
+    def __init__(self, name: str, initial: int, maximum: int, adaptive: bool = False):
+        self.name = name
+        self.limit = initial
+        self.maximum = maximum
+        self.adaptive = adaptive
+        self.in_flight = 0
+        self.history: List[Dict[str, Any]] = []
+        self._condition = asyncio.Condition()
+        self._started = time.monotonic()
+        self._latencies: List[float] = []
+        self._errors = 0
+        self._saturated = False  # Some call had to wait for a slot this round
+        self._best_p95: Optional[float] = None
+        # Calls completed since the last decrease, so that the errors of the
+        # calls already in flight only back off once
+        self._since_decrease = initial
+        self._record("initial")
+
+    async def acquire(self):
+        """
+        Wait for a free slot and take it.
+        """
+        async with self._condition:
+            if self.in_flight >= self.limit:
+                self._saturated = True
+            await self._condition.wait_for(lambda: self.in_flight < self.limit)
+            self.in_flight += 1
+
+    async def release(self):
+        """
+        Give back a slot.
+        """
+        async with self._condition:
+            self.in_flight -= 1
+            self._condition.notify_all()
+
+    async def __aenter__(self):
+        await self.acquire()
+        return self
+
+    async def __aexit__(self, *exc_info):
+        await self.release()
+
+    async def resize(self, limit: int):
+        """
+        Set the limit directly, e.g. to follow the limit of another stage.
+        """
+        if limit != self.limit:
+            await self._set_limit(limit, "resized")
+
+    async def measure(self, awaitable: Awaitable) -> Any:
+        """
+        Await a call of the stage, feeding its latency and outcome to the limit.
+        """
+        start = time.monotonic()
+        try:
+            result = await awaitable
+        except Exception as e:
+            await self._observe(time.monotonic() - start, e)
+            raise
+        await self._observe(time.monotonic() - start, None)
+        return result
+
+    async def _observe(self, latency: float, error: Optional[BaseException]):
+        if not self.adaptive:
+            return
+
+        self._since_decrease += 1
+        if error is not None and is_overload_error(error):
+            if self._since_decrease >= self.limit:
+                await self._set_limit(self.limit // 2, type(error).__name__)
+            return
+
+        self._latencies.append(latency)
+        if error is not None:
+            self._errors += 1
+        if len(self._latencies) < self.limit:
+            return
+
+        # End of the round
+        latencies = self._latencies
+        p95 = (
+            statistics.quantiles(latencies, n=20)[-1]
+            if len(latencies) > 1
+            else latencies[0]
+        )
+        error_rate = self._errors / len(latencies)
+        saturated = self._saturated
+
+        if error_rate > MAX_ERROR_RATE:
+            await self._set_limit(self.limit // 2, f"error rate {error_rate:.0%}")
+        elif self._best_p95 and p95 > LATENCY_SPIKE_FACTOR * self._best_p95:
+            await self._set_limit(self.limit // 2, f"p95 latency {p95:.2f}s")
+        else:
+            self._best_p95 = min(self._best_p95 or p95, p95)
+            # Only grow while there is more work than slots
+            if saturated and self.limit < self.maximum:
+                await self._set_limit(self.limit + 1, f"p95 latency {p95:.2f}s")
+            else:
+                self._reset_round()
+
+    async def _set_limit(self, limit: int, reason: str):
+        limit = max(1, min(self.maximum, limit))
+        if limit < self.limit:
+            self._since_decrease = 0
+        self._reset_round()
+        if limit == self.limit:
+            return
+        async with self._condition:
+            self.limit = limit
+            self._condition.notify_all()
+        self._record(reason)
+
+    def _reset_round(self):
+        self._latencies = []
+        self._errors = 0
+        self._saturated = False
+
+    def _record(self, reason: str):
+        self.history.append({
+            "time": round(time.monotonic() - self._started, 3),
+            "limit": self.limit,
+            "reason": reason,
+        })
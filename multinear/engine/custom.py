@@ -1,7 +1,30 @@
+import asyncio
+import inspect
+
+
 class CustomEvaluator():
     def __init__(self, spec, task_runner_module):
         self.spec = spec
         self.task_runner_module = task_runner_module
 
+    def _evaluate_custom(self):
+        if self.task_runner_module is None:
+            # Re-evaluating stored outputs never loads task_runner.py
+            raise RuntimeError(
+                "Custom evaluators are not available without task_runner.py"
+            )
+        return self.task_runner_module.evaluate_custom
+
     def __call__(self, input, output):
-        return self.task_runner_module.evaluate_custom(input, output, self.spec)
+        evaluate_custom = self._evaluate_custom()
+        if inspect.iscoroutinefunction(evaluate_custom):
+            # Async evaluate_custom called from a worker thread
+            return asyncio.run(evaluate_custom(input, output, self.spec))
+        return evaluate_custom(input, output, self.spec)
+
+    async def eval_async(self, input, output):
+        evaluate_custom = self._evaluate_custom()
+        if inspect.iscoroutinefunction(evaluate_custom):
+            return await evaluate_custom(input, output, self.spec)
+        # Keep the event loop free while a sync evaluator runs
+        return await asyncio.to_thread(evaluate_custom, input, output, self.spec)
@@ -0,0 +1,131 @@
+"""
+Early stopping of a job once its outcome is clear.
+
+Configured in `meta.early_stop`:
+
+    meta:
+      early_stop:
+        min_tasks: 20            # No rule applies before this many tasks finished
+        max_failure_rate: 0.3    # Abort once more tasks than this have failed
+        target_pass_rate: 0.8    # Stop once the pass rate is clearly above or below
+        confidence: 0.95
+        margin: 0.05             # Pass rates within target +/- margin are not told apart
+        seed: 42                 # Seed of the random task order (optional)
+
+The pass rate rule is Wald's sequential probability ratio test of
+`target - margin` against `target + margin`, with both error rates at
+`1 - confidence`, so checking it after every task keeps the requested
+confidence. Tasks run in random order when early stopping is enabled, so the
+tasks finished so far are an unbiased sample of the suite.
+"""
+
+from typing import Dict, Any, Optional
+import math
+
+
+DEFAULT_MIN_TASKS = 10
+DEFAULT_CONFIDENCE = 0.95
+DEFAULT_MARGIN = 0.05
+
+
+class EarlyStop:
+    """
+    Early stopping rules, fed with the result of every finished task.
+    """
+
+    def __init__(
+        self,
+        min_tasks: int = DEFAULT_MIN_TASKS,
+        max_failure_rate: Optional[float] = None,
+        target_pass_rate: Optional[float] = None,
+        confidence: float = DEFAULT_CONFIDENCE,
+        margin: float = DEFAULT_MARGIN,
+        seed: Optional[int] = None,
+    ):
+        self.min_tasks = min_tasks
+        self.max_failure_rate = max_failure_rate
+        self.target_pass_rate = target_pass_rate
+        self.confidence = confidence
+        self.margin = margin
+        self.seed = seed
+        self.finished = 0
+        self.passed = 0
+        self.decision: Optional[Dict[str, Any]] = None
+
+        self._llr = 0.0
+        if target_pass_rate is not None:
+            p0 = max(1e-6, target_pass_rate - margin)
+            p1 = min(1 - 1e-6, target_pass_rate + margin)
+            error = 1 - confidence
+            self._pass_step = math.log(p1 / p0)
+            self._fail_step = math.log((1 - p1) / (1 - p0))
+            self._upper = math.log((1 - error) / error)
+            self._lower = math.log(error / (1 - error))
+
+    @classmethod
+    def from_config(cls, config: Dict[str, Any]) -> Optional["EarlyStop"]:
+        """
+        Build the rules from `meta.early_stop`, or None if not configured.
+        """
+        settings = config.get("meta", {}).get("early_stop")
+        if not settings:
+            return None
+        return cls(
+            min_tasks=settings.get("min_tasks", DEFAULT_MIN_TASKS),
+            max_failure_rate=settings.get("max_failure_rate"),
+            target_pass_rate=settings.get("target_pass_rate"),
+            confidence=settings.get("confidence", DEFAULT_CONFIDENCE),
+            margin=settings.get("margin", DEFAULT_MARGIN),
+            seed=settings.get("seed"),
+        )
+
+    def observe(self, passed: bool) -> Optional[str]:
+        """
+        Account for a finished task (an error counts as a failure).
+
+        Returns:
+            The reason to stop the job, the first time a rule is met
+        """
+        if self.decision is not None:
+            return None
+        self.finished += 1
+        if passed:
+            self.passed += 1
+        if self.target_pass_rate is not None:
+            self._llr += self._pass_step if passed else self._fail_step
+        if self.finished < self.min_tasks:
+            return None
+
+        failure_rate = 1 - self.passed / self.finished
+        if self.max_failure_rate is not None and failure_rate > self.max_failure_rate:
+            return self._decide(
+                "failure_rate",
+                "above",
+                f"failure rate {failure_rate:.0%} above {self.max_failure_rate:.0%}",
+            )
+
+        if self.target_pass_rate is not None:
+            if self._llr >= self._upper:
+                direction = "above"
+            elif self._llr <= self._lower:
+                direction = "below"
+            else:
+                return None
+            return self._decide(
+                "pass_rate",
+                direction,
+                f"pass rate {direction} {self.target_pass_rate:.0%} "
+                f"with {self.confidence:.0%} confidence",
+            )
+        return None
+
+    def _decide(self, rule: str, direction: str, reason: str) -> str:
+        reason = f"{reason} after {self.finished} tasks"
+        self.decision = {
+            "rule": rule,
+            "direction": direction,
+            "reason": reason,
+            "finished": self.finished,
+            "passed": self.passed,
+        }
+        return reason
@@ -0,0 +1,76 @@
+"""
+Reuse of earlier evaluations of identical outputs.
+
+Every evaluation is recorded with a key hashing the output, the evaluation
+spec (with the input and context the judges see) and the judge model. With
+`meta.reuse_evaluations: true`, a task whose key matches an earlier
+evaluation takes its score and details instead of calling the judges again.
+Reused evaluations are marked with `reused` in their details.
+
+Specs with custom evaluators are never reused, as they depend on the code of
+task_runner.py.
+"""
+
+from typing import Dict, Any, Optional
+import hashlib
+import json
+
+from autoevals.llm import DEFAULT_MODEL
+
+from .storage import TaskModel
+
+
+def reuse_enabled(config: Dict[str, Any]) -> bool:
+    """
+    Whether evaluations are reused, from `meta.reuse_evaluations`.
+    """
+    return bool(config.get("meta", {}).get("reuse_evaluations", False))
+
+
+def _hash(value: Any) -> str:
+    return hashlib.sha256(
+        json.dumps(value, sort_keys=True, default=str).encode()
+    ).hexdigest()
+
+
+def _uses_custom(spec: Dict[str, Any]) -> bool:
+    metrics = spec.get("metrics") or []
+    return "custom" in spec or any(
+        isinstance(metric, dict) and "custom" in metric for metric in metrics
+    )
+
+
+def evaluation_key(spec: Dict[str, Any], output: Any) -> Optional[str]:
+    """
+    Key of the evaluation of an output under a spec, by the judge model.
+
+    Returns:
+        The key, or None if the evaluation can not be reused
+    """
+    if _uses_custom(spec):
+        return None
+    return _hash({
+        "output": _hash(output),
+        "spec": _hash(spec),
+        "model": DEFAULT_MODEL,
+    })
+
+
+def find_evaluation(eval_key: str) -> Optional[Dict[str, Any]]:
+    """
+    Find the most recent evaluation with the given key.
+
+    Returns:
+        The evaluation result, with the task it was taken from marked in its
+        details, or None if there is none
+    """
+    task = TaskModel.find_evaluation(eval_key)
+    if task is None:
+        return None
+    details = dict(task.eval_details or {})
+    details["reused"] = {
+        "job_id": task.job_id,
+        "task_id": task.id,
+        "evaluated_at": task.evaluated_at.isoformat(),
+    }
+    return {"passed": task.eval_passed, "score": task.eval_score, "details": details}
@@ -1,11 +1,15 @@
+import asyncio
+
 from .checklist import ChecklistClassifier2
 from .list import ListEvaluator
 from .custom import CustomEvaluator
 from .weighted_score import WeightedScoreEvaluator
 from .numeric import NumericEvaluator
+from .rate_limit import get_rate_limiter, estimate_tokens, DEFAULT_COMPLETION_TOKENS
+from .retry import RetryPolicy, retry_call, retry_call_async
 
 
-def evaluate_metric(spec: dict, input: any, output: any, task_runner_module: any, global_context: str = "") -> dict:
+def evaluate_metric(spec: dict, input: any, output: any, task_runner_module: any, global_context: str = "", retry: RetryPolicy = None) -> dict:
     """
     Evaluate an output against a specification.
 
@@ -15,62 +19,161 @@ def evaluate_metric(spec: dict, input: any, output: any, task_runner_module: any
         output: The output generated by the task.
         task_runner_module: The module for custom evaluators.
         global_context: The global context string from the config meta.
+        retry: Retry policy applied to each evaluator call (optional).
 
     Returns:
         A dictionary containing the evaluation result.
     """
     # 1) Determine min_score
     min_score = spec.get('min_score', 1.0)
-    # Metric-specific context
-    local_context = spec.get('context', '')
-    # Combine contexts
-    combined_context = f"{global_context}\n\n{local_context}".strip()
+    combined_context = _combine_context(spec, global_context)
 
     # 2) Evaluate
     result = None
     if 'checklist' in spec:
         # Pass combined context
         evaluator = ChecklistClassifier2(context=combined_context)
-        result = evaluator(output, spec['checklist'], input=input)
+        result = retry_call(
+            retry, get_rate_limiter().call,
+            evaluator.model,
+            _judge_tokens(combined_context, input, spec['checklist'], output),
+            evaluator, output, spec['checklist'], input=input,
+        )
     elif 'weighted_score' in spec:
         # Check if weighted_score criteria is empty
         if not spec['weighted_score'] or len(spec['weighted_score']) == 0:
             # Return a perfect score for empty criteria (no evaluation needed)
-            result = {'score': 1.0, 'passed': True, 'metadata': {'evaluations': [], 'note': 'No weighted score criteria provided'}}
+            result = _empty_weighted_score_result()
         else:
             # Pass combined context
             evaluator = WeightedScoreEvaluator(context=combined_context)
             # Pass the list of weighted score definitions
-            result = evaluator(output, spec['weighted_score'], input=input)
+            result = retry_call(
+                retry, get_rate_limiter().call,
+                evaluator.model,
+                _judge_tokens(combined_context, input, spec['weighted_score'], output),
+                evaluator, output, spec['weighted_score'], input=input,
+            )
     elif 'list' in spec:
         evaluator = ListEvaluator(spec['list'])
-        result = evaluator(output)
+        result = retry_call(retry, evaluator, output)
     elif 'numeric' in spec:
         evaluator = NumericEvaluator()
-        result = evaluator(output, spec['numeric'], input=input)
+        result = retry_call(retry, evaluator, output, spec['numeric'], input=input)
     else:
         raise ValueError("No evaluator specified")
 
-    if result:
-        result_score = result['score'] if isinstance(result, dict) else result.score
+    # 3) Custom evaluator
+    if 'custom' in spec:
+        evaluator = CustomEvaluator(spec['custom'], task_runner_module)
+        custom_result = retry_call(retry, evaluator, input, output)
+        result = _merge_custom_result(result, custom_result)
+
+    # 4) Normalize result
+    return _normalize_result(result, min_score)
+
+
+async def evaluate_metric_async(spec: dict, input: any, output: any, task_runner_module: any, global_context: str = "", retry: RetryPolicy = None) -> dict:
+    """
+    Async counterpart of `evaluate_metric`.
+
+    LLM judges are called through the async OpenAI client, and an async
+    `evaluate_custom` in task_runner.py is awaited directly.
+
+    Returns:
+        A dictionary containing the evaluation result.
+    """
+    # 1) Determine min_score
+    min_score = spec.get('min_score', 1.0)
+    combined_context = _combine_context(spec, global_context)
+
+    # 2) Evaluate
+    result = None
+    if 'checklist' in spec:
+        evaluator = ChecklistClassifier2(context=combined_context)
+        result = await retry_call_async(
+            retry, get_rate_limiter().call_async,
+            evaluator.model,
+            _judge_tokens(combined_context, input, spec['checklist'], output),
+            evaluator.eval_async, output, spec['checklist'], input=input,
+        )
+    elif 'weighted_score' in spec:
+        if not spec['weighted_score'] or len(spec['weighted_score']) == 0:
+            result = _empty_weighted_score_result()
+        else:
+            evaluator = WeightedScoreEvaluator(context=combined_context)
+            result = await retry_call_async(
+                retry, get_rate_limiter().call_async,
+                evaluator.model,
+                _judge_tokens(combined_context, input, spec['weighted_score'], output),
+                evaluator.eval_async, output, spec['weighted_score'], input=input,
+            )
+    elif 'list' in spec:
+        evaluator = ListEvaluator(spec['list'])
+        result = retry_call(retry, evaluator, output)
+    elif 'numeric' in spec:
+        evaluator = NumericEvaluator()
+        result = await retry_call_async(retry, evaluator.eval_async, output, spec['numeric'], input=input)
     else:
-        result_score = 1
+        raise ValueError("No evaluator specified")
 
     # 3) Custom evaluator
     if 'custom' in spec:
         evaluator = CustomEvaluator(spec['custom'], task_runner_module)
-        custom_result = evaluator(input, output)
-        custom_result_score = custom_result['score'] if isinstance(custom_result, dict) else custom_result.score
-        result_score = (result_score + custom_result_score) / 2
-        # merge evaluations
-        if not result:
-            result = {'metadata': {}}
-        if 'evaluations' not in result['metadata']:
-            result['metadata']['evaluations'] = []
-        result['metadata']['evaluations'] = result['metadata']['evaluations'] + custom_result['metadata']['evaluations']
-        result['metadata']['overall_score'] = result_score
-
-    # 4) Normalize result to { 'score': ..., 'passed': bool, 'metadata': {...} }
+        custom_result = await retry_call_async(retry, evaluator.eval_async, input, output)
+        result = _merge_custom_result(result, custom_result)
+
+    # 4) Normalize result
+    return _normalize_result(result, min_score)
+
+
+def _combine_context(spec: dict, global_context: str) -> str:
+    """
+    Combine the global context with the metric-specific context.
+    """
+    local_context = spec.get('context', '')
+    return f"{global_context}\n\n{local_context}".strip()
+
+
+def _judge_tokens(*parts) -> int:
+    """
+    Estimate the tokens of an LLM judge request, for rate limiting.
+    """
+    return estimate_tokens(*parts) + DEFAULT_COMPLETION_TOKENS
+
+
+def _empty_weighted_score_result() -> dict:
+    """
+    Result used when a weighted_score spec has no criteria.
+    """
+    return {'score': 1.0, 'passed': True, 'metadata': {'evaluations': [], 'note': 'No weighted score criteria provided'}}
+
+
+def _merge_custom_result(result: any, custom_result: any) -> any:
+    """
+    Merge the result of a custom evaluator into the main evaluator result.
+    """
+    if result:
+        result_score = result['score'] if isinstance(result, dict) else result.score
+    else:
+        result_score = 1
+
+    custom_result_score = custom_result['score'] if isinstance(custom_result, dict) else custom_result.score
+    result_score = (result_score + custom_result_score) / 2
+    # merge evaluations
+    if not result:
+        result = {'metadata': {}}
+    if 'evaluations' not in result['metadata']:
+        result['metadata']['evaluations'] = []
+    result['metadata']['evaluations'] = result['metadata']['evaluations'] + custom_result['metadata']['evaluations']
+    result['metadata']['overall_score'] = result_score
+    return result
+
+
+def _normalize_result(result: any, min_score: float) -> dict:
+    """
+    Normalize an evaluator result to { 'score': ..., 'passed': bool, 'details': {...} }
+    """
     if result is None:
         # default to fail
         return {'score': 0.0, 'passed': False, 'details': {}}
@@ -92,12 +195,49 @@ def evaluate_metric(spec: dict, input: any, output: any, task_runner_module: any
     }
 
 
-def evaluate(spec: dict, input: any, output: any, task_runner_module: any):
+def _get_metric_items(spec: dict) -> list:
+    """
+    Get the list of metric items from a multi-metric spec.
+    """
+    metric_items = spec['metrics']
+    if not isinstance(metric_items, list):
+        raise ValueError("metrics must be a list of items")
+    return metric_items
+
+
+def _combine_metric_results(all_metric_results: list) -> dict:
+    """
+    Combine the results of individual metrics into a single result.
+    """
+    total_score = sum(r['score'] for r in all_metric_results)
+
+    # Compute average across all metrics
+    if len(all_metric_results) > 0:
+        final_score = total_score / len(all_metric_results)
+    else:
+        final_score = 0.0  # default to fail
+
+    # Require all metrics pass
+    all_passed = all(r['passed'] for r in all_metric_results)
+
+    return {
+        'score': final_score,
+        'passed': all_passed,
+        'details': {
+            'metrics': all_metric_results,
+            'overall_score': final_score
+        }
+    }
+
+
+def evaluate(spec: dict, input: any, output: any, task_runner_module: any, retry: RetryPolicy = None):
     """
     Evaluate an output against a specification. Either:
        - spec.metrics: array of metric items
        - or the single-type approach (checklist, list, or custom).
 
+    Each evaluator call is retried on its own through `retry`, if given.
+
     Returns:
         A dictionary containing the evaluation result.
     """
@@ -106,43 +246,44 @@ def evaluate(spec: dict, input: any, output: any, task_runner_module: any):
 
     # If 'metrics' is present, do multi-metric logic
     if 'metrics' in spec:
-        metric_items = spec['metrics']
-        if not isinstance(metric_items, list):
-            raise ValueError("metrics must be a list of items")
-
         all_metric_results = []
-        total_score = 0.0
-        for metric in metric_items:
+        for metric in _get_metric_items(spec):
             # Each metric can have its own 'type', 'checklist', 'list', etc.
             metric_type = metric.get('type', 'untitled')
 
             # Evaluate just this metric, passing global_context
-            single_result = evaluate_metric(metric, input, output, task_runner_module, global_context=global_context)
-            single_score = single_result['score']
+            single_result = evaluate_metric(metric, input, output, task_runner_module, global_context=global_context, retry=retry)
 
             # Enrich with the metric_type for clarity
             single_result['metric_type'] = metric_type
 
             all_metric_results.append(single_result)
-            total_score += single_score
 
-        # Compute average across all metrics
-        if len(all_metric_results) > 0:
-            final_score = total_score / len(all_metric_results)
-        else:
-            final_score = 0.0  # default to fail
-
-        # Require all metrics pass
-        all_passed = all(r['passed'] for r in all_metric_results)
-
-        return {
-            'score': final_score,
-            'passed': all_passed,
-            'details': {
-                'metrics': all_metric_results,
-                'overall_score': final_score
-            }
-        }
+        return _combine_metric_results(all_metric_results)
 
     # Else fallback to old single-check approach, passing global_context:
-    return evaluate_metric(spec, input, output, task_runner_module, global_context=global_context)
+    return evaluate_metric(spec, input, output, task_runner_module, global_context=global_context, retry=retry)
+
+
+async def evaluate_async(spec: dict, input: any, output: any, task_runner_module: any, retry: RetryPolicy = None):
+    """
+    Async counterpart of `evaluate`. Metrics of a multi-metric spec are
+    judged concurrently.
+
+    Returns:
+        A dictionary containing the evaluation result.
+    """
+    global_context = spec.get('meta', {}).get('context', '')
+
+    if 'metrics' in spec:
+        metric_items = _get_metric_items(spec)
+        all_metric_results = await asyncio.gather(*(
+            evaluate_metric_async(metric, input, output, task_runner_module, global_context=global_context, retry=retry)
+            for metric in metric_items
+        ))
+        for metric, single_result in zip(metric_items, all_metric_results):
+            single_result['metric_type'] = metric.get('type', 'untitled')
+
+        return _combine_metric_results(list(all_metric_results))
+
+    return await evaluate_metric_async(spec, input, output, task_runner_module, global_context=global_context, retry=retry)
@@ -0,0 +1,266 @@
+"""
+Progress events published while a job runs.
+
+Workers publish typed events to an EventBus. The thread consuming the bus
+dispatches every event to the subscribed sinks (the CLI progress display, the
+job status writer, ...) and relays it to the caller, blocking while there is
+nothing to report instead of polling.
+"""
+
+from dataclasses import dataclass
+from typing import Any, Callable, Dict, Iterator, List, Optional
+from rich.console import Console
+import queue
+import time
+
+from .storage import JobModel, TaskModel, TaskStatus
+
+
+class EventType:
+    """
+    Enumeration of progress event types.
+    """
+    # Job lifecycle
+    JOB_STARTED = "job_started"
+    JOB_COMPLETED = "job_completed"
+    JOB_FAILED = "job_failed"
+    # The job was cancelled: in-flight tasks finished, the others never started
+    JOB_CANCELLED = "job_cancelled"
+    # Task lifecycle
+    STARTED = "started"
+    EXECUTED = "executed"
+    EVALUATED = "evaluated"
+    FAILED = "failed"
+    TIMED_OUT = "timed_out"
+    FINISHED = "finished"
+    # The task finished in an earlier run and its result is reused
+    CARRIED_OVER = "carried_over"
+    # All tasks of a group have finished
+    GROUP_FINISHED = "group_finished"
+    # Final results of the scheduled tasks
+    RESULTS = "results"
+
+
+TASK_EVENTS = (
+    EventType.STARTED,
+    EventType.EXECUTED,
+    EventType.EVALUATED,
+    EventType.FAILED,
+    EventType.TIMED_OUT,
+    EventType.FINISHED,
+    EventType.CARRIED_OVER,
+)
+
+
+@dataclass
+class ProgressEvent:
+    """
+    A single progress event of a job or one of its tasks.
+    """
+    type: str
+    total: int = 0
+    group_id: Optional[str] = None
+    task_number: Optional[int] = None
+    task_id: Optional[str] = None
+    challenge_id: Optional[str] = None
+    repeat: int = 0
+    repeats: int = 1
+    passed: Optional[bool] = None
+    score: Optional[float] = None
+    error: Optional[str] = None
+    result: Any = None
+    results: Optional[List[Any]] = None
+    summary: Optional[Dict[str, Any]] = None
+
+    def task_status(self) -> Optional[str]:
+        """
+        Get the status of the task after this event, if it changes it.
+        """
+        if self.type == EventType.STARTED:
+            return TaskStatus.RUNNING
+        if self.type == EventType.EXECUTED:
+            return TaskStatus.EVALUATING
+        if self.type in (EventType.EVALUATED, EventType.CARRIED_OVER):
+            return TaskStatus.COMPLETED if self.passed else TaskStatus.FAILED
+        if self.type == EventType.FAILED:
+            return TaskStatus.FAILED
+        if self.type == EventType.TIMED_OUT:
+            return TaskStatus.TIMEOUT
+        return None
+
+    def to_update(self) -> Dict[str, Any]:
+        """
+        Convert the event to a status update dictionary, as yielded by run_experiment.
+        """
+        if self.type == EventType.JOB_STARTED:
+            return {"status": TaskStatus.STARTING, "total": self.total}
+        if self.type == EventType.JOB_COMPLETED:
+            update = {
+                "status": TaskStatus.COMPLETED,
+                "current": self.total,
+                "total": self.total,
+                "results": self.results or [],
+            }
+            if self.summary:  # Stopped early
+                update["current"] = self.summary["finished"]
+                update["summary"] = self.summary
+            return update
+        if self.type == EventType.JOB_FAILED:
+            return {"status": TaskStatus.FAILED, "total": self.total, "error": self.error}
+        if self.type == EventType.JOB_CANCELLED:
+            return {
+                "status": TaskStatus.CANCELLED,
+                "total": self.total,
+                "results": self.results or [],
+                "summary": self.summary,
+            }
+        if self.type == EventType.GROUP_FINISHED:
+            return {
+                "status": TaskStatus.RUNNING,
+                "event": self.type,
+                "total": self.total,
+                "group_id": self.group_id,
+                "group_summary": self.summary,
+            }
+
+        # Task events: the job itself is running (or evaluating)
+        update = {
+            "status": (
+                TaskStatus.EVALUATING
+                if self.type == EventType.EXECUTED
+                else TaskStatus.RUNNING
+            ),
+            "event": self.type,
+            "current": self.task_number,
+            "total": self.total,
+        }
+        if self.group_id:
+            update["group_id"] = self.group_id
+        if self.task_id:
+            update["task_id"] = self.task_id
+        if self.challenge_id:
+            update["challenge_id"] = self.challenge_id
+        if self.type == EventType.STARTED:
+            update["details"] = (
+                f"Running task {self.task_number}/{self.total}"
+                + (f" (repeat {self.repeat + 1}/{self.repeats})" if self.repeat > 0 else "")
+            )
+        elif self.type == EventType.EXECUTED:
+            update["details"] = f"Evaluating task {self.task_number}/{self.total}"
+        elif self.type in (EventType.EVALUATED, EventType.CARRIED_OVER):
+            update["task_status"] = self.task_status()
+            update["score"] = self.score
+        elif self.type in (EventType.FAILED, EventType.TIMED_OUT):
+            update["task_status"] = self.task_status()
+            update["error"] = self.error
+        return update
+
+
+class EventBus:
+    """
+    Thread-safe channel from task workers to the thread consuming progress.
+
+    Workers call `publish` from any thread (or event loop). The consuming
+    thread reads events with `drain` or `wait`, which dispatch each event to
+    the subscribed sinks in that thread before returning it.
+    """
+
+    def __init__(self):
+        self._queue = queue.SimpleQueue()
+        self._sinks: List[Callable[[ProgressEvent], None]] = []
+
+    def subscribe(self, sink: Callable[[ProgressEvent], None]):
+        """
+        Subscribe a sink, called with every event in the consuming thread.
+        """
+        self._sinks.append(sink)
+
+    def publish(self, event: ProgressEvent):
+        """
+        Publish an event. Safe to call from any thread.
+        """
+        self._queue.put(event)
+
+    def drain(self) -> Iterator[ProgressEvent]:
+        """
+        Yield the events published so far, without blocking.
+        """
+        while True:
+            try:
+                event = self._queue.get_nowait()
+            except queue.Empty:
+                return
+            yield self._dispatch(event)
+
+    def wait(self) -> ProgressEvent:
+        """
+        Block until the next event is published, and return it.
+        """
+        return self._dispatch(self._queue.get())
+
+    def _dispatch(self, event: ProgressEvent) -> ProgressEvent:
+        for sink in self._sinks:
+            try:
+                sink(event)
+            except Exception as e:
+                # A failing sink should not stop the job
+                Console().print(f"[red]Error in progress sink: {str(e)}[/red]")
+        return event
+
+
+class JobStatusSink:
+    """
+    Keep the job row in the database in sync with progress events.
+
+    The task status map is maintained from the events themselves, so no query
+    over the job's tasks is needed per update, and so are the summaries of the
+    groups that have finished. Task events are written at most once per
+    `min_interval` seconds; job and group events are always written.
+    """
+
+    def __init__(self, job: JobModel, min_interval: float = 0.5):
+        self.job = job
+        self.min_interval = min_interval
+        self.status_map: Dict[str, str] = {}
+        self.groups: Dict[str, Dict[str, Any]] = {}
+        self._last_error: Optional[str] = None
+        self._last_write = 0.0
+
+    def __call__(self, event: ProgressEvent):
+        if event.type == EventType.RESULTS:
+            return
+
+        task_status = event.task_status()
+        if event.task_id and task_status:
+            self.status_map[event.task_id] = task_status
+        if event.type in (EventType.FAILED, EventType.TIMED_OUT):
+            self._last_error = event.error
+        if event.type == EventType.GROUP_FINISHED:
+            self.groups[event.group_id] = event.summary
+
+        job_event = event.type not in TASK_EVENTS
+        now = time.monotonic()
+        if not job_event and now - self._last_write < self.min_interval:
+            return
+        self._last_write = now
+
+        if event.type in (
+            EventType.JOB_COMPLETED, EventType.JOB_FAILED, EventType.JOB_CANCELLED
+        ):
+            # Reconcile with the database once at the end of the job
+            self.status_map = TaskModel.get_status_map(self.job.id)
+
+        update = event.to_update()
+        details = {k: v for k, v in update.items() if k != "results"}
+        details["status_map"] = dict(self.status_map)
+        if self.groups:
+            details["groups"] = dict(self.groups)
+        if self._last_error and "error" not in details:
+            details["error"] = self._last_error
+
+        self.job.update(
+            status=update["status"],
+            total_tasks=update.get("total", 0),
+            current_task=update.get("current"),
+            details=details,
+        )
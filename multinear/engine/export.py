@@ -0,0 +1,43 @@
+from typing import Dict, Any
+
+from .storage import JobModel, TaskModel, AggregationResultModel
+
+
+def export_job(job: JobModel) -> Dict[str, Any]:
+    """
+    Export a job with its tasks and aggregations, as written by `multinear export`.
+
+    Args:
+        job: The job to export
+
+    Returns:
+        JSON-serializable dict, with the tasks keyed by challenge ID
+    """
+    export_data = {
+        "job_id": job.id,
+        "project_id": job.project_id,
+        "created_at": job.created_at.isoformat(),
+        "finished_at": job.finished_at.isoformat() if job.finished_at else None,
+        "status": job.status,
+        "total_tasks": job.total_tasks,
+        "model": job.get_model_summary(),
+        "details": job.details,
+        "tasks": {}  # We'll populate this with detailed task info
+    }
+
+    # Get detailed task information
+    tasks = TaskModel.list(job.id)
+    for task in tasks:
+        export_data["tasks"][task.challenge_id] = task.to_dict()
+
+    # Get aggregation results if available
+    aggregations = AggregationResultModel.find_by_job(job.id)
+    if aggregations:
+        export_data["aggregations"] = {}
+        for aggregation in aggregations:
+            export_data["aggregations"][aggregation.aggregation_type] = {
+                "results": aggregation.results,
+                "created_at": aggregation.created_at.isoformat()
+            }
+
+    return export_data
@@ -6,6 +6,8 @@ from jsonpath_ng import parse
 from autoevals.llm import OpenAILLMClassifier, DEFAULT_MODEL
 from braintrust_core.score import Score
 
+from .rate_limit import create_chat_completion, create_chat_completion_async
+
 
 # Regex patterns for number extraction (order matters - most specific first)
 NUMERIC_PATTERNS = [
@@ -85,6 +87,34 @@ class NumberExtractor:
         if not self.use_llm:
             return None, {"error": "LLM extraction disabled"}
         
+        try:
+            # Create a simple LLM classifier for extraction
+            from openai import OpenAI
+            client = OpenAI()
+            
+            response = create_chat_completion(client, **self._llm_request(text, extraction_hint))
+            return self._parse_llm_response(response)
+                
+        except Exception as e:
+            return None, {"error": f"LLM extraction failed: {str(e)}"}
+    
+    async def extract_llm_async(self, text: str, extraction_hint: str = "the numeric value") -> Tuple[Optional[float], Dict[str, Any]]:
+        """Extract number using LLM assistance through the async OpenAI client."""
+        if not self.use_llm:
+            return None, {"error": "LLM extraction disabled"}
+        
+        try:
+            from openai import AsyncOpenAI
+            client = AsyncOpenAI()
+            
+            response = await create_chat_completion_async(client, **self._llm_request(text, extraction_hint))
+            return self._parse_llm_response(response)
+                
+        except Exception as e:
+            return None, {"error": f"LLM extraction failed: {str(e)}"}
+    
+    def _llm_request(self, text: str, extraction_hint: str) -> Dict[str, Any]:
+        """Build the chat completion request for LLM extraction."""
         prompt = f"""Extract the numeric value that represents {extraction_hint} from the following text.
 
 Text: {text}
@@ -98,36 +128,30 @@ Requirements:
 
 Extracted value:"""
         
+        return {
+            "model": self.model,
+            "messages": [{"role": "user", "content": prompt}],
+            "max_tokens": 50,
+            "temperature": 0
+        }
+    
+    def _parse_llm_response(self, response: Any) -> Tuple[Optional[float], Dict[str, Any]]:
+        """Parse the numeric value out of an LLM extraction response."""
+        result = response.choices[0].message.content.strip()
+        
+        if result == "NOT_FOUND" or not result:
+            return None, {"error": "LLM could not find numeric value", "llm_response": result}
+        
+        # Try to parse the LLM response
         try:
-            # Create a simple LLM classifier for extraction
-            from openai import OpenAI
-            client = OpenAI()
-            
-            response = client.chat.completions.create(
-                model=self.model,
-                messages=[{"role": "user", "content": prompt}],
-                max_tokens=50,
-                temperature=0
-            )
-            
-            result = response.choices[0].message.content.strip()
-            
-            if result == "NOT_FOUND" or not result:
-                return None, {"error": "LLM could not find numeric value", "llm_response": result}
-            
-            # Try to parse the LLM response
-            try:
-                value = float(result)
-                return value, {
-                    "extraction_method": "llm",
-                    "llm_response": result,
-                    "confidence": "medium"
-                }
-            except ValueError:
-                return None, {"error": "LLM returned non-numeric value", "llm_response": result}
-                
-        except Exception as e:
-            return None, {"error": f"LLM extraction failed: {str(e)}"}
+            value = float(result)
+            return value, {
+                "extraction_method": "llm",
+                "llm_response": result,
+                "confidence": "medium"
+            }
+        except ValueError:
+            return None, {"error": "LLM returned non-numeric value", "llm_response": result}
     
     def extract_jsonpath(self, data: Any, path: str) -> Tuple[Optional[float], Dict[str, Any]]:
         """Extract number using JSONPath from structured data."""
@@ -420,13 +444,33 @@ class NumericEvaluator:
                 'metadata': {'error': validation_result[1]}
             }
         
-        expected = spec['expected']
-        method = spec['method']
         extraction_hint = spec.get('extraction_hint', 'the numeric value')
         
         # Extract the numeric value
         extracted_value, extraction_metadata = self._extract_value(output, spec, extraction_hint)
         
+        return self._score_extracted_value(extracted_value, extraction_metadata, spec)
+    
+    async def eval_async(self, output: Any, spec: Dict[str, Any], input: Any = None) -> Dict[str, Any]:
+        """Evaluate numeric output against specification, using async LLM extraction."""
+        validation_result = self._validate_config(spec)
+        if not validation_result[0]:
+            return {
+                'score': 0.0,
+                'metadata': {'error': validation_result[1]}
+            }
+        
+        extraction_hint = spec.get('extraction_hint', 'the numeric value')
+        
+        extracted_value, extraction_metadata = await self._extract_value_async(output, spec, extraction_hint)
+        
+        return self._score_extracted_value(extracted_value, extraction_metadata, spec)
+    
+    def _score_extracted_value(self, extracted_value: Optional[float], extraction_metadata: Dict[str, Any], spec: Dict[str, Any]) -> Dict[str, Any]:
+        """Compare an extracted value with the expected one and build the result."""
+        expected = spec['expected']
+        method = spec['method']
+        
         if extracted_value is None:
             return {
                 'score': 0.0,
@@ -461,6 +505,15 @@ class NumericEvaluator:
             'metadata': final_metadata
         }
     
+    def _output_text(self, output: Any) -> Optional[str]:
+        """Convert output to string for text-based extraction."""
+        if isinstance(output, str):
+            return output
+        try:
+            return str(output)
+        except:
+            return None
+    
     def _extract_value(self, output: Any, spec: Dict[str, Any], extraction_hint: str) -> Tuple[Optional[float], Dict[str, Any]]:
         """Extract numeric value using the appropriate method."""
         # Always use JSONPath if path is specified
@@ -470,13 +523,9 @@ class NumericEvaluator:
             return value, metadata
         
         # Convert output to string for text-based extraction
-        if not isinstance(output, str):
-            try:
-                text = str(output)
-            except:
-                return None, {"error": "Could not convert output to string"}
-        else:
-            text = output
+        text = self._output_text(output)
+        if text is None:
+            return None, {"error": "Could not convert output to string"}
         
         # Get preprocessing option
         preprocessing = spec.get('preprocessing')
@@ -493,14 +542,7 @@ class NumericEvaluator:
                 return value, llm_metadata
             
             # If LLM fails with specific hint, try regex as fallback
-            value, regex_metadata = self.extractor.extract_regex(text, extraction_hint, preprocessing)
-            if value is not None:
-                # Mark that we fell back to regex
-                regex_metadata['llm_extraction_failed'] = llm_metadata.get('error', 'LLM extraction failed')
-                return value, regex_metadata
-            
-            # Both failed, return LLM error as primary
-            return None, llm_metadata
+            return self._regex_fallback(text, extraction_hint, preprocessing, llm_metadata)
         
         # Use regex extraction as default (no specific hint or LLM disabled)
         value, metadata = self.extractor.extract_regex(text, extraction_hint, preprocessing)
@@ -523,6 +565,49 @@ class NumericEvaluator:
         
         return None, metadata
     
+    async def _extract_value_async(self, output: Any, spec: Dict[str, Any], extraction_hint: str) -> Tuple[Optional[float], Dict[str, Any]]:
+        """Async counterpart of `_extract_value`, awaiting LLM extraction."""
+        if 'path' in spec:
+            return self.extractor.extract_jsonpath(output, spec['path'])
+        
+        text = self._output_text(output)
+        if text is None:
+            return None, {"error": "Could not convert output to string"}
+        
+        preprocessing = spec.get('preprocessing')
+        processed_text = text
+        if preprocessing:
+            processed_text = self.extractor.preprocess_number(text, preprocessing)
+        
+        if extraction_hint and extraction_hint != "the numeric value" and self.extractor.use_llm:
+            value, llm_metadata = await self.extractor.extract_llm_async(processed_text, extraction_hint)
+            if value is not None:
+                return value, llm_metadata
+            return self._regex_fallback(text, extraction_hint, preprocessing, llm_metadata)
+        
+        value, metadata = self.extractor.extract_regex(text, extraction_hint, preprocessing)
+        if value is not None:
+            return value, metadata
+        
+        if self.extractor.use_llm:
+            value, llm_metadata = await self.extractor.extract_llm_async(processed_text, extraction_hint or "the numeric value")
+            if value is not None:
+                return value, llm_metadata
+            metadata['llm_fallback_error'] = llm_metadata.get('error', 'Unknown LLM error')
+        
+        return None, metadata
+    
+    def _regex_fallback(self, text: str, extraction_hint: str, preprocessing: Optional[str], llm_metadata: Dict[str, Any]) -> Tuple[Optional[float], Dict[str, Any]]:
+        """Fall back to regex extraction after a failed LLM extraction with a specific hint."""
+        value, regex_metadata = self.extractor.extract_regex(text, extraction_hint, preprocessing)
+        if value is not None:
+            # Mark that we fell back to regex
+            regex_metadata['llm_extraction_failed'] = llm_metadata.get('error', 'LLM extraction failed')
+            return value, regex_metadata
+        
+        # Both failed, return LLM error as primary
+        return None, llm_metadata
+    
     def _compare_values(self, actual: float, expected: float, spec: Dict[str, Any]) -> Tuple[float, Dict[str, Any]]:
         """Compare actual and expected values using the specified method."""
         method = spec['method']
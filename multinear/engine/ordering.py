@@ -0,0 +1,79 @@
+"""
+History-aware ordering of the tasks of a job.
+
+A job ends when its slowest tasks do: when they start last, one straggler
+keeps running while every other worker is idle. With `meta.schedule: history`,
+tasks are therefore started longest first (LPT), by their duration in recent
+jobs of the project. Tasks without history are predicted to take the median
+duration of the others.
+
+By default (`meta.schedule: config`), tasks start in the order of the config.
+"""
+
+from typing import Dict, Any, List, Tuple
+import statistics
+
+from .storage import TaskModel
+
+
+# Number of recent runs of a task whose median duration predicts the next one
+HISTORY_SIZE = 5
+
+SCHEDULES = ("history", "config")
+
+
+def get_schedule(config: Dict[str, Any]) -> str:
+    """
+    How tasks are ordered, from `meta.schedule`: `config` (default) or `history`.
+    """
+    schedule = config.get("meta", {}).get("schedule", "config")
+    if schedule not in SCHEDULES:
+        raise ValueError(
+            f"Unknown schedule '{schedule}', expected 'history' or 'config'"
+        )
+    return schedule
+
+
+def predict_durations(project_id: str, challenge_ids: List[str]) -> Dict[str, float]:
+    """
+    Predict the duration of tasks from their recent runs in the project.
+
+    Returns:
+        Dict of challenge ID to predicted seconds, for tasks with history only
+    """
+    history = TaskModel.recent_durations(project_id, challenge_ids, HISTORY_SIZE)
+    return {
+        challenge_id: statistics.median(durations)
+        for challenge_id, durations in history.items()
+    }
+
+
+def longest_first(
+    challenges: List[Tuple[str, Dict[str, Any]]], predictions: Dict[str, float]
+) -> List[Tuple[str, Dict[str, Any]]]:
+    """
+    Order challenges by predicted duration, longest first. A challenge takes
+    as long as its slowest execution; the order of the config breaks ties.
+
+    Args:
+        challenges: Tuples of (group ID, planned task group)
+        predictions: Predicted seconds by challenge ID, as from predict_durations
+
+    Returns:
+        The challenges in the order to start them
+    """
+    if not predictions:
+        return list(challenges)
+    fallback = statistics.median(predictions.values())
+
+    def predicted(challenge):
+        _, group = challenge
+        return max(
+            (
+                predictions.get(execution["challenge_id"], fallback)
+                for execution in group["executions"]
+            ),
+            default=fallback,
+        )
+
+    return sorted(challenges, key=predicted, reverse=True)
@@ -0,0 +1,210 @@
+"""
+Content-addressed cache of run_task outputs.
+
+Opt-in, in `meta.cache`:
+
+    meta:
+      cache:
+        enabled: true
+        max_entries: 10000
+        max_size_mb: 500
+        max_age_days: 30
+
+An output is reused when the input, the task (without its ID and evaluation settings),
+the repeat and the code are unchanged. The code is fingerprinted from
+task_runner.py, the project modules it imports and the git revision of the
+project, so editing the app invalidates its cached outputs. A cache hit skips
+run_task entirely and is marked in the task details.
+"""
+
+from pathlib import Path
+from typing import Dict, Any, List, Optional, Tuple
+import hashlib
+import json
+import sys
+
+from .storage import OutputCacheModel
+from .utils import get_input_hash
+from ..utils.git import get_git_revision
+
+
+# Task fields that only identify the task or affect its evaluation, not the
+# output of run_task
+IGNORED_FIELDS = {
+    "id",
+    "input",
+    "checklist",
+    "list",
+    "custom",
+    "numeric",
+    "metrics",
+    "weighted_score",
+    "min_score",
+    "context",
+    "repeat",
+    "rephrase",
+    "timeout",
+}
+
+# Folders of installed packages, never part of the project's code
+_VENDOR_PARTS = {"site-packages", "dist-packages", ".venv", "venv", "node_modules"}
+
+# Cache modes chosen on the command line, for a job with the cache enabled
+REFRESH = "refresh"  # Run every task again and overwrite the cached outputs
+OFF = "off"          # Neither read nor write the cache
+
+
+def _hash(value: Any) -> str:
+    return hashlib.sha256(
+        json.dumps(value, sort_keys=True, default=str).encode()
+    ).hexdigest()
+
+
+def project_modules(project_folder: Path) -> List[Path]:
+    """
+    Source files of the imported modules that live in the project folder.
+    """
+    project_folder = Path(project_folder).resolve()
+    files = set()
+    for module in list(sys.modules.values()):
+        file = getattr(module, "__file__", None)
+        if not file:
+            continue
+        path = Path(file).resolve()
+        try:
+            parts = path.relative_to(project_folder).parts
+        except ValueError:  # Outside the project
+            continue
+        if _VENDOR_PARTS & set(parts):
+            continue
+        if path.suffix == ".py" and path.exists():
+            files.add(path)
+    return sorted(files)
+
+
+def code_fingerprint(task_runner_path: Path, project_folder: Path) -> str:
+    """
+    Fingerprint of the code producing the outputs: the contents of
+    task_runner.py and of the imported project modules, and the git revision.
+    Call it after loading the task runner, so that its imports are known.
+    """
+    digest = hashlib.sha256()
+    files = {Path(task_runner_path).resolve(), *project_modules(project_folder)}
+    for path in sorted(files):
+        digest.update(str(path.relative_to(Path(project_folder).resolve())).encode())
+        digest.update(hashlib.sha256(path.read_bytes()).digest())
+    digest.update((get_git_revision(project_folder) or "").encode())
+    return digest.hexdigest()
+
+
+class OutputCache:
+    """
+    Cache of run_task outputs for one job, bound to the fingerprint of its code.
+    """
+
+    def __init__(
+        self,
+        fingerprint: str,
+        refresh: bool = False,
+        max_entries: Optional[int] = None,
+        max_size_mb: Optional[float] = None,
+        max_age_days: Optional[float] = None,
+    ):
+        self.fingerprint = fingerprint
+        self.refresh = refresh
+        self.max_entries = max_entries
+        self.max_size_mb = max_size_mb
+        self.max_age_days = max_age_days
+
+    @classmethod
+    def from_config(
+        cls,
+        config: Dict[str, Any],
+        task_runner_path: Path,
+        project_folder: Path,
+        mode: Optional[str] = None,
+    ) -> Optional["OutputCache"]:
+        """
+        Build the cache of a job from `meta.cache`, unless it is disabled.
+
+        Args:
+            config: Configuration dictionary
+            task_runner_path: Path to task_runner.py, already loaded
+            project_folder: Project folder
+            mode: REFRESH or OFF; None uses the cache as configured
+
+        Returns:
+            The cache, or None when caching is off
+        """
+        settings = config.get("meta", {}).get("cache")
+        if isinstance(settings, bool):
+            settings = {"enabled": settings}
+        settings = settings or {}
+        # A cache section without `enabled` turns the cache on
+        if mode == OFF or not settings.get("enabled", bool(settings)):
+            return None
+        return cls(
+            code_fingerprint(task_runner_path, project_folder),
+            refresh=mode == REFRESH,
+            max_entries=settings.get("max_entries"),
+            max_size_mb=settings.get("max_size_mb"),
+            max_age_days=settings.get("max_age_days"),
+        )
+
+    def key(self, task: Dict[str, Any], input: Any, repeat: int = 0) -> str:
+        """
+        Cache key of a run_task call. The repeat is part of the key, so that
+        repeats stay independent samples of the output.
+        """
+        fields = {k: v for k, v in task.items() if k not in IGNORED_FIELDS}
+        return _hash({
+            "input": get_input_hash(input),
+            "task": fields,
+            "repeat": repeat,
+            "code": self.fingerprint,
+        })
+
+    def get(self, key: str) -> Optional[Tuple[Dict[str, Any], List[Dict[str, Any]]]]:
+        """
+        Look up a cached output.
+
+        Returns:
+            Tuple of (task result, logs) with the hit marked in the details,
+            or None on a miss (always when refreshing)
+        """
+        if self.refresh:
+            return None
+        entry = OutputCacheModel.get(key, self.max_age_days)
+        if entry is None:
+            return None
+        details = dict(entry.details or {})
+        details["cache"] = {
+            "hit": True,
+            "key": key,
+            "cached_at": entry.created_at.isoformat(),
+        }
+        return {"output": entry.output, "details": details}, entry.logs or []
+
+    def put(self, key: str, task_result: Dict[str, Any], logs: List[Dict[str, Any]]):
+        """
+        Store the output of a run_task call.
+        """
+        output = task_result.get("output")
+        details = task_result.get("details", {})
+        size = len(json.dumps([output, details, logs], default=str).encode())
+        OutputCacheModel.put(key, output, details, logs, size)
+
+    def evict(self) -> int:
+        """
+        Apply the size and age limits.
+
+        Returns:
+            Number of entries evicted
+        """
+        if not (self.max_entries or self.max_size_mb or self.max_age_days):
+            return 0
+        return OutputCacheModel.evict(
+            max_entries=self.max_entries,
+            max_size=int(self.max_size_mb * 1024 * 1024) if self.max_size_mb else None,
+            max_age_days=self.max_age_days,
+        )
@@ -0,0 +1,147 @@
+from typing import Dict, Any, List, Tuple
+from concurrent.futures import ProcessPoolExecutor
+import asyncio
+import importlib.util
+import inspect
+import multiprocessing
+import multiprocessing.util
+
+from ..utils.capture import OutputCapture
+from .runner_state import (
+    end_run, end_worker_state, has_worker_state, init_worker_state,
+)
+
+
+# Task runner module loaded once in each worker process, with its init_worker state
+_worker_module = None
+_worker_state = None
+
+
+def load_task_runner(task_runner_path: str):
+    """
+    Load the task_runner.py module from the given path.
+
+    Args:
+        task_runner_path: Path to the task_runner.py file
+
+    Returns:
+        The loaded module
+    """
+    spec = importlib.util.spec_from_file_location("task_runner", task_runner_path)
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module
+
+
+def _init_worker(task_runner_path: str):
+    """
+    Initialize a worker process: load task_runner.py and call start_run and
+    init_worker once. end_worker and end_run are called when it exits.
+    """
+    global _worker_module, _worker_state
+    _worker_module = load_task_runner(task_runner_path)
+    start_run = getattr(_worker_module, "start_run", None)
+    if start_run is not None:
+        if inspect.iscoroutinefunction(start_run):
+            asyncio.run(start_run())
+        else:
+            start_run()
+    if has_worker_state(_worker_module):
+        _worker_state = init_worker_state(_worker_module)
+    # Run by multiprocessing as the worker exits, unlike atexit handlers
+    multiprocessing.util.Finalize(None, _end_worker, exitpriority=10)
+
+
+def _end_worker():
+    """
+    Tear down a worker process: call end_worker and end_run.
+    """
+    if has_worker_state(_worker_module):
+        end_worker_state(_worker_module, _worker_state)
+    end_run(_worker_module)
+
+
+def _with_state(input: Any) -> Tuple[Any, ...]:
+    """
+    Arguments of run_task or run_tasks: the input, and the worker's state if kept.
+    """
+    if has_worker_state(_worker_module):
+        return input, _worker_state
+    return (input,)
+
+
+def _run_task_in_worker(input: Any) -> Tuple[Dict[str, Any], List[Dict[str, Any]]]:
+    """
+    Run run_task in a worker process, capturing its output.
+
+    Only the input is sent to the worker, and the result is returned together
+    with the captured logs in a single message.
+    """
+    with OutputCapture() as capture:
+        if inspect.iscoroutinefunction(_worker_module.run_task):
+            task_result = asyncio.run(_worker_module.run_task(*_with_state(input)))
+        else:
+            task_result = _worker_module.run_task(*_with_state(input))
+    return task_result, capture.logs
+
+
+def _run_tasks_in_worker(inputs: List[Any]) -> Tuple[List[Any], List[Dict[str, Any]]]:
+    """
+    Run run_tasks on a batch of inputs in a worker process, capturing its output.
+    """
+    with OutputCapture() as capture:
+        if inspect.iscoroutinefunction(_worker_module.run_tasks):
+            task_results = asyncio.run(_worker_module.run_tasks(*_with_state(inputs)))
+        else:
+            task_results = _worker_module.run_tasks(*_with_state(inputs))
+    return list(task_results), capture.logs
+
+
+class ProcessTaskRunner:
+    """
+    Run run_task in a pool of worker processes, for CPU-bound task runners.
+
+    Each worker loads task_runner.py and calls start_run (and init_worker)
+    once. Everything else
+    (evaluation, custom evaluators, database writes) stays in the parent
+    process, so SQLite is only ever written from one process. Attributes other
+    than run_task are read from the task runner module loaded in the parent.
+    """
+
+    def __init__(self, task_runner_path: str, task_runner_module, max_workers: int):
+        self.task_runner_module = task_runner_module
+        # Spawn fresh interpreters rather than forking a multi-threaded parent
+        self._pool = ProcessPoolExecutor(
+            max_workers=max_workers,
+            mp_context=multiprocessing.get_context("spawn"),
+            initializer=_init_worker,
+            initargs=(str(task_runner_path),),
+        )
+
+    def __getattr__(self, name):
+        return getattr(self.task_runner_module, name)
+
+    def run_task_captured(self, input: Any) -> Tuple[Dict[str, Any], List[Dict[str, Any]]]:
+        """
+        Run run_task in a worker process and wait for its result.
+
+        Returns:
+            Tuple of (task result, captured logs)
+        """
+        return self._pool.submit(_run_task_in_worker, input).result()
+
+    def run_tasks_captured(self, inputs: List[Any]) -> Tuple[List[Any], List[Dict[str, Any]]]:
+        """
+        Run run_tasks on a batch of inputs in a worker process and wait for
+        its results.
+
+        Returns:
+            Tuple of (task results, captured logs)
+        """
+        return self._pool.submit(_run_tasks_in_worker, inputs).result()
+
+    def close(self):
+        """
+        Shut down the worker processes.
+        """
+        self._pool.shutdown(wait=True, cancel_futures=True)
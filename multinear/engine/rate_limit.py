@@ -0,0 +1,287 @@
+"""
+Rate limiting of LLM and task runner requests.
+
+Limits are configured per model (or `run_task`) in `meta.rate_limits`:
+
+    meta:
+      rate_limits:
+        gpt-4o-mini:
+          requests_per_minute: 500
+          tokens_per_minute: 200000
+        run_task:
+          requests_per_minute: 60
+
+The token buckets live in the project database, so concurrent `multinear run`
+processes and the web server's background jobs share one budget. Rate limit
+headers and `Retry-After` of provider responses pause the bucket for everyone.
+"""
+
+from typing import Dict, Any, Callable, Mapping, Optional
+import asyncio
+import json
+import re
+import time
+
+from .storage import RateLimitModel
+
+
+# Name of the bucket used for run_task calls
+RUN_TASK = "run_task"
+
+# Tokens reserved for the completion when the request does not set max_tokens
+DEFAULT_COMPLETION_TOKENS = 512
+
+# How many times a request rejected with a 429 is retried after waiting
+MAX_RATE_LIMIT_RETRIES = 3
+
+
+def estimate_tokens(*parts: Any) -> int:
+    """
+    Rough token count of a request: about 4 characters per token.
+    """
+    text = "".join(p if isinstance(p, str) else json.dumps(p, default=str) for p in parts)
+    return len(text) // 4 + 1
+
+
+def parse_reset(value: Optional[str]) -> Optional[float]:
+    """
+    Parse a reset duration header such as "1s", "250ms" or "6m0s" into seconds.
+    """
+    if not value:
+        return None
+    try:
+        return float(value)
+    except ValueError:
+        pass
+    units = {"h": 3600.0, "m": 60.0, "s": 1.0, "ms": 0.001}
+    matches = re.findall(r"([\d.]+)(ms|h|m|s)", value)
+    if not matches:
+        return None
+    return sum(float(amount) * units[unit] for amount, unit in matches)
+
+
+def is_rate_limit_error(error: Exception) -> bool:
+    """
+    Whether an exception is a provider 429 (e.g. openai.RateLimitError).
+    """
+    return (
+        type(error).__name__ == "RateLimitError"
+        or getattr(error, "status_code", None) == 429
+    )
+
+
+class RateLimiter:
+    """
+    Token-bucket rate limiter for requests and tokens per minute, per name.
+
+    Names without a configured limit are not throttled and keep no shared
+    state, but requests rejected with a 429 are still retried after the wait
+    requested by the provider.
+    """
+
+    def __init__(self, limits: Optional[Dict[str, Dict[str, Any]]] = None):
+        self.limits = limits or {}
+
+    def _buckets(self, name: str, tokens: int):
+        """
+        Yield (key, capacity, rate per second, cost) for the buckets of a request.
+        """
+        limit = self.limits.get(name, {})
+        rpm = limit.get("requests_per_minute")
+        tpm = limit.get("tokens_per_minute")
+        yield f"{name}:requests", rpm, (rpm / 60.0 if rpm else None), 1
+        if tpm and tokens:
+            yield f"{name}:tokens", tpm, tpm / 60.0, tokens
+
+    def _try_acquire(self, name: str, tokens: int) -> float:
+        if name not in self.limits:
+            return 0.0
+        for key, capacity, rate, cost in self._buckets(name, tokens):
+            wait = RateLimitModel.acquire(key, capacity, rate, cost)
+            if wait > 0:
+                # Give back what was taken from the previous buckets
+                for prev_key, prev_capacity, _, prev_cost in self._buckets(name, tokens):
+                    if prev_key == key:
+                        break
+                    if prev_capacity:
+                        RateLimitModel.adjust(prev_key, prev_cost)
+                return wait
+        return 0.0
+
+    def acquire(self, name: str, tokens: int = 0):
+        """
+        Block until a request of `tokens` tokens to `name` is allowed.
+        """
+        while (wait := self._try_acquire(name, tokens)) > 0:
+            time.sleep(wait)
+
+    async def acquire_async(self, name: str, tokens: int = 0):
+        """
+        Wait on the event loop until a request of `tokens` tokens to `name` is allowed.
+        """
+        while (wait := await asyncio.to_thread(self._try_acquire, name, tokens)) > 0:
+            await asyncio.sleep(wait)
+
+    def settle(self, name: str, estimated: int, used: Optional[int]):
+        """
+        Correct the token bucket with the actual usage reported by the provider.
+        """
+        if used is None or not self.limits.get(name, {}).get("tokens_per_minute"):
+            return
+        RateLimitModel.adjust(f"{name}:tokens", estimated - used)
+
+    def observe(self, name: str, headers: Optional[Mapping[str, str]]):
+        """
+        Adapt to the provider's rate limit headers: pause the buckets on
+        Retry-After, or until the reset time once the remaining quota is exhausted.
+        """
+        if not headers or name not in self.limits:
+            return
+        headers = {k.lower(): v for k, v in headers.items()}
+        now = time.time()
+
+        retry_after = _retry_after(headers)
+        if retry_after:
+            RateLimitModel.block(f"{name}:requests", now + retry_after)
+
+        for kind in ("requests", "tokens"):
+            remaining = headers.get(f"x-ratelimit-remaining-{kind}")
+            reset = parse_reset(headers.get(f"x-ratelimit-reset-{kind}"))
+            if remaining is not None and reset and _to_int(remaining) == 0:
+                RateLimitModel.block(f"{name}:requests", now + reset)
+
+    def _on_error(self, name: str, error: Exception, attempt: int) -> Optional[float]:
+        """
+        Handle a failed request.
+
+        Returns:
+            None if the error should be raised, otherwise seconds to wait
+            before retrying (0 when the shared bucket already makes it wait)
+        """
+        if not is_rate_limit_error(error) or attempt >= MAX_RATE_LIMIT_RETRIES:
+            return None
+        headers = getattr(getattr(error, "response", None), "headers", None) or {}
+        headers = {k.lower(): v for k, v in headers.items()}
+        # Without a hint from the provider, back off exponentially
+        delay = _retry_after(headers) or 2.0 ** attempt
+        if name not in self.limits:
+            return delay
+        self.observe(name, headers)
+        RateLimitModel.block(f"{name}:requests", time.time() + delay)
+        return 0.0
+
+    def call(self, name: str, tokens: int, function: Callable, *args, **kwargs):
+        """
+        Call `function` within the limits of `name`, retrying after a 429.
+        """
+        attempt = 0
+        while True:
+            self.acquire(name, tokens)
+            try:
+                return function(*args, **kwargs)
+            except Exception as e:
+                delay = self._on_error(name, e, attempt)
+                if delay is None:
+                    raise
+                time.sleep(delay)
+                attempt += 1
+
+    async def call_async(self, name: str, tokens: int, function: Callable, *args, **kwargs):
+        """
+        Await `function` within the limits of `name`, retrying after a 429.
+        """
+        attempt = 0
+        while True:
+            await self.acquire_async(name, tokens)
+            try:
+                return await function(*args, **kwargs)
+            except Exception as e:
+                delay = await asyncio.to_thread(self._on_error, name, e, attempt)
+                if delay is None:
+                    raise
+                await asyncio.sleep(delay)
+                attempt += 1
+
+
+def _retry_after(headers: Dict[str, str]) -> Optional[float]:
+    """
+    Seconds to wait requested by the provider, from lowercased response headers.
+    """
+    if "retry-after-ms" in headers:
+        return parse_reset(headers["retry-after-ms"] + "ms")
+    return parse_reset(headers.get("retry-after"))
+
+
+def _to_int(value: str) -> Optional[int]:
+    try:
+        return int(value)
+    except (TypeError, ValueError):
+        return None
+
+
+# Limiter of the current process, configured from `meta.rate_limits` by run_experiment
+_limiter = RateLimiter()
+
+
+def configure_rate_limits(config: Dict[str, Any]):
+    """
+    Set up the rate limiter from the `meta.rate_limits` section of the config.
+    """
+    global _limiter
+    _limiter = RateLimiter(config.get("meta", {}).get("rate_limits", {}))
+
+
+def get_rate_limiter() -> RateLimiter:
+    """
+    Get the rate limiter of the current process. A task runner can use it to
+    throttle its own requests:
+
+        get_rate_limiter().acquire("gpt-4o", tokens=estimate_tokens(prompt))
+    """
+    return _limiter
+
+
+def create_chat_completion(client, **request) -> Any:
+    """
+    Create an OpenAI chat completion within the rate limits of its model,
+    adapting to the rate limit headers of the response.
+    """
+    limiter = get_rate_limiter()
+    model = request["model"]
+    tokens = estimate_tokens(request["messages"]) + request.get(
+        "max_tokens", DEFAULT_COMPLETION_TOKENS
+    )
+
+    def create():
+        raw = client.chat.completions.with_raw_response.create(**request)
+        limiter.observe(model, raw.headers)
+        return raw.parse()
+
+    response = limiter.call(model, tokens, create)
+    limiter.settle(model, tokens, _total_tokens(response))
+    return response
+
+
+async def create_chat_completion_async(client, **request) -> Any:
+    """
+    Async counterpart of `create_chat_completion`, for the AsyncOpenAI client.
+    """
+    limiter = get_rate_limiter()
+    model = request["model"]
+    tokens = estimate_tokens(request["messages"]) + request.get(
+        "max_tokens", DEFAULT_COMPLETION_TOKENS
+    )
+
+    async def create():
+        raw = await client.chat.completions.with_raw_response.create(**request)
+        await asyncio.to_thread(limiter.observe, model, raw.headers)
+        return raw.parse()
+
+    response = await limiter.call_async(model, tokens, create)
+    await asyncio.to_thread(limiter.settle, model, tokens, _total_tokens(response))
+    return response
+
+
+def _total_tokens(response: Any) -> Optional[int]:
+    usage = getattr(response, "usage", None)
+    return getattr(usage, "total_tokens", None)
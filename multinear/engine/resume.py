@@ -0,0 +1,79 @@
+"""
+Resuming interrupted jobs and re-running the failures of a job.
+
+Both produce the finished tasks to carry over, keyed by challenge ID; the
+scheduler reuses their results and only runs the other tasks.
+"""
+
+from typing import Dict, Any, List
+
+from .storage import JobModel, TaskModel, TaskStatus
+
+
+# Statuses of a job that is no longer running, and can be resumed
+STOPPED_STATUSES = (TaskStatus.COMPLETED, TaskStatus.FAILED, TaskStatus.CANCELLED)
+
+
+def job_stopped(job: JobModel) -> bool:
+    """
+    Whether a job is no longer running: finished, failed or cancelled. A job
+    whose process was killed before it could record that still looks running.
+    """
+    return job.status in STOPPED_STATUSES or job.finished_at is not None
+
+
+def task_result(task: TaskModel) -> Any:
+    """
+    Rebuild the result of a finished task, in the shape returned by the scheduler.
+    """
+    if task.eval_passed is None:
+        return {"error": task.error or "Task failed"}
+    return [
+        {"output": task.task_output, "details": task.task_details or {}},
+        {
+            "score": task.eval_score,
+            "passed": task.eval_passed,
+            "details": task.eval_details or {},
+        },
+    ]
+
+
+def _by_challenge(tasks: List[TaskModel]) -> Dict[str, TaskModel]:
+    # Tasks are ordered by finish time, so the latest one wins
+    return {task.challenge_id: task for task in tasks}
+
+
+def prepare_resume(job_id: str) -> Dict[str, TaskModel]:
+    """
+    Prepare an interrupted job to be resumed: tasks that were still running
+    are dropped, and the finished ones are kept. The job must have stopped
+    (see job_stopped), or its tasks in flight are lost.
+
+    Args:
+        job_id: ID of the job to resume
+
+    Returns:
+        The finished tasks of the job, keyed by challenge ID
+    """
+    TaskModel.delete_unfinished(job_id)
+    return _by_challenge(TaskModel.list_finished(job_id))
+
+
+def prepare_rerun_failed(source_job_id: str, job_id: str) -> Dict[str, TaskModel]:
+    """
+    Copy the passing tasks of a job into a new job, so that only the failed
+    (and missing) tasks run again.
+
+    Args:
+        source_job_id: ID of the job to take the passing tasks from
+        job_id: ID of the new job
+
+    Returns:
+        The copied tasks of the new job, keyed by challenge ID
+    """
+    passed = [
+        task
+        for task in _by_challenge(TaskModel.list_finished(source_job_id)).values()
+        if task.status == TaskStatus.COMPLETED
+    ]
+    return _by_challenge(TaskModel.copy_to_job(passed, job_id))
@@ -0,0 +1,150 @@
+"""
+Retry policy for transient failures of run_task and of the evaluators.
+
+Configured in `meta.retry`, with optional overrides for `run_task` and for
+`evaluators` (each evaluator call is retried on its own):
+
+    meta:
+      retry:
+        max_attempts: 3
+        backoff: 1.0        # Delay before the first retry, doubled after each one
+        max_backoff: 30.0
+        jitter: 0.25        # Random +/- fraction of the delay
+        retry_on: [ConnectionError, TimeoutError, APIConnectionError]
+        run_task:
+          max_attempts: 5
+"""
+
+from typing import Dict, Any, Callable, List, Optional
+import asyncio
+import random
+import time
+
+
+# Exception types retried when `retry_on` is not set, matched by class name
+# against the exception's class hierarchy. Rate limit errors (429) are not:
+# the rate limiter already retries them, see rate_limit.py
+DEFAULT_RETRY_ON = [
+    "ConnectionError",
+    "TimeoutError",
+    "APIConnectionError",
+    "APITimeoutError",
+    "InternalServerError",
+]
+
+DEFAULT_MAX_ATTEMPTS = 3
+DEFAULT_BACKOFF = 1.0
+DEFAULT_MAX_BACKOFF = 30.0
+DEFAULT_JITTER = 0.25
+
+# Stages that can override the shared settings
+STAGES = ("run_task", "evaluators")
+
+
+class RetryPolicy:
+    """
+    Retry a call on retryable exceptions, with exponential backoff and jitter.
+
+    An instance counts the attempts made through it, so each task execution
+    uses its own instances to record its attempts.
+    """
+
+    def __init__(
+        self,
+        max_attempts: int = 1,
+        backoff: float = DEFAULT_BACKOFF,
+        max_backoff: float = DEFAULT_MAX_BACKOFF,
+        jitter: float = DEFAULT_JITTER,
+        retry_on: Optional[List[str]] = None,
+    ):
+        self.max_attempts = max(1, max_attempts)
+        self.backoff = backoff
+        self.max_backoff = max_backoff
+        self.jitter = jitter
+        self.retry_on = set(retry_on if retry_on is not None else DEFAULT_RETRY_ON)
+        self.attempts = 0
+
+    @classmethod
+    def from_config(cls, config: Dict[str, Any], stage: str) -> "RetryPolicy":
+        """
+        Build the policy of a stage ("run_task" or "evaluators") from `meta.retry`.
+        Without `meta.retry`, calls are not retried.
+        """
+        settings = config.get("meta", {}).get("retry")
+        if not settings:
+            return cls()
+        merged = {k: v for k, v in settings.items() if k not in STAGES}
+        merged.update(settings.get(stage) or {})
+        return cls(
+            max_attempts=merged.get("max_attempts", DEFAULT_MAX_ATTEMPTS),
+            backoff=merged.get("backoff", DEFAULT_BACKOFF),
+            max_backoff=merged.get("max_backoff", DEFAULT_MAX_BACKOFF),
+            jitter=merged.get("jitter", DEFAULT_JITTER),
+            retry_on=merged.get("retry_on"),
+        )
+
+    def is_retryable(self, error: BaseException) -> bool:
+        """
+        Whether the error, or one of its base classes, is listed in `retry_on`.
+        """
+        return any(klass.__name__ in self.retry_on for klass in type(error).__mro__)
+
+    def delay(self, attempt: int) -> float:
+        """
+        Seconds to wait after the given (1-indexed) failed attempt.
+        """
+        delay = min(self.max_backoff, self.backoff * 2 ** (attempt - 1))
+        return max(0.0, delay * (1 + random.uniform(-self.jitter, self.jitter)))
+
+    def _should_retry(self, error: BaseException, attempt: int) -> bool:
+        return attempt < self.max_attempts and self.is_retryable(error)
+
+    def call(self, function: Callable, *args, **kwargs) -> Any:
+        """
+        Call `function`, retrying it on retryable exceptions.
+        """
+        attempt = 0
+        while True:
+            attempt += 1
+            self.attempts += 1
+            try:
+                return function(*args, **kwargs)
+            except Exception as e:
+                if not self._should_retry(e, attempt):
+                    raise
+                time.sleep(self.delay(attempt))
+
+    async def call_async(self, function: Callable, *args, **kwargs) -> Any:
+        """
+        Await `function`, retrying it on retryable exceptions.
+        """
+        attempt = 0
+        while True:
+            attempt += 1
+            self.attempts += 1
+            try:
+                return await function(*args, **kwargs)
+            except Exception as e:
+                if not self._should_retry(e, attempt):
+                    raise
+                await asyncio.sleep(self.delay(attempt))
+
+
+def retry_call(retry: Optional[RetryPolicy], function: Callable, *args, **kwargs) -> Any:
+    """
+    Call `function` through the retry policy, if any.
+    """
+    if retry is None:
+        return function(*args, **kwargs)
+    return retry.call(function, *args, **kwargs)
+
+
+async def retry_call_async(
+    retry: Optional[RetryPolicy], function: Callable, *args, **kwargs
+) -> Any:
+    """
+    Await `function` through the retry policy, if any.
+    """
+    if retry is None:
+        return await function(*args, **kwargs)
+    return await retry.call_async(function, *args, **kwargs)
@@ -1,20 +1,32 @@
-import importlib.util
+import asyncio
+import inspect
 from pathlib import Path
-from typing import Dict, Any
+from typing import Dict, Any, Callable, Iterator, List, Tuple
 from rich.console import Console
 import yaml
 
-from .storage import JobModel, TaskModel, TaskStatus
+from .storage import JobModel, TaskModel
+from .events import EventBus, EventType, ProgressEvent
 from ..utils.git import get_git_revision
 from .run_select import select_tasks
-from .run_group import run_group
-from .aggregation import (
-    compute_aggregations, 
-    save_aggregations, 
-    display_aggregations,
-    should_compute_aggregations,
-    get_aggregation_config
+from .run_group import plan_group_executions, keep_stored_executions, get_repeats
+from .scheduler import JobScheduler
+from .process_pool import ProcessTaskRunner, load_task_runner
+from .rate_limit import configure_rate_limits
+from .concurrency import get_worker_limits
+from .output_cache import OutputCache
+from .shards import select_shard
+from .task_source import (
+    GENERATED_GROUP, GeneratedTasks, LazyTasks, filter_tasks, has_tasks,
 )
+from .worker import (
+    queue_enabled,
+    enqueue_job,
+    follow_queued_job,
+    queued_job_finished,
+)
+from .aggregation import aggregate_job
+from .runner_state import end_run
 
 
 def run_experiment(
@@ -22,6 +34,10 @@ def run_experiment(
     job: JobModel,
     challenge_id: str | None = None,
     group_id: str | None = None,
+    sinks: List[Callable[[ProgressEvent], None]] | None = None,
+    finished: Dict[str, TaskModel] | None = None,
+    cache_mode: str | None = None,
+    shard: Tuple[int, int] | None = None,
 ):
     """
     Run an experiment using the task_runner.run_task function from the project folder
@@ -31,34 +47,61 @@ def run_experiment(
         job: JobModel instance for the job being run
         challenge_id: If provided, only run the task with this challenge ID
         group_id: If provided, only run tasks from the specified group
+        sinks: Callables subscribed to the job's progress events, such as a
+            JobStatusSink keeping the job row up to date
+        finished: Tasks finished in an earlier run, keyed by challenge ID, as
+            returned by prepare_resume or prepare_rerun_failed; only the other
+            tasks are run
+        cache_mode: "off" to bypass the output cache, "refresh" to run every
+            task and overwrite the cached outputs; by default `meta.cache` decides
+        shard: If provided, (index, count) of the shard of the tasks to run,
+            as parsed by parse_shard
 
     Yields:
-        Dict containing status updates, final results, and status map
+        Dict containing status updates, and the final results on completion
     """
+    bus = EventBus()
+    for sink in sinks or []:
+        bus.subscribe(sink)
+
     try:
         console = Console()
         # Get the project folder path
         project_folder = Path(project_config["folder"])
 
         # Load config.yaml from project folder
-        config_path = (
-            project_folder
-            / ".multinear"
-            / project_config.get("config_file", "config.yaml")
-        )
-        if not config_path.exists():
-            raise FileNotFoundError(f"Config file not found at {config_path}")
+        config = load_config(project_config)
 
         # Save git revision to job details
         git_revision = get_git_revision(project_folder)
         # print(f"Git revision: {git_revision}")
         job.update(details={"git_revision": git_revision})
 
-        if not config_path.exists():
-            raise FileNotFoundError(f"Config file not found at {config_path}")
+        # Requests of this job draw from the budgets shared through the database
+        configure_rate_limits(config)
 
-        with open(config_path, "r") as f:
-            config = yaml.safe_load(f)
+        # Queued jobs only report progress, while `multinear worker` runs them
+        if queue_enabled(config):
+            if finished:
+                raise ValueError("Queued jobs can not be resumed")
+            # Tasks yielded by generate_tasks are queued along with the others
+            task_runner_path = project_folder / ".multinear" / "task_runner.py"
+            generate = None
+            if task_runner_path.exists():
+                generate = getattr(
+                    load_task_runner(task_runner_path), "generate_tasks", None
+                )
+            all_tasks = _select(
+                job, config, project_folder, challenge_id, group_id, shard, generate
+            )
+            enqueue_job(job, all_tasks, config)
+            total_tasks = job.total_tasks
+            yield from _emit(bus, ProgressEvent(EventType.JOB_STARTED, total=total_tasks))
+            console.print("[green bold]Queued the job's tasks for the workers[/green bold]")
+            for event in follow_queued_job(job, total_tasks):
+                yield from _emit(bus, event)
+            yield from _emit(bus, queued_job_finished(job, total_tasks))
+            return
 
         # Construct path to task_runner.py
         task_runner_path = project_folder / ".multinear" / "task_runner.py"
@@ -68,135 +111,289 @@ def run_experiment(
 
         # Dynamically load the task runner module
         try:
-            spec = importlib.util.spec_from_file_location(
-                "task_runner", task_runner_path
-            )
-            task_runner_module = importlib.util.module_from_spec(spec)
-            spec.loader.exec_module(task_runner_module)
+            task_runner_module = load_task_runner(task_runner_path)
         except Exception as e:
             error_msg = f"Failed to load task_runner.py: {str(e)}"
             console = Console()
             console.print(f"[red bold]{error_msg}[/red bold]")
             console.print_exception()
-            job.update(
-                status=TaskStatus.FAILED, details={"error": error_msg, "status_map": {}}
-            )
-            yield {
-                "status": TaskStatus.FAILED,
-                "total": 0,
-                "error": error_msg,
-                "status_map": {},
-            }
+            yield from _emit(bus, ProgressEvent(EventType.JOB_FAILED, error=error_msg))
             return
 
-        # Check if run_task exists in the module
-        if not hasattr(task_runner_module, "run_task"):
+        # Check if run_task (or its batch version, run_tasks) exists in the module
+        if not hasattr(task_runner_module, "run_task") and not hasattr(
+            task_runner_module, "run_tasks"
+        ):
             error_msg = f"run_task function not found in {task_runner_path}"
-            job.update(
-                status=TaskStatus.FAILED, details={"error": error_msg, "status_map": {}}
-            )
-            yield {
-                "status": TaskStatus.FAILED,
-                "total": 0,
-                "error": error_msg,
-                "status_map": {},
-            }
+            yield from _emit(bus, ProgressEvent(EventType.JOB_FAILED, error=error_msg))
             return
 
-        # Run start_run if it exists
-        if hasattr(task_runner_module, "start_run"):
+        # Thread pool by default, or worker processes for CPU-bound task runners
+        executor_type = config.get("meta", {}).get("executor", "thread")
+        if executor_type not in ("thread", "process"):
+            raise ValueError(
+                f"Unknown executor '{executor_type}', expected 'thread' or 'process'"
+            )
+
+        # Run start_run if it exists (in process mode, each worker calls it instead)
+        if hasattr(task_runner_module, "start_run") and executor_type == "thread":
             try:
-                task_runner_module.start_run()
+                if inspect.iscoroutinefunction(task_runner_module.start_run):
+                    asyncio.run(task_runner_module.start_run())
+                else:
+                    task_runner_module.start_run()
             except Exception as e:
                 error_msg = f"Error in start_run: {str(e)}"
                 console = Console()
                 console.print(f"[red bold]{error_msg}[/red bold]")
                 console.print_exception()
-                job.update(
-                    status=TaskStatus.FAILED,
-                    details={"error": error_msg, "status_map": {}},
-                )
-                yield {
-                    "status": TaskStatus.FAILED,
-                    "total": 0,
-                    "error": error_msg,
-                    "status_map": {},
-                }
+                yield from _emit(bus, ProgressEvent(EventType.JOB_FAILED, error=error_msg))
                 return
 
+        # Outputs of unchanged tasks and code are reused from the cache, if enabled
+        output_cache = OutputCache.from_config(
+            config, task_runner_path, project_folder, cache_mode
+        )
+        if output_cache is not None:
+            output_cache.evict()
+
         # Determine tasks to run based on config structure and filters
-        all_tasks = select_tasks(config, challenge_id, group_id)
+        all_tasks = _select(
+            job, config, project_folder, challenge_id, group_id, shard,
+            getattr(task_runner_module, "generate_tasks", None),
+        )
 
-        global_repeat = config.get("meta", {}).get("repeat", 1)
+        # Calculate total tasks across all groups (adaptive repeats at most);
+        # streamed and generated tasks are only counted as they are read
+        total_tasks = None
+        if not any(isinstance(g["tasks"], LazyTasks) for g in all_tasks):
+            total_tasks = 0
+            for group_data in all_tasks:
+                for task in group_data["tasks"]:
+                    total_tasks += get_repeats(task, config)["max"]
 
-        # Calculate total tasks across all groups
-        total_tasks = 0
-        for group_data in all_tasks:
-            for task in group_data["tasks"]:
-                total_tasks += task.get("repeat", global_repeat)
+        yield from _emit(bus, ProgressEvent(EventType.JOB_STARTED, total=total_tasks))
 
-        yield {"status": TaskStatus.STARTING, "total": total_tasks}
+        process_runner = None
+        if executor_type == "process":
+            max_workers = get_worker_limits(config)["execution"]["max"]
+            process_runner = ProcessTaskRunner(
+                task_runner_path, task_runner_module, max_workers
+            )
+            task_runner_module = process_runner
 
-        # Run each group of tasks
+        # Tasks of all groups share one pool, so it never drains between groups
+        # (async task runners are driven on an event loop instead of threads)
+        console.print(
+            f"[green bold]Running groups: "
+            f"{', '.join(str(g['group_id']) for g in all_tasks)}[/green bold]"
+        )
+        scheduler = JobScheduler(job, task_runner_module, config, bus, output_cache)
         all_results = []
-        current_task_offset = 0
-
-        for group_data in all_tasks:
-            console.print(f"[green bold]Running group: {group_data['group_id']}[/green bold]")
-
-            # Run the group and collect results
-            group_tasks = group_data["tasks"]
-
-            for update in run_group(
-                group_tasks,
-                job,
-                task_runner_module,
-                config,
-                current_task_offset,
-                total_tasks,
-            ):
-                if isinstance(update, list):  # Results from run_group
-                    all_results.extend(update)
-                else:  # Status update
-                    yield update
-
-            # Update the offset for the next group
-            current_task_offset += sum(
-                task.get("repeat", global_repeat) for task in group_tasks
+
+        try:
+            all_results = yield from _relay(
+                scheduler.run(all_tasks, total_tasks, finished)
             )
+        finally:
+            if process_runner is not None:
+                process_runner.close()
+            else:
+                end_run(task_runner_module)
+        if total_tasks is None:
+            total_tasks = scheduler.planned_tasks
 
-        # Compute and display aggregations if enabled
-        if should_compute_aggregations(config):
-            console.print("[yellow]Computing aggregations...[/yellow]")
-            aggregation_config = get_aggregation_config(config)
-            
-            try:
-                aggregations = compute_aggregations(job.id, config)
-                
-                if aggregations and aggregation_config.get('save_to_db', True):
-                    save_aggregations(job.id, aggregations)
-                
-                if aggregations and aggregation_config.get('display', True):
-                    display_aggregations(aggregations, console)
-                
-            except Exception as e:
-                console.print(f"[red]Warning: Failed to compute aggregations: {str(e)}[/red]")
+        aggregate_job(
+            job.id, config, scheduler.get_group_summaries(), total_tasks, console
+        )
 
-        yield {
-            "status": TaskStatus.COMPLETED,
-            "current": total_tasks,
-            "total": total_tasks,
-            "results": all_results,
-        }
+        yield from _emit(bus, _job_finished(scheduler, total_tasks, all_results))
 
     except Exception as e:
         error_msg = str(e)
         console = Console()
         console.print(f"[red bold]Error running experiment:[/red bold] {error_msg}")
         console.print_exception()
-        yield {
-            "status": TaskStatus.FAILED,
-            "total": 0,
-            "error": error_msg,
-            "status_map": TaskModel.get_status_map(job.id),
+        yield from _emit(bus, ProgressEvent(EventType.JOB_FAILED, error=error_msg))
+
+
+def reevaluate_experiment(
+    project_config: Dict[str, Any],
+    job: JobModel,
+    source_job_id: str,
+    sinks: List[Callable[[ProgressEvent], None]] | None = None,
+):
+    """
+    Re-evaluate the stored outputs of a job under the current config, in a new
+    job. Only the judges run: task_runner.py is never imported, so custom
+    evaluators are not available.
+
+    Tasks of the current config with a stored output in the source job are
+    evaluated with their stored input; the others are skipped.
+
+    Args:
+        project_config: Project configuration dictionary containing folder path
+        job: JobModel instance for the new job
+        source_job_id: ID of the job whose outputs are re-evaluated
+        sinks: Callables subscribed to the job's progress events
+
+    Yields:
+        Dict containing status updates, and the final results on completion
+    """
+    bus = EventBus()
+    for sink in sinks or []:
+        bus.subscribe(sink)
+
+    try:
+        console = Console()
+        config = load_config(project_config)
+        configure_rate_limits(config)
+        job.update(details={
+            "git_revision": get_git_revision(Path(project_config["folder"])),
+            "reevaluated_from": source_job_id,
+        })
+
+        outputs = {
+            task.challenge_id: task for task in TaskModel.list_executed(source_job_id)
         }
+        all_tasks = select_tasks(config, base_path=Path(project_config["folder"]))
+        total_tasks = sum(
+            len(group["executions"])
+            for group_data in all_tasks
+            for group in keep_stored_executions(
+                plan_group_executions(group_data["tasks"], config), outputs
+            ).values()
+        )
+
+        yield from _emit(bus, ProgressEvent(EventType.JOB_STARTED, total=total_tasks))
+
+        scheduler = JobScheduler(job, None, config, bus)
+        all_results = yield from _relay(
+            scheduler.run(all_tasks, total_tasks, outputs=outputs)
+        )
+
+        aggregate_job(
+            job.id, config, scheduler.get_group_summaries(), total_tasks, console
+        )
+
+        yield from _emit(bus, _job_finished(scheduler, total_tasks, all_results))
+
+    except Exception as e:
+        error_msg = str(e)
+        console = Console()
+        console.print(f"[red bold]Error re-evaluating experiment:[/red bold] {error_msg}")
+        console.print_exception()
+        yield from _emit(bus, ProgressEvent(EventType.JOB_FAILED, error=error_msg))
+
+
+def load_config(project_config: Dict[str, Any]) -> Dict[str, Any]:
+    """
+    Load the config.yaml (or custom config file) of a project.
+    """
+    config_path = (
+        Path(project_config["folder"])
+        / ".multinear"
+        / project_config.get("config_file", "config.yaml")
+    )
+    if not config_path.exists():
+        raise FileNotFoundError(f"Config file not found at {config_path}")
+
+    with open(config_path, "r") as f:
+        return yaml.safe_load(f)
+
+
+def _select(
+    job: JobModel,
+    config: Dict[str, Any],
+    project_folder: Path,
+    challenge_id: str | None,
+    group_id: str | None,
+    shard: Tuple[int, int] | None,
+    generate: Callable[[Dict[str, Any]], Any] | None = None,
+) -> List[Dict[str, Any]]:
+    """
+    Select the tasks of a job, with those yielded by the `generate_tasks`
+    generator of task_runner.py, keeping only those of its shard if sharded.
+    """
+    all_tasks = []
+    if generate is None or group_id != GENERATED_GROUP:
+        try:
+            all_tasks = select_tasks(config, challenge_id, group_id, project_folder)
+        except ValueError:
+            # The generator may yield all of the tasks
+            if generate is None or group_id is not None:
+                raise
+    if generate is not None and group_id in (None, GENERATED_GROUP):
+        tasks = GeneratedTasks(generate, config)
+        if challenge_id:
+            clean_challenge_id = challenge_id
+            if "_" in challenge_id and challenge_id.split("_")[1].isdigit():
+                clean_challenge_id = challenge_id.split("_")[0]
+            tasks = filter_tasks(tasks, lambda t: t.get("id") == clean_challenge_id)
+        if not challenge_id or has_tasks(tasks):
+            all_tasks.append({"group_id": GENERATED_GROUP, "tasks": tasks})
+        if not all_tasks:
+            raise ValueError("No tasks to run found in config.yaml or generate_tasks")
+    if shard is not None:
+        all_tasks = select_shard(all_tasks, *shard)
+        job.update(
+            total_tasks=None,
+            details={"shard": {"index": shard[0], "count": shard[1]}},
+        )
+    return all_tasks
+
+
+def _relay(events: Iterator[ProgressEvent]):
+    """
+    Relay the scheduler's progress events as updates.
+
+    Returns:
+        The results of all tasks
+    """
+    results = []
+    for event in events:
+        if event.type == EventType.RESULTS:  # Results of all tasks
+            results.extend(event.results)
+        else:  # Progress event
+            yield event.to_update()
+    return results
+
+
+def _job_finished(
+    scheduler: JobScheduler, total_tasks: int, results: List[Any]
+) -> ProgressEvent:
+    """
+    The final event of a job: completed, or cancelled, with the reason and
+    how many of its tasks ran when it stopped early.
+    """
+    if not scheduler.stopped:
+        return ProgressEvent(EventType.JOB_COMPLETED, total=total_tasks, results=results)
+    # Counted from the groups: tasks of a source are not all read when it stops
+    finished = sum(
+        summary["finished"] for summary in scheduler.get_group_summaries().values()
+    )
+    summary = {
+        "reason": scheduler.stop_reason,
+        "finished": finished,
+        "skipped": scheduler.skipped_tasks,
+    }
+    early_stop = scheduler.early_stop
+    if early_stop is not None and early_stop.decision is not None:
+        # Stopped by a rule of meta.early_stop: the job still completes
+        summary["early_stop"] = early_stop.decision
+        return ProgressEvent(
+            EventType.JOB_COMPLETED, total=total_tasks, results=results, summary=summary
+        )
+    return ProgressEvent(
+        EventType.JOB_CANCELLED, total=total_tasks, results=results, summary=summary
+    )
+
+
+def _emit(bus: EventBus, event: ProgressEvent) -> Iterator[Dict[str, Any]]:
+    """
+    Publish a job event and relay everything pending on the bus as updates.
+    """
+    bus.publish(event)
+    for pending in bus.drain():
+        yield pending.to_update()
+
@@ -0,0 +1,77 @@
+from typing import Dict, Any, List
+import asyncio
+
+from .evaluate import evaluate_async
+from ..utils.capture import OutputCapture
+from .run_group import TaskExecution
+from .rate_limit import get_rate_limiter, RUN_TASK
+from .cancellation import set_cancel_event
+
+
+async def run_execution_async(execution: TaskExecution, task_runner_module):
+    """
+    Execution stage for an async run_task. Database writes are moved off the
+    event loop.
+
+    Args:
+        execution: The task execution
+        task_runner_module: Module with an async run_task function
+    """
+    await asyncio.to_thread(execution.start)
+
+    cache = execution.output_cache
+    if cache is not None:
+        cached = await asyncio.to_thread(cache.get, execution.cache_key())
+        if cached is not None:
+            await asyncio.to_thread(execution.executed, *cached)
+            return
+
+    set_cancel_event(execution.cancelled)
+
+    async def run():
+        with OutputCapture() as capture:
+            task_result = await task_runner_module.run_task(execution.input)
+        return task_result, capture.logs
+
+    async def attempt():
+        return await get_rate_limiter().call_async(RUN_TASK, 0, run)
+
+    task_result, logs = await execution.task_retry.call_async(attempt)
+    if cache is not None:
+        await asyncio.to_thread(cache.put, execution.cache_key(), task_result, logs)
+    await asyncio.to_thread(execution.executed, task_result, logs)
+
+
+async def evaluate_execution_async(
+    execution: TaskExecution, task_runner_module
+) -> List[Dict[str, Any]]:
+    """
+    Evaluation stage awaiting the evaluators instead of occupying a thread.
+
+    Args:
+        execution: The task execution, after the execution stage
+        task_runner_module: Module providing evaluate_custom, if used
+
+    Returns:
+        The task result: [task result, evaluation result]
+    """
+    eval_spec = execution.eval_spec()
+    eval_key = execution.eval_key(eval_spec)
+    reused = await asyncio.to_thread(execution.reused_evaluation, eval_key)
+    if reused is not None:
+        return await asyncio.to_thread(
+            execution.evaluated, eval_spec, reused, [], eval_key
+        )
+
+    with OutputCapture() as capture:
+        eval_result = await evaluate_async(
+            eval_spec,
+            execution.input,
+            execution.task_result["output"],
+            task_runner_module,
+            retry=execution.eval_retry,
+        )
+    return await asyncio.to_thread(
+        execution.evaluated, eval_spec, eval_result, capture.logs, eval_key
+    )
+
@@ -1,323 +1,547 @@
-from typing import Dict, Any, List, Iterator, Tuple
+from typing import Dict, Any, List, Tuple
 from rich.console import Console
+from rich.traceback import Traceback
 import random
 import hashlib
 import json
-import queue
-import time
-from concurrent.futures import ThreadPoolExecutor
+import math
+import statistics
+import threading
 
-from .storage import JobModel, TaskModel, TaskStatus
+from .storage import JobModel, TaskModel, TaskStatus, VariationModel
+from .events import EventBus, EventType, ProgressEvent
 from .evaluate import evaluate
 from ..utils.capture import OutputCapture
-from .utils import rephrase_input
+from .utils import rephrase_input_batch, get_input_hash, REPHRASE_PROMPT_VERSION
+from .process_pool import ProcessTaskRunner
+from .rate_limit import get_rate_limiter, RUN_TASK
+from .retry import RetryPolicy
+from .output_cache import OutputCache
+from .eval_reuse import reuse_enabled, evaluation_key, find_evaluation
+from .cancellation import TaskTimeoutError, get_timeouts, set_cancel_event
 
 
-def rephrase_task_input(
-    task: Dict[str, Any], previous_variations: List[Any], config: Dict[str, Any]
-) -> Tuple[Dict[str, Any], List[Any]]:
+def get_variations(input: str, count: int) -> List[str]:
     """
-    Rephrase a task's input based on previous variations.
+    Get `count` rephrased variations of an input from the variation library,
+    generating (and storing) only the ones that are missing.
+
+    A pinned variation set is never extended: if it holds fewer variations
+    than needed, they are reused in turn.
+
+    Args:
+        input: The input to be rephrased
+        count: Number of variations needed
+
+    Returns:
+        List of `count` variations
+    """
+    input_hash = get_input_hash(input)
+    stored = VariationModel.get(input_hash, REPHRASE_PROMPT_VERSION)
+    variations = [v.variation for v in stored]
+
+    if stored and any(v.pinned for v in stored):
+        return [variations[i % len(variations)] for i in range(count)]
+
+    missing = count - len(variations)
+    if missing > 0:
+        generated = rephrase_input_batch(input, missing, variations)
+        VariationModel.add(input_hash, REPHRASE_PROMPT_VERSION, input, generated)
+        variations.extend(generated)
+
+    return variations[:count]
+
+
+def rephrase_task_variations(
+    task: Dict[str, Any], count: int, config: Dict[str, Any]
+) -> List[Dict[str, Any]]:
+    """
+    Prepare the task copies for `count` repeats, with rephrased inputs taken
+    from the variation library and any missing ones generated in a single request.
 
     Args:
         task: The task definition
-        previous_variations: List of previous variations for this task
+        count: Number of variations (the repeats after the first one)
         config: Configuration dictionary
 
     Returns:
-        Tuple of (rephrased task, updated previous_variations)
+        List of task copies, one per variation
     """
-    task_copy = task.copy()
-    input = task_copy["input"]
     global_rephrase = config.get("meta", {}).get("rephrase", False)
-    do_rephrase = task.get("rephrase", global_rephrase)
-
-    # Create a new list for updated variations
-    updated_variations = previous_variations.copy()
-
-    if do_rephrase:
-        # If the input is a dictionary, rephrase the 'question' key only
-        if isinstance(input, dict) and 'question' in input:
-            rephrased_question = rephrase_input(input['question'], updated_variations)
-            if isinstance(rephrased_question, str):
-                updated_variations.append(rephrased_question)
-            task_copy["input"] = {**input, 'question': rephrased_question}
-        else:
-            rephrased_input = rephrase_input(input, updated_variations)
-            if isinstance(rephrased_input, str):
-                updated_variations.append(rephrased_input)
-            task_copy["input"] = rephrased_input
-
-    return task_copy, updated_variations
-
-
-def execute_task(
-    task: Dict[str, Any],
-    job: JobModel,
-    task_runner_module,
-    current_task: int,
-    total_tasks: int,
-    config: Dict[str, Any],
-    repeat: int = 0,
-    update_queue: queue.Queue = None,
-) -> Dict[str, Any]:
+    if count <= 0 or not task.get("rephrase", global_rephrase):
+        return [task.copy() for _ in range(count)]
+
+    input = task["input"]
+    # If the input is a dictionary, rephrase the 'question' key only
+    if isinstance(input, dict) and 'question' in input:
+        questions = get_variations(input['question'], count)
+        inputs = [{**input, 'question': question} for question in questions]
+    else:
+        inputs = get_variations(input, count)
+
+    return [{**task, "input": rephrased} for rephrased in inputs]
+
+
+def get_challenge_id(task: Dict[str, Any], repeat: int = 0) -> str:
     """
-    Execute a single task and return results and updates.
+    Get the challenge ID of a task, with the repeat counter appended for repeats.
 
     Args:
-        task: Task definition
-        job: JobModel instance
-        task_runner_module: Module with run_task function
-        current_task: Current task number
-        total_tasks: Total tasks to process
-        config: Configuration dictionary
+        task: The task definition
         repeat: Current repeat number (0-indexed)
-        update_queue: Queue to send real-time updates (optional)
 
     Returns:
-        Dict with results
+        The challenge ID
     """
-    result = None
-    repeats = task.get("repeat", config.get("meta", {}).get("repeat", 1))
+    challenge_id = task.get("id", None)
+    if not challenge_id:  # Calculate challenge ID from input
+        challenge_id = hashlib.sha256(json.dumps(task["input"]).encode()).hexdigest()
 
-    try:
-        input = task["input"]  # Input should already be rephrased if needed
+    # Append repeat counter to challenge_id if this is a repeat
+    if repeat > 0:
+        challenge_id = f"{challenge_id}_{repeat}"
 
-        challenge_id = task.get("id", None)
-        if not challenge_id:  # Calculate challenge ID from input
-            challenge_id = hashlib.sha256(json.dumps(input).encode()).hexdigest()
+    return challenge_id
 
-        # Append repeat counter to challenge_id if this is a repeat
-        if repeat > 0:
-            challenge_id = f"{challenge_id}_{repeat}"
 
-        # Start new task
-        task_id = TaskModel.start(
-            job_id=job.id, task_number=current_task, challenge_id=challenge_id
-        )
+def prepare_eval_spec(task: Dict[str, Any], config: Dict[str, Any]) -> Dict[str, Any]:
+    """
+    Build the evaluation spec of a task, injecting global settings from meta.
 
-        # Running status update
-        running_update = {
-            "status": TaskStatus.RUNNING,
-            "current": current_task,
-            "total": total_tasks,
-            "details": (
-                f"Running task {current_task}/{total_tasks}"
-                + (f" (repeat {repeat + 1}/{repeats})" if repeat > 0 else "")
-            ),
-        }
-
-        # Send update directly to queue if provided
-        if update_queue:
-            update_queue.put(running_update)
+    Args:
+        task: The task definition
+        config: Configuration dictionary
 
-        # Do we simulate a failure?
-        fail_simulate = config.get("meta", {}).get("fail_simulate", None)
-        if fail_simulate is not None and random.random() < fail_simulate:
-            raise Exception("Simulated failure")
+    Returns:
+        Copy of the task with global context, checklist and custom evaluator injected
+    """
+    # Inject global context into the task
+    task_copy = task.copy()
+    task_copy["context"] = config.get("meta", {}).get("context", "")
 
-        # Run the task
-        with OutputCapture() as capture:
-            task_result = task_runner_module.run_task(input)
-        TaskModel.executed(
-            task_id,
-            input,
-            task_result.get("output"),
-            task_result.get("details", {}),
-            capture.logs,
-        )
+    # Inject global checklist, if present
+    global_checklist = config.get("meta", {}).get("checklist", None)
+    if global_checklist and "checklist" not in task_copy:
+        task_copy["checklist"] = global_checklist
 
-        # Evaluating status update
-        evaluating_update = {
-            "status": TaskStatus.EVALUATING,
-            "current": current_task,
-            "total": total_tasks,
-            "details": f"Evaluating task {current_task}/{total_tasks}",
-        }
-
-        # Send update directly to queue if provided
-        if update_queue:
-            update_queue.put(evaluating_update)
-
-        # Inject global context into the task
-        task_copy = task.copy()
-        task_copy["context"] = config.get("meta", {}).get("context", "")
-
-        # Inject global checklist, if present
-        global_checklist = config.get("meta", {}).get("checklist", None)
-        if global_checklist and "checklist" not in task_copy:
-            task_copy["checklist"] = global_checklist
-
-        global_custom = config.get("meta", {}).get("custom", None)
-        if global_custom and "custom" not in task_copy:
-            task_copy["custom"] = global_custom
-
-        # Evaluate the task
-        with OutputCapture() as capture:
-            eval_result = evaluate(
-                task_copy, input, task_result["output"], task_runner_module
-            )
-        TaskModel.evaluated(
-            task_id,
-            {k: v for k, v in task_copy.items() if k != "input"},
-            eval_result["passed"],
-            eval_result["score"],
-            eval_result["details"],
-            capture.logs,
-        )
+    global_custom = config.get("meta", {}).get("custom", None)
+    if global_custom and "custom" not in task_copy:
+        task_copy["custom"] = global_custom
 
-        result = [task_result, eval_result]
+    return task_copy
 
-    except Exception as e:
-        error_msg = str(e)
-        console = Console()
-        console.print(
-            f"[red bold]Error running task {current_task}/{total_tasks}:[/red bold] {error_msg}"
-        )
-        console.print_exception()
-        result = {"error": error_msg}
-        TaskModel.fail(task_id, error=error_msg)
-        # Update job details with the error
-        job.update(
-            status=TaskStatus.FAILED,
-            details={
-                "error": error_msg,
-                "status_map": TaskModel.get_status_map(job.id),
-            },
-        )
 
-    return result
+# Defaults of adaptive repeats, `repeat: {min: 2, max: 10, target_ci: 0.1}`
+DEFAULT_MIN_REPEATS = 2
+DEFAULT_MAX_REPEATS = 10
+DEFAULT_REPEAT_CONFIDENCE = 0.95
+
+
+def get_repeats(task: Dict[str, Any], config: Dict[str, Any]) -> Dict[str, Any]:
+    """
+    Resolve the repeats of a task, from the task or `meta.repeat`: either a
+    fixed count, or adaptive bounds. Adaptive repeats keep sampling a task
+    after `min` repeats only while the confidence interval of its score is
+    wider than `target_ci`, up to `max` repeats.
+
+    Args:
+        task: The task definition
+        config: Configuration dictionary
+
+    Returns:
+        Dict with the "min" and "max" repeats, and for adaptive repeats the
+        "target_ci" and "confidence"; "adaptive" tells them apart
+    """
+    value = task.get("repeat", config.get("meta", {}).get("repeat", 1))
+    if not isinstance(value, dict):
+        return {"min": value, "max": value, "adaptive": False}
+    maximum = max(1, value.get("max", DEFAULT_MAX_REPEATS))
+    target_ci = value.get("target_ci")
+    return {
+        "min": max(1, min(maximum, value.get("min", DEFAULT_MIN_REPEATS))),
+        "max": maximum,
+        "target_ci": target_ci,
+        "confidence": value.get("confidence", DEFAULT_REPEAT_CONFIDENCE),
+        "adaptive": target_ci is not None,
+    }
+
+
+def score_interval_width(scores: List[float], confidence: float) -> float:
+    """
+    Width of the normal confidence interval of the mean score, infinite
+    with fewer than two scores.
+    """
+    if len(scores) < 2:
+        return float("inf")
+    z = statistics.NormalDist().inv_cdf((1 + confidence) / 2)
+    return 2 * z * statistics.stdev(scores) / math.sqrt(len(scores))
 
 
-def run_group(
+def plan_group_executions(
     tasks: List[Dict[str, Any]],
-    job: JobModel,
-    task_runner_module,
     config: Dict[str, Any],
     current_task_offset: int = 0,
-    total_tasks: int = 0,
-) -> Iterator[Dict[str, Any]]:
+) -> Dict[str, Dict[str, Any]]:
     """
-    Run a group of tasks.
+    Organize tasks by their ID and assign task numbers to every repeat.
 
     Args:
         tasks: List of tasks to run
-        job: JobModel instance for the job being run
-        task_runner_module: Dynamically loaded task runner module
         config: The full config dictionary
         current_task_offset: Offset for task numbering
-        total_tasks: Total number of tasks across all groups
 
-    Yields:
-        Dict containing status updates and results
+    Returns:
+        Dict of task ID to {"task", "repeats", "executions"}; each execution
+        has its repeat, task number and challenge ID. Adaptive repeats are
+        planned up to their maximum.
     """
-    global_repeat = config.get("meta", {}).get("repeat", 1)
-    max_workers = max(1, config.get("meta", {}).get("max_workers", 1))
-    results = []
-
-    # Group tasks by their ID to handle previous_variations correctly
+    # Group tasks by their ID, so the variations of a task are generated together
     task_groups = {}
     current_task = current_task_offset
 
-    # First pass: organize tasks by ID and prepare executions
     for task in tasks:
         task_id = task.get(
             "id", hashlib.sha256(json.dumps(task["input"]).encode()).hexdigest()
         )
-        repeats = task.get("repeat", global_repeat)
+        repeats = get_repeats(task, config)
 
         if task_id not in task_groups:
             task_groups[task_id] = {
                 "task": task,
+                "repeats": repeats,
                 "executions": [],
-                "previous_variations": [],
             }
 
-        for repeat in range(repeats):
+        for repeat in range(repeats["max"]):
             current_task += 1
-            task_groups[task_id]["executions"].append(
-                {"repeat": repeat, "task_number": current_task}
-            )
+            task_groups[task_id]["executions"].append({
+                "repeat": repeat,
+                "task_number": current_task,
+                # From the original task, as a rephrased input has another hash
+                "challenge_id": get_challenge_id(task, repeat),
+            })
 
-    # Create a shared queue for real-time updates
-    update_queue = queue.Queue()
+    return task_groups
+
+
+def keep_stored_executions(
+    task_groups: Dict[str, Dict[str, Any]],
+    outputs: Dict[str, TaskModel],
+    current_task_offset: int = 0,
+) -> Dict[str, Dict[str, Any]]:
+    """
+    Keep only the planned executions with a stored output, renumbering them.
 
-    # Create thread pool
-    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+    Args:
+        task_groups: Planned executions, as returned by plan_group_executions
+        outputs: Executed tasks of an earlier job, keyed by challenge ID
+        current_task_offset: Offset for task numbering
+
+    Returns:
+        The task groups that still have executions
+    """
+    kept = {}
+    current_task = current_task_offset
+    for task_id, group in task_groups.items():
+        executions = []
+        for execution in group["executions"]:
+            if execution["challenge_id"] in outputs:
+                current_task += 1
+                executions.append({**execution, "task_number": current_task})
+        if executions:
+            kept[task_id] = {**group, "executions": executions}
+    return kept
+
+
+def run_task_captured(task_runner_module, input: Any) -> Tuple[Dict[str, Any], List[Dict[str, Any]]]:
+    """
+    Run the task runner's run_task on an input, capturing its output.
+
+    Args:
+        task_runner_module: Module with run_task function, or a ProcessTaskRunner
+        input: The task input
+
+    Returns:
+        Tuple of (task result, captured logs)
+    """
+    if isinstance(task_runner_module, ProcessTaskRunner):
+        # Output is captured inside the worker process
+        return task_runner_module.run_task_captured(input)
+
+    with OutputCapture() as capture:
+        task_result = task_runner_module.run_task(input)
+    return task_result, capture.logs
+
+
+class TaskExecution:
+    """
+    A single execution of a task, shared by its execution and evaluation stages.
+
+    Records every step of the task in the database and publishes the matching
+    progress event.
+    """
+
+    def __init__(
+        self,
+        task: Dict[str, Any],
+        job: JobModel,
+        current_task: int,
+        total_tasks: int,
+        config: Dict[str, Any],
+        repeat: int = 0,
+        bus: EventBus = None,
+        group_id: str = None,
+        challenge_id: str = None,
+        output_cache: OutputCache = None,
+    ):
+        self.task = task
+        self.input = None
+        self.job = job
+        self.current_task = current_task
+        self.total_tasks = total_tasks
+        self.config = config
+        self.repeat = repeat
+        # Each execution counts its own attempts
+        self.task_retry = RetryPolicy.from_config(config, "run_task")
+        self.eval_retry = RetryPolicy.from_config(config, "evaluators")
+        self.repeats = get_repeats(task, config)["max"]
+        self.bus = bus
+        self.group_id = group_id
+        self.task_id = None
+        self.challenge_id = challenge_id
+        self.output_cache = output_cache
+        self.reuse_evaluations = reuse_enabled(config)
+        self.timeouts = get_timeouts(task, config)
+        # Set once the task failed or timed out: work still running in a
+        # worker thread is abandoned and records nothing
+        self.cancelled = threading.Event()
+        self.task_result = None
+
+    def publish(self, event_type: str, **kwargs):
+        if self.bus:
+            self.bus.publish(ProgressEvent(
+                event_type,
+                total=self.total_tasks,
+                group_id=self.group_id,
+                task_number=self.current_task,
+                task_id=self.task_id,
+                challenge_id=self.challenge_id,
+                repeat=self.repeat,
+                repeats=self.repeats,
+                **kwargs,
+            ))
+
+    def start(self):
+        """
+        Record the start of the task.
+        """
+        self.input = self.task["input"]  # Input should already be rephrased if needed
+        if self.challenge_id is None:
+            self.challenge_id = get_challenge_id(self.task, self.repeat)
+        self.task_id = TaskModel.start(
+            job_id=self.job.id,
+            task_number=self.current_task,
+            challenge_id=self.challenge_id,
+        )
+        self.publish(EventType.STARTED)
+
+        # Do we simulate a failure?
+        fail_simulate = self.config.get("meta", {}).get("fail_simulate", None)
+        if fail_simulate is not None and random.random() < fail_simulate:
+            raise Exception("Simulated failure")
+
+    def executed(self, task_result: Dict[str, Any], logs: List[Dict[str, Any]]):
+        """
+        Record the result of run_task.
+        """
+        if self.cancelled.is_set():
+            return
+        self.task_result = task_result
+        TaskModel.executed(
+            self.task_id,
+            self.input,
+            task_result.get("output"),
+            task_result.get("details", {}),
+            logs,
+            self.task_retry.attempts,
+        )
+        self.publish(EventType.EXECUTED)
+
+    def cache_key(self) -> str:
+        """
+        Key of the run_task output in the output cache, once started.
+        """
+        return self.output_cache.key(self.task, self.input, self.repeat)
+
+    def eval_spec(self) -> Dict[str, Any]:
+        """
+        Get the evaluation spec, with the global context, checklist and custom
+        evaluator injected.
+        """
+        return prepare_eval_spec(self.task, self.config)
+
+    def eval_key(self, eval_spec: Dict[str, Any]) -> str:
+        """
+        Key of the evaluation of the output, recorded to let later tasks reuse it.
+        """
+        return evaluation_key(eval_spec, self.task_result["output"])
+
+    def reused_evaluation(self, eval_key: str) -> Dict[str, Any]:
+        """
+        The latest evaluation of the same output under the same spec, if
+        reusing evaluations is enabled.
+        """
+        if not self.reuse_evaluations or eval_key is None:
+            return None
+        return find_evaluation(eval_key)
+
+    def evaluated(
+        self,
+        eval_spec: Dict[str, Any],
+        eval_result: Dict[str, Any],
+        logs: List[Dict[str, Any]],
+        eval_key: str = None,
+    ) -> List[Dict[str, Any]]:
+        """
+        Record the evaluation of the task.
+
+        Returns:
+            The task result: [task result, evaluation result]
+        """
+        if self.cancelled.is_set():
+            return None
+        TaskModel.evaluated(
+            self.task_id,
+            {k: v for k, v in eval_spec.items() if k != "input"},
+            eval_result["passed"],
+            eval_result["score"],
+            eval_result["details"],
+            logs,
+            self.eval_retry.attempts,
+            eval_key,
+        )
+        self.publish(
+            EventType.EVALUATED,
+            passed=eval_result["passed"],
+            score=eval_result["score"],
+        )
+        return [self.task_result, eval_result]
+
+    def fail(self, error: Exception) -> Dict[str, str]:
+        """
+        Record a failure of the task, or its timeout.
+
+        Returns:
+            The task result: {"error": message}
+        """
+        self.cancelled.set()
+        timed_out = isinstance(error, TaskTimeoutError)
+        error_msg = str(error)
         console = Console()
+        console.print(
+            f"[red bold]Error running task {self.current_task}/{self.total_tasks}:"
+            f"[/red bold] {error_msg}"
+        )
+        # Print from the exception itself, as this may run outside the except block
+        console.print(Traceback.from_exception(type(error), error, error.__traceback__))
+        if self.task_id:
+            TaskModel.fail(
+                self.task_id,
+                error=error_msg,
+                task_attempts=self.task_retry.attempts,
+                eval_attempts=self.eval_retry.attempts,
+                status=TaskStatus.TIMEOUT if timed_out else TaskStatus.FAILED,
+            )
+        self.publish(
+            EventType.TIMED_OUT if timed_out else EventType.FAILED, error=error_msg
+        )
+        return {"error": error_msg}
+
+    def finish(self, result: Any):
+        """
+        Publish the end of the task, whatever its outcome.
+        """
+        self.publish(EventType.FINISHED, result=result)
+
+
+def run_execution(execution: TaskExecution, task_runner_module):
+    """
+    Execution stage: start the task and run run_task on its input, or take
+    its output from the output cache.
+
+    Args:
+        execution: The task execution
+        task_runner_module: Module with run_task function, or a ProcessTaskRunner
+    """
+    execution.start()
+
+    cache = execution.output_cache
+    if cache is not None:
+        cached = cache.get(execution.cache_key())
+        if cached is not None:
+            execution.executed(*cached)
+            return
+
+    # Lets run_task check is_cancelled() from this worker thread
+    set_cancel_event(execution.cancelled)
+
+    def attempt():
+        if execution.cancelled.is_set():
+            raise TaskTimeoutError("run_task was cancelled")
+        return get_rate_limiter().call(
+            RUN_TASK, 0, run_task_captured, task_runner_module, execution.input
+        )
+
+    task_result, task_logs = execution.task_retry.call(attempt)
+    if cache is not None:
+        cache.put(execution.cache_key(), task_result, task_logs)
+    execution.executed(task_result, task_logs)
+
+
+def replay_execution(execution: TaskExecution, task: TaskModel):
+    """
+    Execution stage of a re-evaluation: start the task and record the stored
+    output of an earlier run instead of calling run_task.
+
+    Args:
+        execution: The task execution, with the stored input
+        task: The executed task of the earlier job
+    """
+    execution.start()
+    details = {
+        **(task.task_details or {}),
+        "reevaluated_from": {"job_id": task.job_id, "task_id": task.id},
+    }
+    execution.executed(
+        {"output": task.task_output, "details": details}, task.task_logs or []
+    )
+
+
+def evaluate_execution(execution: TaskExecution, task_runner_module) -> List[Dict[str, Any]]:
+    """
+    Evaluation stage: evaluate the output of an executed task, or reuse an
+    earlier evaluation of the same output when enabled.
+
+    Args:
+        execution: The task execution, after run_execution
+        task_runner_module: Module providing evaluate_custom, if used
+
+    Returns:
+        The task result: [task result, evaluation result]
+    """
+    eval_spec = execution.eval_spec()
+    eval_key = execution.eval_key(eval_spec)
+    reused = execution.reused_evaluation(eval_key)
+    if reused is not None:
+        return execution.evaluated(eval_spec, reused, [], eval_key)
+
+    with OutputCapture() as capture:
+        eval_result = evaluate(
+            eval_spec,
+            execution.input,
+            execution.task_result["output"],
+            task_runner_module,
+            retry=execution.eval_retry,
+        )
+    return execution.evaluated(eval_spec, eval_result, capture.logs, eval_key)
 
-        # Process each task group sequentially, but execute tasks in parallel
-        futures = []
-
-        for task_id, group in task_groups.items():
-            task = group["task"]
-            previous_variations = group["previous_variations"]
-
-            for execution in group["executions"]:
-                repeat = execution["repeat"]
-                task_number = execution["task_number"]
-
-                # Rephrase the task input if needed (only for repeats after the first one)
-                if repeat > 0:
-                    task_copy, previous_variations = rephrase_task_input(
-                        task, previous_variations, config
-                    )
-                else:
-                    task_copy = task.copy()
-
-                # Submit the task to the thread pool
-                future = executor.submit(
-                    execute_task,
-                    task_copy,
-                    job,
-                    task_runner_module,
-                    task_number,
-                    total_tasks,
-                    config,
-                    repeat,
-                    update_queue  # Pass the update queue to the task
-                )
-                futures.append(future)
-
-                # Process any available updates from the queue
-                while True:
-                    try:
-                        update = update_queue.get_nowait()
-                        yield update
-                        update_queue.task_done()
-                    except queue.Empty:
-                        break
-
-        # Continue processing updates until all tasks are complete
-        completed = 0
-        total_to_complete = len(futures)
-
-        while completed < total_to_complete:
-            # Check for completed futures
-            newly_completed = sum(1 for f in futures if f.done())
-            if newly_completed > completed:
-                completed = newly_completed
-
-            # Process updates from the queue
-            try:
-                update = update_queue.get(timeout=0.1)
-                yield update
-                update_queue.task_done()
-            except queue.Empty:
-                # No updates at the moment, continue
-                # Add a small sleep to prevent CPU spinning
-                time.sleep(0.01)
-
-        # Collect results from all futures
-        for future in futures:
-            try:
-                result = future.result()
-                if result:
-                    results.append(result)
-            except Exception as e:
-                console = Console()
-                console.print(f"[red bold]Error in task execution:[/red bold] {str(e)}")
-                console.print_exception()
-                results.append({"error": str(e)})
-
-    return results
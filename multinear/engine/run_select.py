@@ -1,4 +1,7 @@
-def select_tasks(config, challenge_id=None, group_id=None):
+from .task_source import group_tasks, filter_tasks, has_tasks
+
+
+def select_tasks(config, challenge_id=None, group_id=None, base_path=None):
     """
     Select tasks to run based on config and filters.
 
@@ -6,9 +9,12 @@ def select_tasks(config, challenge_id=None, group_id=None):
         config: The experiment configuration
         challenge_id: Optional challenge ID to filter tasks
         group_id: Optional group ID to filter tasks
+        base_path: Folder that the paths of task sources are relative to
+            (default: the current directory)
 
     Returns:
-        List of task groups
+        List of task groups; the tasks of a group with a `source` are a
+        TaskSource, read lazily
     """
     all_tasks = []
 
@@ -17,7 +23,8 @@ def select_tasks(config, challenge_id=None, group_id=None):
         if group_id:
             # Filter to only include tasks from the specified group
             for group in config["groups"]:
-                if group.get("id") == group_id and "tasks" in group:
+                tasks = group_tasks(group, base_path)
+                if group.get("id") == group_id and tasks is not None:
                     if challenge_id:
                         # Filter tasks by challenge_id
                         clean_challenge_id = challenge_id
@@ -26,17 +33,13 @@ def select_tasks(config, challenge_id=None, group_id=None):
                             and challenge_id.split("_")[1].isdigit()
                         ):
                             clean_challenge_id = challenge_id.split("_")[0]
-                        tasks = [
-                            t
-                            for t in group["tasks"]
-                            if t.get("id") == clean_challenge_id
-                        ]
-                        if tasks:
+                        tasks = filter_tasks(
+                            tasks, lambda t: t.get("id") == clean_challenge_id
+                        )
+                        if has_tasks(tasks):
                             all_tasks.append({"group_id": group_id, "tasks": tasks})
                     else:
-                        all_tasks.append(
-                            {"group_id": group_id, "tasks": group["tasks"]}
-                        )
+                        all_tasks.append({"group_id": group_id, "tasks": tasks})
                     break
             if not all_tasks:
                 raise ValueError(
@@ -45,8 +48,8 @@ def select_tasks(config, challenge_id=None, group_id=None):
         else:
             # Include tasks from all groups
             for group in config["groups"]:
-                if "tasks" in group:
-                    group_tasks = group["tasks"]
+                tasks = group_tasks(group, base_path)
+                if tasks is not None:
                     if challenge_id:
                         # Filter tasks by challenge_id
                         clean_challenge_id = challenge_id
@@ -55,16 +58,14 @@ def select_tasks(config, challenge_id=None, group_id=None):
                             and challenge_id.split("_")[1].isdigit()
                         ):
                             clean_challenge_id = challenge_id.split("_")[0]
-                        group_tasks = [
-                            t
-                            for t in group_tasks
-                            if t.get("id") == clean_challenge_id
-                        ]
-                    if group_tasks:
+                        tasks = filter_tasks(
+                            tasks, lambda t: t.get("id") == clean_challenge_id
+                        )
+                    if has_tasks(tasks):
                         all_tasks.append(
                             {
                                 "group_id": group.get("id", "unknown"),
-                                "tasks": group_tasks,
+                                "tasks": tasks,
                             }
                         )
     elif "tasks" in config:
@@ -0,0 +1,202 @@
+"""
+Per-worker state of task runners, e.g. a client that is not thread-safe.
+
+A task runner can define `init_worker()`, called once in each worker before
+its first task. Its return value is then passed to every task that worker
+runs, as `run_task(input, state)` (or `run_tasks(inputs, state)`), and to the
+optional `end_worker(state)` once the job is done:
+
+    def init_worker():
+        return httpx.Client()
+
+    def run_task(input, client):
+        return {"output": client.post(URL, json={"input": input}).json()}
+
+    def end_worker(client):
+        client.close()
+
+Workers are the threads of the scheduler's pool, or, for async task runners,
+the scheduler's event loop (init_worker and end_worker may then be async), or
+each worker process with `executor: process`.
+
+`end_run()`, the counterpart of `start_run()`, is called once the job is done
+(in each worker process with `executor: process`).
+"""
+
+from concurrent import futures
+from concurrent.futures import Executor
+from typing import Any, Dict, List, Optional, Set
+import asyncio
+import inspect
+import threading
+
+
+# Seconds the threads of a pool wait for each other to end their states
+CLOSE_TIMEOUT = 5.0
+
+_NO_STATE = object()
+
+
+def end_run(task_runner_module):
+    """
+    Call the task runner's end_run, if any: the counterpart of start_run,
+    called once the job is done.
+    """
+    function = getattr(task_runner_module, "end_run", None)
+    if function is None:
+        return
+    if inspect.iscoroutinefunction(function):
+        asyncio.run(function())
+    else:
+        function()
+
+
+def has_worker_state(task_runner_module) -> bool:
+    """
+    Whether the task runner keeps a state per worker.
+    """
+    return getattr(task_runner_module, "init_worker", None) is not None
+
+
+def init_worker_state(task_runner_module) -> Any:
+    """
+    Call the task runner's init_worker outside of an event loop.
+    """
+    state = task_runner_module.init_worker()
+    if inspect.isawaitable(state):
+        state = asyncio.run(state)
+    return state
+
+
+def end_worker_state(task_runner_module, state: Any):
+    """
+    Call the task runner's end_worker, if any, outside of an event loop.
+    """
+    end_worker = getattr(task_runner_module, "end_worker", None)
+    if end_worker is not None:
+        result = end_worker(state)
+        if inspect.isawaitable(result):
+            asyncio.run(result)
+
+
+class StatefulTaskRunner:
+    """
+    Task runner module whose run_task and run_tasks get the state of the
+    worker calling them, initialized on the first call of each worker.
+    Attributes other than run_task and run_tasks are read from the module.
+
+    A state is only ever used and torn down by the worker that created it.
+    """
+
+    def __init__(self, task_runner_module):
+        self.task_runner_module = task_runner_module
+        self._local = threading.local()
+        self._lock = threading.Lock()
+        self._async_lock = None
+        # States of the worker threads, by thread, and of the event loop
+        self._states: Dict[int, Any] = {}
+        self._async_states: List[Any] = []
+        # Threads inside a call, e.g. still running a timed-out task
+        self._busy: Set[int] = set()
+        self._closing = False
+        for name in ("run_task", "run_tasks"):
+            function = getattr(task_runner_module, name, None)
+            if function is None:
+                continue
+            if inspect.iscoroutinefunction(function):
+                setattr(self, name, self._bind_async(function))
+            else:
+                setattr(self, name, self._bind(function))
+
+    def __getattr__(self, name):
+        return getattr(self.task_runner_module, name)
+
+    def _bind(self, function):
+        def call(input):
+            thread = threading.get_ident()
+            with self._lock:
+                self._busy.add(thread)
+            try:
+                return function(input, self.state())
+            finally:
+                with self._lock:
+                    self._busy.discard(thread)
+                    closing = self._closing
+                if closing:
+                    # Closed while this call ran: the thread ends its own state
+                    self._end_own_state()
+        return call
+
+    def _bind_async(self, function):
+        async def call(input):
+            return await function(input, await self.state_async())
+        return call
+
+    def state(self) -> Any:
+        """
+        The state of the worker thread calling, initialized on its first call.
+        """
+        if not hasattr(self._local, "state"):
+            self._local.state = init_worker_state(self.task_runner_module)
+            with self._lock:
+                self._states[threading.get_ident()] = self._local.state
+        return self._local.state
+
+    async def state_async(self) -> Any:
+        """
+        The state of the event loop, shared by the tasks awaited on it.
+        """
+        if self._async_lock is None:
+            self._async_lock = asyncio.Lock()
+        async with self._async_lock:
+            if not hasattr(self._local, "state"):
+                state = self.task_runner_module.init_worker()
+                if inspect.isawaitable(state):
+                    state = await state
+                self._local.state = state
+                self._async_states.append(state)
+        return self._local.state
+
+    def _end_own_state(self):
+        with self._lock:
+            state = self._states.pop(threading.get_ident(), _NO_STATE)
+        if state is not _NO_STATE:
+            end_worker_state(self.task_runner_module, state)
+
+    def _close_threads(self, executor: Executor, size: int):
+        with self._lock:
+            self._closing = True
+            idle = [thread for thread in self._states if thread not in self._busy]
+            parties = size - len(self._busy)
+        if not idle or parties < 1:
+            return
+        # Every teardown call waits for the others, so that each lands on a
+        # different thread of the pool, and each thread ends its own state
+        barrier = threading.Barrier(parties)
+
+        def teardown():
+            try:
+                barrier.wait(CLOSE_TIMEOUT)
+            except threading.BrokenBarrierError:
+                pass  # A thread was busy after all; its state ends with its call
+            self._end_own_state()
+
+        futures.wait([executor.submit(teardown) for _ in range(parties)])
+
+    async def close(self, executor: Optional[Executor] = None, size: int = 0):
+        """
+        Call end_worker with the state of every worker, on that worker: the
+        threads of `executor` (a pool of `size` threads, before it shuts
+        down) and the event loop. Threads still running a call end their
+        state once it returns.
+        """
+        if executor is not None:
+            await asyncio.to_thread(self._close_threads, executor, size)
+        states, self._async_states = self._async_states, []
+        end_worker = getattr(self.task_runner_module, "end_worker", None)
+        if end_worker is None:
+            return
+        for state in states:
+            result = end_worker(state)
+            if inspect.isawaitable(result):
+                await result
@@ -0,0 +1,669 @@
+"""
+Job-wide task scheduler.
+
+All tasks selected for a job, across every group, are fed into one bounded
+pool, so workers never sit idle waiting for the slowest task of a group before
+the next group starts. Progress is still tracked per group: a GROUP_FINISHED
+event with the group's summary is published as soon as its last task is done.
+
+Each task goes through two pipeline stages with their own concurrency limits:
+execution (run_task, `meta.max_workers`) and evaluation (the judges,
+`meta.max_eval_workers`). A task keeps its execution slot until there is room
+in the evaluation queue, so a slow judge throttles execution instead of piling
+up outputs, and a slow app never holds a judge slot. Either limit can be set
+to `auto` to adapt it to the observed latency and errors (see concurrency.py).
+
+With `meta.schedule: history`, tasks start longest first, as predicted from
+their recent runs (see ordering.py). Task runners with `run_tasks` get the
+inputs of the tasks in flight in batches (see batching.py), and those with
+`init_worker` a state per worker (see runner_state.py). Each stage can time
+out (see cancellation.py). A cancelled job stops scheduling new tasks and lets
+the tasks in flight finish.
+"""
+
+from typing import Dict, Any, List, Iterator, Optional
+from concurrent.futures import ThreadPoolExecutor
+from rich.console import Console
+import asyncio
+import inspect
+import random
+import statistics
+import threading
+
+from .storage import JobModel, TaskModel
+from .events import EventBus, EventType, ProgressEvent
+from .process_pool import ProcessTaskRunner
+from .run_group import (
+    TaskExecution,
+    run_execution,
+    replay_execution,
+    evaluate_execution,
+    plan_group_executions,
+    keep_stored_executions,
+    rephrase_task_variations,
+    score_interval_width,
+)
+from .run_async import run_execution_async, evaluate_execution_async
+from .batching import TaskBatcher, run_execution_batched
+from .runner_state import StatefulTaskRunner, has_worker_state
+from .concurrency import StageLimit, get_worker_limits
+from .resume import task_result
+from .output_cache import OutputCache
+from .cancellation import with_timeout
+from .early_stop import EarlyStop
+from .ordering import get_schedule, predict_durations, longest_first
+
+
+# Seconds between checks for a cancel request of the job
+CANCEL_POLL_INTERVAL = 1.0
+
+# Challenges read ahead from streamed task sources, per execution slot
+STREAM_LOOKAHEAD = 4
+
+
+class JobScheduler:
+    """
+    Run the tasks of all groups of a job on a single pool of workers.
+
+    Concurrency is bounded for the whole job, by `meta.max_workers` for the
+    execution stage and `meta.max_eval_workers` (defaults to max_workers) for
+    the evaluation stage, each either fixed or `auto`. Sync task runners use a
+    thread pool per stage, sized for the largest limit, async ones are awaited
+    directly on the scheduler's event loop.
+    """
+
+    def __init__(
+        self,
+        job: JobModel,
+        task_runner_module,
+        config: Dict[str, Any],
+        bus: EventBus = None,
+        output_cache: OutputCache = None,
+    ):
+        self.job = job
+        self.task_runner_module = task_runner_module
+        self.config = config
+        self.bus = bus or EventBus()
+        self.output_cache = output_cache
+        self.worker_limits = get_worker_limits(config)
+        self.max_workers = self.worker_limits["execution"]["max"]
+        self.max_eval_workers = self.worker_limits["evaluation"]["max"]
+        self.group_summaries: Dict[str, Dict[str, Any]] = {}
+        self.concurrency_history: Dict[str, List[Dict[str, Any]]] = {}
+        # Why the job stopped scheduling tasks early, if it did
+        self.stop_reason: str = None
+        self.skipped_tasks = 0
+        # Adaptive repeats not run, as the score of their task had converged
+        self.saved_repeats = 0
+        # Executions planned so far
+        self.planned_tasks = 0
+        self.early_stop = EarlyStop.from_config(config)
+        self._stop = threading.Event()
+
+    @property
+    def stopped(self) -> bool:
+        """
+        Whether the job stopped scheduling new tasks.
+        """
+        return self._stop.is_set()
+
+    def cancel(self, reason: str = "cancelled"):
+        """
+        Stop scheduling new tasks; the tasks in flight still finish. Safe to
+        call from any thread.
+        """
+        if not self._stop.is_set():
+            self.stop_reason = reason
+            self._stop.set()
+
+    def run(
+        self,
+        groups: List[Dict[str, Any]],
+        total_tasks: Optional[int] = 0,
+        finished: Dict[str, TaskModel] = None,
+        outputs: Dict[str, TaskModel] = None,
+    ) -> Iterator[ProgressEvent]:
+        """
+        Run the tasks of all groups.
+
+        The tasks are driven on an event loop in a background thread, which
+        publishes the RESULTS event once every task is done, while this
+        generator relays the progress events to the caller.
+
+        Args:
+            groups: Groups of tasks as returned by select_tasks; a group with a
+                `task_offset` numbers its tasks from there
+            total_tasks: Total number of tasks across all groups, or None if
+                not known up front; it is then the number planned so far
+            finished: Tasks finished in an earlier run, keyed by challenge ID;
+                their results are carried over instead of running them again
+            outputs: Executed tasks of an earlier job, keyed by challenge ID,
+                to re-evaluate: only the tasks with a stored output are
+                evaluated, and run_task is never called
+
+        Yields:
+            ProgressEvent for each progress update, then the RESULTS event
+        """
+        def run_loop():
+            results = []
+            try:
+                results = asyncio.run(
+                    self._run(groups, total_tasks, finished or {}, outputs)
+                )
+            except Exception as e:
+                console = Console()
+                console.print(f"[red bold]Error in task execution:[/red bold] {str(e)}")
+                console.print_exception()
+                results.append({"error": str(e)})
+            finally:
+                self.bus.publish(
+                    ProgressEvent(
+                        EventType.RESULTS,
+                        total=self.planned_tasks if total_tasks is None else total_tasks,
+                        results=results,
+                    )
+                )
+
+        loop_thread = threading.Thread(target=run_loop, daemon=True)
+        loop_thread.start()
+
+        while True:
+            event = self.bus.wait()
+            yield event
+            if event.type == EventType.RESULTS:
+                break
+
+        loop_thread.join()
+
+    async def _run(
+        self,
+        groups: List[Dict[str, Any]],
+        total_tasks: Optional[int],
+        finished: Dict[str, TaskModel],
+        outputs: Dict[str, TaskModel] = None,
+    ) -> List[Any]:
+        def total():
+            # Without a total up front (tasks generated as the job runs), the
+            # total grows as tasks are planned
+            return self.planned_tasks if total_tasks is None else total_tasks
+
+        exec_limits = self.worker_limits["execution"]
+        eval_limits = self.worker_limits["evaluation"]
+        exec_slots = StageLimit(
+            "execution", exec_limits["initial"], exec_limits["max"], exec_limits["adaptive"]
+        )
+        eval_slots = StageLimit(
+            "evaluation", eval_limits["initial"], eval_limits["max"], eval_limits["adaptive"]
+        )
+        # Tasks being evaluated plus those waiting for an evaluation slot
+        eval_queue = StageLimit(
+            "evaluation queue", 2 * eval_limits["initial"], 2 * eval_limits["max"]
+        )
+
+        # No task runner is loaded to re-evaluate stored outputs
+        run_task = getattr(self.task_runner_module, "run_task", None)
+        is_async = (
+            run_task is not None
+            and not isinstance(self.task_runner_module, ProcessTaskRunner)
+            and inspect.iscoroutinefunction(run_task)
+        )
+        exec_executor = eval_executor = None
+        if not is_async:
+            exec_executor = ThreadPoolExecutor(max_workers=self.max_workers)
+            eval_executor = ThreadPoolExecutor(max_workers=self.max_eval_workers)
+        loop = asyncio.get_running_loop()
+        task_runner_module = self.task_runner_module
+        # Each worker of the pool (or the event loop) keeps its own state
+        stateful = None
+        if (
+            outputs is None
+            and not isinstance(task_runner_module, ProcessTaskRunner)
+            and has_worker_state(task_runner_module)
+        ):
+            task_runner_module = stateful = StatefulTaskRunner(task_runner_module)
+        # Task runners with run_tasks run the tasks in flight in batches
+        batcher = None
+        if outputs is None:
+            batcher = TaskBatcher.from_config(
+                task_runner_module, self.config, self.max_workers, exec_executor
+            )
+
+        async def in_thread(executor, threads, seconds, stage, function, *args):
+            # The timeout starts once a worker thread picks the call up, not
+            # while it waits in the executor's queue
+            started = loop.create_future()
+
+            def call():
+                loop.call_soon_threadsafe(
+                    lambda: started.done() or started.set_result(None)
+                )
+                return function(*args)
+
+            future = loop.run_in_executor(executor, call)
+            threads.append(future)
+            await started
+            # A timed-out thread keeps running: its future is kept, not cancelled
+            return await with_timeout(asyncio.shield(future), seconds, stage)
+
+        async def release(slots, threads):
+            busy = [future for future in threads if not future.done()]
+            if not busy:
+                await slots.release()
+                return
+            # The slot is given back only once the timed-out thread is done,
+            # so that the tasks behind it do not queue up in the executor
+            busy[0].add_done_callback(lambda _: loop.create_task(slots.release()))
+
+        async def execute(execution, threads):
+            seconds = execution.timeouts["run_task"]
+            if outputs is not None:
+                return await in_thread(
+                    exec_executor, threads, seconds, "run_task",
+                    replay_execution, execution, outputs[execution.challenge_id],
+                )
+            if batcher is not None:
+                return await with_timeout(
+                    run_execution_batched(execution, batcher), seconds, "run_task"
+                )
+            if is_async:
+                return await with_timeout(
+                    run_execution_async(execution, task_runner_module), seconds, "run_task"
+                )
+            return await in_thread(
+                exec_executor, threads, seconds, "run_task",
+                run_execution, execution, task_runner_module,
+            )
+
+        async def evaluate(execution, threads):
+            seconds = execution.timeouts["evaluators"]
+            if is_async:
+                return await with_timeout(
+                    evaluate_execution_async(execution, task_runner_module),
+                    seconds,
+                    "evaluators",
+                )
+            return await in_thread(
+                eval_executor, threads, seconds, "evaluators",
+                evaluate_execution, execution, task_runner_module,
+            )
+
+        # Tasks read from a source are streamed instead of planned up front
+        streamed = any(not isinstance(g["tasks"], list) for g in groups)
+
+        async def batches_of(tasks):
+            if isinstance(tasks, list):
+                yield tasks
+                return
+            # Streamed tasks are planned one at a time, as they are read off
+            # the event loop, until the job stops early
+            rows = iter(tasks)
+            while not self.stopped:
+                task = await asyncio.to_thread(next, rows, None)
+                if task is None:
+                    return
+                yield [task]
+
+        async def plan():
+            # Number every execution in group order (tasks pulled from the
+            # queue keep the numbers they were given when the job was queued)
+            offset = 0
+            for group_data in groups:
+                group_id = group_data["group_id"]
+                offset = group_data.get("task_offset", offset)
+                summary = self.group_summaries.setdefault(group_id, {
+                    "total": 0,
+                    "finished": 0,
+                    "passed": 0,
+                    "errors": 0,
+                    "skipped": 0,
+                    "scores": [],
+                    "planned": False,
+                })
+                async for batch in batches_of(group_data["tasks"]):
+                    task_groups = plan_group_executions(batch, self.config, offset)
+                    if outputs is not None:
+                        task_groups = keep_stored_executions(task_groups, outputs, offset)
+                    count = sum(len(g["executions"]) for g in task_groups.values())
+                    offset += count
+                    summary["total"] += count
+                    self.planned_tasks += count
+                    for group in task_groups.values():
+                        yield group_id, group
+                summary["planned"] = True
+                if streamed:
+                    # Its last tasks may have finished while the rest was read
+                    self._check_group_finished(group_id, total())
+
+        results: Dict[int, Any] = {}
+
+        async def run_pipeline(group_id, task_copy, execution_plan):
+            task_number = execution_plan["task_number"]
+            await exec_slots.acquire()
+            if self.stopped:
+                await exec_slots.release()
+                self._skip_tasks(group_id, 1, total())
+                return
+            execution = TaskExecution(
+                task_copy,
+                self.job,
+                task_number,
+                total(),
+                self.config,
+                execution_plan["repeat"],
+                self.bus,
+                group_id,
+                execution_plan["challenge_id"],
+                self.output_cache,
+            )
+            result = None
+            # Futures of the stages run in worker threads
+            exec_threads, eval_threads = [], []
+            try:
+                try:
+                    await exec_slots.measure(execute(execution, exec_threads))
+                    # Backpressure: hold the execution slot until the output
+                    # can be queued for evaluation
+                    await eval_queue.acquire()
+                finally:
+                    await release(exec_slots, exec_threads)
+                try:
+                    await eval_slots.acquire()
+                    try:
+                        result = await eval_slots.measure(
+                            evaluate(execution, eval_threads)
+                        )
+                    finally:
+                        await release(eval_slots, eval_threads)
+                    await eval_queue.resize(2 * eval_slots.limit)
+                finally:
+                    await eval_queue.release()
+            except Exception as e:
+                result = await asyncio.to_thread(execution.fail, e)
+            finally:
+                execution.finish(result)
+            results[task_number] = result
+            self._task_finished(group_id, result, total())
+
+        # Rephrased inputs are prefetched in the background, a challenge at a time
+        rephrase_slots = asyncio.Semaphore(exec_limits["initial"])
+
+        async def run_challenge(group_id, group):
+            task = group["task"]
+            repeats = group["repeats"]
+            pending = []
+            variations = []
+            # Adaptive repeats beyond the minimum, run only while the score
+            # has not converged
+            extra = []
+            for execution in group["executions"]:
+                if outputs is not None:
+                    # Evaluate the stored input and output, without rephrasing
+                    stored = outputs[execution["challenge_id"]]
+                    pending.append(asyncio.create_task(run_pipeline(
+                        group_id, {**task, "input": stored.task_input}, execution
+                    )))
+                elif execution["challenge_id"] in finished:
+                    self._carry_over(
+                        group_id, execution, finished[execution["challenge_id"]],
+                        results, total(),
+                    )
+                elif repeats["adaptive"] and execution["repeat"] >= repeats["min"]:
+                    extra.append(execution)
+                elif execution["repeat"] > 0:
+                    variations.append(execution)
+                else:
+                    # The original input is ready, start right away
+                    pending.append(asyncio.create_task(
+                        run_pipeline(group_id, task.copy(), execution)
+                    ))
+
+            task_copies = None
+            if variations and self.stopped:
+                self._skip_tasks(group_id, len(variations), total())
+            elif variations or extra:
+                # All variations of the challenge are generated in one request;
+                # repeat N runs variation N, even if earlier ones are carried over
+                count = max(execution["repeat"] for execution in variations + extra)
+                async with rephrase_slots:
+                    try:
+                        task_copies = await asyncio.to_thread(
+                            rephrase_task_variations, task, count, self.config
+                        )
+                    except Exception as e:
+                        Console().print(
+                            f"[red]Failed to rephrase input, repeating the original: {str(e)}[/red]"
+                        )
+                        task_copies = [task.copy() for _ in range(count)]
+                for execution in variations:
+                    pending.append(asyncio.create_task(run_pipeline(
+                        group_id, task_copies[execution["repeat"] - 1], execution
+                    )))
+
+            await asyncio.gather(*pending)
+
+            # One more repeat at a time, while the score's interval is too wide
+            while extra and task_copies and not self.stopped:
+                scores = self._challenge_scores(group, results)
+                width = score_interval_width(scores, repeats["confidence"])
+                if width <= repeats["target_ci"]:
+                    break
+                execution = extra.pop(0)
+                await run_pipeline(
+                    group_id, task_copies[execution["repeat"] - 1], execution
+                )
+            if extra and self.stopped:
+                self._skip_tasks(group_id, len(extra), total())
+            elif extra:
+                self._skip_repeats(group_id, len(extra), total())
+
+        async def watch_cancel():
+            # Cancel requests may come from another process, e.g. the web API
+            while not self.stopped:
+                await asyncio.sleep(CANCEL_POLL_INTERVAL)
+                if await asyncio.to_thread(JobModel.is_cancel_requested, self.job.id):
+                    self.cancel()
+
+        async def run_streamed(challenges):
+            # At most `lookahead` challenges are read ahead of the running ones
+            lookahead = STREAM_LOOKAHEAD * self.max_workers
+            outcomes = []
+            pending = set()
+
+            def collect(done):
+                outcomes.extend(
+                    task.exception() if task.exception() else task.result()
+                    for task in done
+                )
+
+            async for group_id, group in challenges:
+                if len(pending) >= lookahead:
+                    done, pending = await asyncio.wait(
+                        pending, return_when=asyncio.FIRST_COMPLETED
+                    )
+                    collect(done)
+                pending.add(asyncio.create_task(run_challenge(group_id, group)))
+            if pending:
+                done, _ = await asyncio.wait(pending)
+                collect(done)
+            return outcomes
+
+        challenges = None
+        if not streamed:
+            challenges = [challenge async for challenge in plan()]
+            if self.early_stop is not None:
+                # The tasks finished at any point are then a random sample of the suite
+                random.Random(self.early_stop.seed).shuffle(challenges)
+            elif get_schedule(self.config) == "history":
+                # Longest tasks first, so that no straggler starts last
+                predictions = await asyncio.to_thread(
+                    predict_durations,
+                    self.job.project_id,
+                    [
+                        execution["challenge_id"]
+                        for _, group in challenges
+                        for execution in group["executions"]
+                    ],
+                )
+                challenges = longest_first(challenges, predictions)
+
+        watcher = asyncio.create_task(watch_cancel())
+        try:
+            if streamed:
+                # Sources are never held in memory, so their tasks run in
+                # order, even for early stopping
+                outcomes = await run_streamed(plan())
+            else:
+                outcomes = await asyncio.gather(
+                    *(run_challenge(group_id, group) for group_id, group in challenges),
+                    return_exceptions=True,
+                )
+        finally:
+            watcher.cancel()
+            if stateful is not None:
+                # Each worker thread ends its own state, before the pool shuts down
+                await stateful.close(exec_executor, self.max_workers)
+            for executor in (exec_executor, eval_executor):
+                if executor is not None:
+                    # Threads of timed-out tasks are abandoned, not waited for
+                    executor.shutdown(wait=False)
+
+        if exec_limits["adaptive"] or eval_limits["adaptive"]:
+            # Concurrency chosen over time, for tuning the limits later
+            self.concurrency_history = {
+                "execution": exec_slots.history,
+                "evaluation": eval_slots.history,
+            }
+            await asyncio.to_thread(
+                self.job.update,
+                total_tasks=total(),
+                details={"concurrency": self.concurrency_history},
+            )
+
+        if self.saved_repeats:
+            await asyncio.to_thread(
+                self.job.update,
+                total_tasks=total(),
+                details={"saved_repeats": self.saved_repeats},
+            )
+
+        ordered = [results[n] for n in sorted(results) if results[n]]
+        ordered.extend(
+            {"error": str(outcome)}
+            for outcome in outcomes
+            if isinstance(outcome, BaseException)
+        )
+        return ordered
+
+    def _carry_over(
+        self,
+        group_id: str,
+        execution: Dict[str, Any],
+        task: TaskModel,
+        results: Dict[int, Any],
+        total_tasks: int,
+    ):
+        """
+        Account for a task finished in an earlier run, without running it.
+        """
+        result = task_result(task)
+        results[execution["task_number"]] = result
+        event = dict(
+            total=total_tasks,
+            group_id=group_id,
+            task_number=execution["task_number"],
+            task_id=task.id,
+            challenge_id=task.challenge_id,
+            repeat=execution["repeat"],
+        )
+        self.bus.publish(ProgressEvent(
+            EventType.CARRIED_OVER,
+            passed=bool(task.eval_passed),
+            score=task.eval_score,
+            **event,
+        ))
+        self.bus.publish(ProgressEvent(EventType.FINISHED, result=result, **event))
+        self._task_finished(group_id, result, total_tasks)
+
+    def _task_finished(self, group_id: str, result: Any, total_tasks: int):
+        """
+        Account for a finished task, publishing GROUP_FINISHED after the last
+        one, and stop the job if an early stopping rule is met.
+        """
+        summary = self.group_summaries[group_id]
+        summary["finished"] += 1
+        passed = False
+        if isinstance(result, list):
+            eval_result = result[1]
+            summary["scores"].append(eval_result["score"])
+            if eval_result["passed"]:
+                summary["passed"] += 1
+                passed = True
+        else:
+            summary["errors"] += 1
+
+        if self.early_stop is not None:
+            reason = self.early_stop.observe(passed)
+            if reason:
+                self.cancel(reason)
+
+        self._check_group_finished(group_id, total_tasks)
+
+    def _skip_repeats(self, group_id: str, count: int, total_tasks: int):
+        """
+        Account for adaptive repeats that will not run, as their task converged.
+        """
+        self.saved_repeats += count
+        self.group_summaries[group_id]["total"] -= count
+        self._check_group_finished(group_id, total_tasks)
+
+    def _skip_tasks(self, group_id: str, count: int, total_tasks: int):
+        """
+        Account for tasks that will not run, as the job stopped early.
+        """
+        self.skipped_tasks += count
+        self.group_summaries[group_id]["skipped"] += count
+        self._check_group_finished(group_id, total_tasks)
+
+    def _check_group_finished(self, group_id: str, total_tasks: int):
+        summary = self.group_summaries[group_id]
+        done = summary["finished"] + summary["skipped"]
+        if summary["planned"] and done == summary["total"]:
+            self.bus.publish(ProgressEvent(
+                EventType.GROUP_FINISHED,
+                total=total_tasks,
+                group_id=group_id,
+                summary=self.get_group_summary(group_id),
+            ))
+
+    @staticmethod
+    def _challenge_scores(group: Dict[str, Any], results: Dict[int, Any]) -> List[float]:
+        """
+        Scores of the finished repeats of a challenge, counting errors as 0.
+        """
+        scores = []
+        for execution in group["executions"]:
+            result = results.get(execution["task_number"])
+            if result is not None:
+                scores.append(result[1]["score"] if isinstance(result, list) else 0.0)
+        return scores
+
+    def get_group_summary(self, group_id: str) -> Dict[str, Any]:
+        """
+        Get the summary of a group: task counts and average score.
+        """
+        summary = self.group_summaries[group_id]
+        scores = summary["scores"]
+        return {
+            "total": summary["total"],
+            "finished": summary["finished"],
+            "passed": summary["passed"],
+            "failed": summary["finished"] - summary["passed"] - summary["errors"],
+            "errors": summary["errors"],
+            "score": round(statistics.mean(scores), 4) if scores else None,
+        }
+
+    def get_group_summaries(self) -> Dict[str, Dict[str, Any]]:
+        """
+        Get the summaries of all groups of the job.
+        """
+        return {gid: self.get_group_summary(gid) for gid in self.group_summaries}
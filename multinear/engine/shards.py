@@ -0,0 +1,183 @@
+"""
+Sharded runs, merged into a single job.
+
+`multinear run --shard i/n --job <id>` runs the i-th of n disjoint shards of
+the selected tasks. Tasks are assigned to shards by a hash of their challenge
+ID, so every shard sees the same partition, and all repeats of a task land in
+the same shard. Each shard runs in its own checkout (with its own database),
+and exports its job to `.multinear/shards/<job id>/shard-<i>-of-<n>.json`.
+
+`multinear merge` imports the shard exports into one job, with the summaries
+of the config groups combined and the aggregations computed over all tasks.
+"""
+
+from pathlib import Path
+from typing import Dict, Any, List, Optional, Tuple
+import hashlib
+
+from rich.console import Console
+
+from .aggregation import aggregate_job
+from .run_group import get_challenge_id
+from .storage import JobModel, TaskModel, TaskStatus
+from .task_source import filter_tasks, has_tasks
+
+
+def parse_shard(value: str) -> Tuple[int, int]:
+    """
+    Parse a shard given as `i/n`, with shards numbered from 1.
+
+    Returns:
+        Tuple of (index, count)
+    """
+    try:
+        index, count = (int(part) for part in value.split("/"))
+    except ValueError:
+        raise ValueError(f"Invalid shard '{value}', expected i/n, e.g. 1/4") from None
+    if count < 1 or not 1 <= index <= count:
+        raise ValueError(f"Invalid shard '{value}', expected 1 <= i <= n")
+    return index, count
+
+
+def shard_of(task: Dict[str, Any], count: int) -> int:
+    """
+    The shard (from 1) that a task belongs to, out of `count` shards.
+    """
+    digest = hashlib.sha256(get_challenge_id(task).encode()).hexdigest()
+    return int(digest[:16], 16) % count + 1
+
+
+def select_shard(
+    task_groups: List[Dict[str, Any]], index: int, count: int
+) -> List[Dict[str, Any]]:
+    """
+    Keep the tasks of one shard in the selected task groups. Groups left
+    without tasks are dropped.
+    """
+    selected = []
+    for group_data in task_groups:
+        tasks = filter_tasks(
+            group_data["tasks"], lambda task: shard_of(task, count) == index
+        )
+        if has_tasks(tasks):
+            selected.append({**group_data, "tasks": tasks})
+    return selected
+
+
+def shard_path(folder: Path, job_id: str, index: int, count: int) -> Path:
+    """
+    Path of the export of a shard, in the project folder.
+    """
+    return Path(folder) / ".multinear" / "shards" / job_id / f"shard-{index}-of-{count}.json"
+
+
+def merge_group_summaries(
+    summaries: List[Dict[str, Dict[str, Any]]]
+) -> Dict[str, Dict[str, Any]]:
+    """
+    Combine the group summaries of several shards. Scores are averaged over
+    the evaluated tasks of all shards.
+    """
+    merged: Dict[str, Dict[str, Any]] = {}
+    weighted: Dict[str, float] = {}
+    for groups in summaries:
+        for group_id, summary in groups.items():
+            group = merged.setdefault(group_id, {
+                "total": 0, "finished": 0, "passed": 0, "failed": 0, "errors": 0,
+                "score": None,
+            })
+            for field in ("total", "finished", "passed", "failed", "errors"):
+                group[field] += summary.get(field, 0)
+            if summary.get("score") is not None:
+                count = summary["finished"] - summary["errors"]
+                weighted[group_id] = weighted.get(group_id, 0.0) + summary["score"] * count
+
+    for group_id, group in merged.items():
+        count = group["finished"] - group["errors"]
+        if group_id in weighted and count:
+            group["score"] = round(weighted[group_id] / count, 4)
+    return merged
+
+
+def merge_shards(
+    shards: List[Dict[str, Any]],
+    project_id: str,
+    config: Dict[str, Any],
+    console: Optional[Console] = None,
+) -> JobModel:
+    """
+    Merge the exports of the shards of a job into one job in the database.
+
+    Args:
+        shards: Shard exports, as written by a sharded run
+        project_id: ID of the project the job belongs to
+        config: Configuration dictionary, for the aggregations
+        console: Console to report on
+
+    Returns:
+        The merged job
+    """
+    console = console or Console()
+    if not shards:
+        raise ValueError("No shards to merge")
+    if any(not (shard.get("details") or {}).get("shard") for shard in shards):
+        raise ValueError("Not a shard export: run with --shard to export shards")
+    job_ids = {shard["job_id"] for shard in shards}
+    if len(job_ids) > 1:
+        raise ValueError(f"Shards belong to different jobs: {', '.join(sorted(job_ids))}")
+    counts = {shard["details"]["shard"]["count"] for shard in shards}
+    if len(counts) > 1:
+        raise ValueError("Shards were split into different numbers of shards")
+    job_id, count = job_ids.pop(), counts.pop()
+
+    shards = sorted(shards, key=lambda shard: shard["details"]["shard"]["index"])
+    indexes = [shard["details"]["shard"]["index"] for shard in shards]
+    if len(set(indexes)) != len(indexes):
+        raise ValueError("The same shard is given more than once")
+    missing = sorted(set(range(1, count + 1)) - set(indexes))
+    if missing:
+        console.print(
+            f"[yellow]Warning: missing shards {', '.join(map(str, missing))} "
+            f"of {count}[/yellow]"
+        )
+
+    job = JobModel.find(job_id)
+    if job is None:
+        job = JobModel.find(JobModel.start(project_id, job_id))
+
+    # Tasks are numbered shard by shard, in the order they ran
+    tasks = [
+        task
+        for shard in shards
+        for task in sorted(shard["tasks"].values(), key=lambda t: t["task_number"])
+    ]
+    for number, task in enumerate(tasks, start=1):
+        task["task_number"] = number
+    TaskModel.import_dicts(tasks, job_id)
+
+    total_tasks = sum(shard.get("total_tasks") or 0 for shard in shards)
+    groups = merge_group_summaries([shard["details"].get("groups", {}) for shard in shards])
+    statuses = [shard["status"] for shard in shards]
+    status = next(
+        (s for s in statuses if s != TaskStatus.COMPLETED), TaskStatus.COMPLETED
+    )
+    revisions = {shard["details"].get("git_revision") for shard in shards}
+    job.update(
+        status=status,
+        total_tasks=total_tasks,
+        current_task=len(tasks),
+        details={
+            "status": status,
+            "total": total_tasks,
+            "current": len(tasks),
+            "git_revision": revisions.pop() if len(revisions) == 1 else None,
+            "status_map": TaskModel.get_status_map(job_id),
+            "groups": groups,
+            "shard": None,
+            "shards": {"count": count, "merged": indexes, "missing": missing},
+        },
+    )
+
+    aggregate_job(job_id, config, groups, total_tasks, console)
+    job.finish(status)
+    return job
@@ -7,12 +7,18 @@ from sqlalchemy import (
     ForeignKey,
     Float,
     Boolean,
+    Index,
     event,
+    func,
+    inspect,
+    text,
+    and_,
+    or_,
 )
 from sqlalchemy.orm import sessionmaker, declarative_base, relationship
 from sqlalchemy.types import JSON
 from sqlalchemy.pool import QueuePool
-from datetime import datetime, timezone
+from datetime import datetime, timezone, timedelta
 from contextlib import contextmanager
 from typing import Dict, Optional, List
 import uuid
@@ -57,6 +63,8 @@ class TaskStatus:
     EVALUATING = "evaluating"
     COMPLETED = "completed"
     FAILED = "failed"
+    TIMEOUT = "timeout"
+    CANCELLED = "cancelled"
 
 
 # Define SQLAlchemy models to represent database tables
@@ -131,11 +139,11 @@ class JobModel(Base):
     aggregation_results = relationship("AggregationResultModel", back_populates="job")
 
     @classmethod
-    def start(cls, project_id: str) -> str:
+    def start(cls, project_id: str, job_id: Optional[str] = None) -> str:
         """
-        Start a new job for a project and return its ID.
+        Start a new job for a project and return its ID, a new one by default.
         """
-        job_id = str(uuid.uuid4())
+        job_id = job_id or str(uuid.uuid4())
         with db_context() as db:
             job = cls(id=job_id, project_id=project_id, status=TaskStatus.STARTING)
             db.add(job)
@@ -158,6 +166,33 @@ class JobModel(Base):
         with db_context() as db:
             return db.query(cls).filter(cls.id.like(f"%{job_id}")).first()
 
+    @classmethod
+    @_retry_on_database_lock()
+    def request_cancel(cls, job_id: str) -> bool:
+        """
+        Ask a running job to stop scheduling new tasks. The scheduler running
+        the job, in any process, picks the request up and drains in-flight tasks.
+
+        Returns:
+            False if the job does not exist or has already finished
+        """
+        with db_context() as db:
+            job = db.query(cls).filter(cls.id == job_id).first()
+            if not job or job.finished_at is not None:
+                return False
+            job.details = {**(job.details or {}), "cancel_requested": True}
+            db.commit()
+            return True
+
+    @classmethod
+    def is_cancel_requested(cls, job_id: str) -> bool:
+        """
+        Whether cancelling the job was requested.
+        """
+        with db_context() as db:
+            job = db.query(cls).filter(cls.id == job_id).first()
+            return bool(job and (job.details or {}).get("cancel_requested"))
+
     @_retry_on_database_lock()
     def update(
         self,
@@ -206,6 +241,31 @@ class JobModel(Base):
             self.status = status
             self.finished_at = finished_at
 
+    @_retry_on_database_lock()
+    def finish_once(self, status: str = TaskStatus.COMPLETED) -> bool:
+        """
+        Mark the job as finished, unless it already is. Safe to race: only
+        one caller wins.
+
+        Returns:
+            Whether this call finished the job
+        """
+        finished_at = datetime.now(timezone.utc)
+        with db_context() as db:
+            claimed = (
+                db.query(JobModel)
+                .filter(JobModel.id == self.id, JobModel.finished_at.is_(None))
+                .update(
+                    {JobModel.status: status, JobModel.finished_at: finished_at},
+                    synchronize_session=False,
+                )
+            )
+            db.commit()
+        if claimed:
+            self.status = status
+            self.finished_at = finished_at
+        return bool(claimed)
+
     @classmethod
     def list_recent(
         cls, project_id: str, limit: int = 5, offset: int = 0
@@ -291,12 +351,20 @@ class TaskModel(Base):
     eval_score = Column(Float, nullable=True)
     eval_details = Column(JSON, nullable=True)
     eval_logs = Column(JSON, nullable=True)
+    task_attempts = Column(Integer, nullable=True)  # Calls of run_task, with retries
+    eval_attempts = Column(Integer, nullable=True)  # Evaluator calls, with retries
+    eval_key = Column(String, nullable=True)  # Hash of output, eval spec and judge model
     created_at = Column(DateTime, default=lambda: datetime.now(timezone.utc))
     executed_at = Column(DateTime, nullable=True)
     evaluated_at = Column(DateTime, nullable=True)
     finished_at = Column(DateTime, nullable=True)
     job = relationship("JobModel", back_populates="tasks")
 
+    __table_args__ = (
+        # Latest evaluation of an output under a spec, for reusing evaluations
+        Index("ix_tasks_eval_key_evaluated_at", "eval_key", "evaluated_at"),
+    )
+
     def to_dict(self):
         """
         Convert the TaskModel to a dictionary, excluding SQLAlchemy internals
@@ -328,7 +396,15 @@ class TaskModel(Base):
 
     @classmethod
     @_retry_on_database_lock()
-    def executed(cls, task_id: str, input: any, output: any, details: dict, logs: dict):
+    def executed(
+        cls,
+        task_id: str,
+        input: any,
+        output: any,
+        details: dict,
+        logs: dict,
+        attempts: int = 1,
+    ):
         """
         Update the task as executed with results and logs.
         """
@@ -339,6 +415,7 @@ class TaskModel(Base):
             task.task_output = output
             task.task_details = details
             task.task_logs = logs
+            task.task_attempts = attempts
             task.executed_at = datetime.now(timezone.utc)
             db.commit()
 
@@ -352,6 +429,8 @@ class TaskModel(Base):
         score: float,
         details: dict,
         logs: dict,
+        attempts: Optional[int] = None,
+        eval_key: Optional[str] = None,
     ):
         """
         Update the task as evaluated and completed.
@@ -364,21 +443,168 @@ class TaskModel(Base):
             task.eval_score = score
             task.eval_details = details
             task.eval_logs = logs
+            task.eval_attempts = attempts
+            task.eval_key = eval_key
             task.evaluated_at = task.finished_at = datetime.now(timezone.utc)
             db.commit()
 
     @classmethod
-    def fail(cls, task_id: str, error: str):
+    def find_evaluation(cls, eval_key: str) -> Optional["TaskModel"]:
         """
-        Mark the task as failed with an error message.
+        Find the most recently evaluated task with the given evaluation key.
+        """
+        with db_context() as db:
+            return (
+                db.query(cls)
+                .filter(cls.eval_key == eval_key, cls.eval_passed.isnot(None))
+                .order_by(cls.evaluated_at.desc())
+                .first()
+            )
+
+    @classmethod
+    def fail(
+        cls,
+        task_id: str,
+        error: str,
+        task_attempts: Optional[int] = None,
+        eval_attempts: Optional[int] = None,
+        status: str = TaskStatus.FAILED,
+    ):
+        """
+        Mark the task as failed (or timed out) with an error message.
         """
         with db_context() as db:
             task = db.query(cls).filter(cls.id == task_id).one()
-            task.status = TaskStatus.FAILED
+            task.status = status
             task.error = error
+            if task_attempts:
+                task.task_attempts = task_attempts
+            if eval_attempts:
+                task.eval_attempts = eval_attempts
             task.finished_at = datetime.now(timezone.utc)
             db.commit()
 
+    @classmethod
+    def list_finished(cls, job_id: str, since: Optional[datetime] = None) -> List["TaskModel"]:
+        """
+        List the tasks of a job that have finished, whatever their outcome,
+        optionally only those finished at or after `since`.
+        """
+        with db_context() as db:
+            query = db.query(cls).filter(cls.job_id == job_id, cls.finished_at.isnot(None))
+            if since is not None:
+                query = query.filter(cls.finished_at >= since)
+            return query.order_by(cls.finished_at).all()
+
+    @classmethod
+    def list_executed(cls, job_id: str) -> List["TaskModel"]:
+        """
+        List the tasks of a job whose run_task output was recorded.
+        """
+        with db_context() as db:
+            return (
+                db.query(cls)
+                .filter(cls.job_id == job_id, cls.executed_at.isnot(None))
+                .order_by(cls.executed_at)
+                .all()
+            )
+
+    @classmethod
+    def recent_durations(
+        cls, project_id: str, challenge_ids: List[str], limit: int
+    ) -> Dict[str, List[float]]:
+        """
+        Durations in seconds of the most recent finished runs of challenges
+        in the jobs of a project, at most `limit` per challenge.
+        """
+        durations: Dict[str, List[float]] = {}
+        with db_context() as db:
+            # Chunked to stay below SQLite's limit of bound parameters
+            for start in range(0, len(challenge_ids), 500):
+                rows = (
+                    db.query(cls.challenge_id, cls.created_at, cls.finished_at)
+                    .join(JobModel, JobModel.id == cls.job_id)
+                    .filter(
+                        JobModel.project_id == project_id,
+                        cls.challenge_id.in_(challenge_ids[start:start + 500]),
+                        cls.finished_at.isnot(None),
+                    )
+                    .order_by(cls.finished_at.desc())
+                    .all()
+                )
+                for challenge_id, created_at, finished_at in rows:
+                    recent = durations.setdefault(challenge_id, [])
+                    if len(recent) < limit:
+                        recent.append((finished_at - created_at).total_seconds())
+        return durations
+
+    @classmethod
+    @_retry_on_database_lock()
+    def delete_unfinished(
+        cls, job_id: str, challenge_ids: Optional[List[str]] = None
+    ) -> int:
+        """
+        Delete the tasks of a job that were interrupted before finishing.
+
+        Args:
+            job_id: Job ID
+            challenge_ids: If provided, only delete tasks of these challenges
+
+        Returns:
+            Number of tasks deleted
+        """
+        with db_context() as db:
+            query = db.query(cls).filter(cls.job_id == job_id, cls.finished_at.is_(None))
+            if challenge_ids is not None:
+                query = query.filter(cls.challenge_id.in_(challenge_ids))
+            deleted = query.delete(synchronize_session=False)
+            db.commit()
+            return deleted
+
+    @classmethod
+    @_retry_on_database_lock()
+    def copy_to_job(cls, tasks: List["TaskModel"], job_id: str) -> List["TaskModel"]:
+        """
+        Copy finished tasks into another job, keeping their results and timestamps.
+
+        Returns:
+            The new tasks
+        """
+        columns = [c.name for c in cls.__table__.columns if c.name not in ("id", "job_id")]
+        copies = [
+            cls(
+                id=str(uuid.uuid4()),
+                job_id=job_id,
+                **{name: getattr(task, name) for name in columns},
+            )
+            for task in tasks
+        ]
+        with db_context() as db:
+            db.add_all(copies)
+            db.commit()
+        return copies
+
+    @classmethod
+    @_retry_on_database_lock()
+    def import_dicts(cls, tasks: List[Dict], job_id: str) -> int:
+        """
+        Import exported tasks (as returned by to_dict) into a job. Tasks that
+        already exist are overwritten, so importing is idempotent.
+
+        Returns:
+            Number of imported tasks
+        """
+        columns = {c.name: c for c in cls.__table__.columns if c.name != "job_id"}
+        with db_context() as db:
+            for data in tasks:
+                fields = {k: v for k, v in data.items() if k in columns}
+                for name, value in fields.items():
+                    if isinstance(columns[name].type, DateTime) and isinstance(value, str):
+                        fields[name] = datetime.fromisoformat(value)
+                db.merge(cls(job_id=job_id, **fields))
+            db.commit()
+        return len(tasks)
+
     @classmethod
     def list(cls, job_id: str):
         """
@@ -465,6 +691,480 @@ class AggregationResultModel(Base):
         return data
 
 
+class VariationModel(Base):
+    """
+    Rephrased variation of a task input, kept to be reused by later runs.
+
+    Variations are keyed by a hash of the rephrased input and the version of
+    the rephrase prompt. A pinned set is used as is and never extended.
+    """
+    __tablename__ = "variations"
+
+    id = Column(String, primary_key=True, index=True)
+    input_hash = Column(String, nullable=False, index=True)
+    prompt_version = Column(String, nullable=False, index=True)
+    position = Column(Integer, nullable=False)
+    source = Column(JSON, nullable=True)  # The input that was rephrased
+    variation = Column(JSON, nullable=False)
+    pinned = Column(Boolean, default=False)
+    created_at = Column(DateTime, default=lambda: datetime.now(timezone.utc))
+
+    @classmethod
+    def get(cls, input_hash: str, prompt_version: str) -> List["VariationModel"]:
+        """
+        Get the stored variations of an input, in the order they were generated.
+        """
+        with db_context() as db:
+            return (
+                db.query(cls)
+                .filter(cls.input_hash == input_hash, cls.prompt_version == prompt_version)
+                .order_by(cls.position)
+                .all()
+            )
+
+    @classmethod
+    @_retry_on_database_lock()
+    def add(
+        cls, input_hash: str, prompt_version: str, source: any, variations: List[any]
+    ):
+        """
+        Append new variations to the stored set of an input.
+        """
+        with db_context() as db:
+            count = (
+                db.query(cls)
+                .filter(cls.input_hash == input_hash, cls.prompt_version == prompt_version)
+                .count()
+            )
+            for i, variation in enumerate(variations):
+                db.add(cls(
+                    id=str(uuid.uuid4()),
+                    input_hash=input_hash,
+                    prompt_version=prompt_version,
+                    position=count + i,
+                    source=source,
+                    variation=variation,
+                ))
+            db.commit()
+
+    @classmethod
+    @_retry_on_database_lock()
+    def clear(cls, input_hash: Optional[str] = None, include_pinned: bool = False) -> int:
+        """
+        Delete stored variations, of one input (hash or hash prefix) or all of them.
+
+        Returns:
+            Number of variations deleted
+        """
+        with db_context() as db:
+            query = db.query(cls)
+            if input_hash:
+                query = query.filter(cls.input_hash.like(f"{input_hash}%"))
+            if not include_pinned:
+                query = query.filter(cls.pinned.isnot(True))
+            deleted = query.delete(synchronize_session=False)
+            db.commit()
+            return deleted
+
+    @classmethod
+    @_retry_on_database_lock()
+    def set_pinned(cls, input_hash: str, pinned: bool = True) -> int:
+        """
+        Pin or unpin the variation set of an input (hash or hash prefix).
+
+        Returns:
+            Number of variations updated
+        """
+        with db_context() as db:
+            updated = (
+                db.query(cls)
+                .filter(cls.input_hash.like(f"{input_hash}%"))
+                .update({cls.pinned: pinned}, synchronize_session=False)
+            )
+            db.commit()
+            return updated
+
+    @classmethod
+    def list_sets(cls) -> List[Dict]:
+        """
+        Summarize the stored variation sets, one entry per input and prompt version.
+        """
+        with db_context() as db:
+            variations = db.query(cls).order_by(cls.input_hash, cls.position).all()
+
+        sets = {}
+        for variation in variations:
+            key = (variation.input_hash, variation.prompt_version)
+            if key not in sets:
+                sets[key] = {
+                    "input_hash": variation.input_hash,
+                    "prompt_version": variation.prompt_version,
+                    "source": variation.source,
+                    "count": 0,
+                    "pinned": bool(variation.pinned),
+                    "created_at": variation.created_at.isoformat(),
+                }
+            sets[key]["count"] += 1
+        return list(sets.values())
+
+
+class OutputCacheModel(Base):
+    """
+    Cached output of run_task, keyed by a hash of the input, the task and the
+    code that produced it.
+    """
+    __tablename__ = "output_cache"
+
+    key = Column(String, primary_key=True, index=True)
+    output = Column(JSON, nullable=True)
+    details = Column(JSON, nullable=True)
+    logs = Column(JSON, nullable=True)
+    size = Column(Integer, nullable=False, default=0)  # Size of the entry in bytes
+    created_at = Column(DateTime, default=lambda: datetime.now(timezone.utc), index=True)
+    last_used_at = Column(DateTime, default=lambda: datetime.now(timezone.utc), index=True)
+
+    @classmethod
+    def get(cls, key: str, max_age_days: Optional[float] = None) -> Optional["OutputCacheModel"]:
+        """
+        Get a cache entry, unless it is older than `max_age_days`.
+        """
+        with db_context() as db:
+            query = db.query(cls).filter(cls.key == key)
+            if max_age_days:
+                query = query.filter(cls.created_at >= _days_ago(max_age_days))
+            entry = query.first()
+            if entry:
+                entry.last_used_at = datetime.now(timezone.utc)
+                db.commit()
+            return entry
+
+    @classmethod
+    @_retry_on_database_lock()
+    def put(cls, key: str, output: any, details: dict, logs: any, size: int):
+        """
+        Store (or replace) a cache entry.
+        """
+        now = datetime.now(timezone.utc)
+        with db_context() as db:
+            db.merge(cls(
+                key=key,
+                output=output,
+                details=details,
+                logs=logs,
+                size=size,
+                created_at=now,
+                last_used_at=now,
+            ))
+            db.commit()
+
+    @classmethod
+    @_retry_on_database_lock()
+    def evict(
+        cls,
+        max_entries: Optional[int] = None,
+        max_size: Optional[int] = None,
+        max_age_days: Optional[float] = None,
+    ) -> int:
+        """
+        Delete entries older than `max_age_days`, then the least recently used
+        ones until at most `max_entries` entries of `max_size` bytes in total remain.
+
+        Returns:
+            Number of entries deleted
+        """
+        deleted = 0
+        with db_context() as db:
+            if max_age_days:
+                deleted += (
+                    db.query(cls)
+                    .filter(cls.created_at < _days_ago(max_age_days))
+                    .delete(synchronize_session=False)
+                )
+
+            if max_entries or max_size:
+                entries = (
+                    db.query(cls.key, cls.size)
+                    .order_by(cls.last_used_at.desc())
+                    .all()
+                )
+                keep, total, evicted = 0, 0, []
+                for key, size in entries:
+                    if (max_entries and keep >= max_entries) or (
+                        max_size and total + size > max_size
+                    ):
+                        evicted.append(key)
+                    else:
+                        keep += 1
+                        total += size
+                for i in range(0, len(evicted), 500):
+                    deleted += (
+                        db.query(cls)
+                        .filter(cls.key.in_(evicted[i:i + 500]))
+                        .delete(synchronize_session=False)
+                    )
+            db.commit()
+        return deleted
+
+
+def _days_ago(days: float) -> datetime:
+    return datetime.now(timezone.utc) - timedelta(days=days)
+
+
+class RateLimitModel(Base):
+    """
+    Token bucket shared by every process using the project database.
+
+    Tokens are refilled continuously at `rate` per second up to `capacity`.
+    Buckets are updated with a single UPDATE statement, so concurrent runs and
+    the web server's background jobs draw from the same budget.
+    """
+    __tablename__ = "rate_limits"
+
+    key = Column(String, primary_key=True, index=True)
+    tokens = Column(Float, nullable=False, default=0.0)
+    updated_at = Column(Float, nullable=False, default=0.0)  # Unix time
+    blocked_until = Column(Float, nullable=False, default=0.0)  # Unix time
+
+    @classmethod
+    @_retry_on_database_lock()
+    def acquire(
+        cls, key: str, capacity: Optional[float], rate: Optional[float], cost: float = 1.0
+    ) -> float:
+        """
+        Try to take `cost` tokens from a bucket.
+
+        Args:
+            key: Bucket key
+            capacity: Bucket size, or None to only honor blocks
+            rate: Refill rate in tokens per second
+            cost: Number of tokens to take
+
+        Returns:
+            0 if the tokens were taken, otherwise seconds to wait before retrying
+        """
+        now = time.time()
+        with db_context() as db:
+            if not db.get(cls, key):
+                db.add(cls(key=key, tokens=capacity or 0.0, updated_at=now, blocked_until=0.0))
+                try:
+                    db.commit()
+                except Exception:
+                    # Created concurrently by another process
+                    db.rollback()
+
+            if capacity is None:
+                bucket = db.get(cls, key)
+                return max(0.0, bucket.blocked_until - now)
+
+            cost = min(cost, capacity)
+            refilled = func.min(capacity, cls.tokens + (now - cls.updated_at) * rate)
+            taken = (
+                db.query(cls)
+                .filter(cls.key == key, cls.blocked_until <= now, refilled >= cost)
+                .update(
+                    {cls.tokens: refilled - cost, cls.updated_at: now},
+                    synchronize_session=False,
+                )
+            )
+            db.commit()
+            if taken:
+                return 0.0
+
+            bucket = db.get(cls, key)
+            available = min(capacity, bucket.tokens + (now - bucket.updated_at) * rate)
+            return max(bucket.blocked_until - now, (cost - available) / rate, 0.01)
+
+    @classmethod
+    @_retry_on_database_lock()
+    def adjust(cls, key: str, delta: float):
+        """
+        Add `delta` tokens to a bucket (negative to charge extra usage).
+        """
+        with db_context() as db:
+            db.query(cls).filter(cls.key == key).update(
+                {cls.tokens: cls.tokens + delta}, synchronize_session=False
+            )
+            db.commit()
+
+    @classmethod
+    @_retry_on_database_lock()
+    def block(cls, key: str, until: float):
+        """
+        Stop handing out tokens from a bucket until the given Unix time.
+        """
+        with db_context() as db:
+            if not db.get(cls, key):
+                db.add(cls(key=key, tokens=0.0, updated_at=time.time(), blocked_until=until))
+            else:
+                db.query(cls).filter(cls.key == key, cls.blocked_until < until).update(
+                    {cls.blocked_until: until}, synchronize_session=False
+                )
+            db.commit()
+
+
+class QueueItemModel(Base):
+    """
+    Durable queue of the tasks of queued jobs, pulled by `multinear worker`.
+
+    Each item is a task of the config with all its repeats. Workers lease
+    items for a limited time and extend the lease with heartbeats while they
+    run; items whose lease expired, e.g. after a worker crashed, are leased
+    again by another worker.
+    """
+    __tablename__ = "tasks_queue"
+
+    PENDING = "pending"
+    LEASED = "leased"
+    DONE = "done"
+
+    id = Column(String, primary_key=True, index=True)
+    job_id = Column(String, ForeignKey("jobs.id"), nullable=False, index=True)
+    group_id = Column(String, nullable=True)
+    task = Column(JSON, nullable=False)
+    task_offset = Column(Integer, nullable=False)  # Task number before its first repeat
+    status = Column(String, nullable=False, default=PENDING)
+    worker_id = Column(String, nullable=True)
+    lease_expires_at = Column(Float, nullable=False, default=0.0)  # Unix time
+    attempts = Column(Integer, nullable=False, default=0)
+    created_at = Column(DateTime, default=lambda: datetime.now(timezone.utc))
+
+    __table_args__ = (
+        Index("ix_tasks_queue_status_lease", "status", "lease_expires_at"),
+    )
+
+    @classmethod
+    @_retry_on_database_lock()
+    def enqueue(cls, job_id: str, items: List[Dict]) -> int:
+        """
+        Add the tasks of a job to the queue.
+
+        Args:
+            job_id: Job ID
+            items: Dicts with the group_id, task and task_offset of each task
+
+        Returns:
+            Number of queued items
+        """
+        with db_context() as db:
+            db.add_all([
+                cls(id=str(uuid.uuid4()), job_id=job_id, status=cls.PENDING, **item)
+                for item in items
+            ])
+            db.commit()
+        return len(items)
+
+    @classmethod
+    @_retry_on_database_lock()
+    def lease(cls, worker_id: str, limit: int, lease_seconds: float) -> List["QueueItemModel"]:
+        """
+        Lease up to `limit` pending items (or items with an expired lease),
+        oldest job first. Each item is taken with a conditional UPDATE, so
+        concurrent workers never lease the same item.
+        """
+        now = time.time()
+        available = or_(
+            cls.status == cls.PENDING,
+            and_(cls.status == cls.LEASED, cls.lease_expires_at < now),
+        )
+        with db_context() as db:
+            candidates = (
+                db.query(cls.id)
+                .filter(available)
+                .order_by(cls.created_at, cls.task_offset)
+                .limit(limit)
+                .all()
+            )
+            leased = []
+            for (item_id,) in candidates:
+                taken = (
+                    db.query(cls)
+                    .filter(cls.id == item_id, available)
+                    .update(
+                        {
+                            cls.status: cls.LEASED,
+                            cls.worker_id: worker_id,
+                            cls.lease_expires_at: now + lease_seconds,
+                            cls.attempts: cls.attempts + 1,
+                        },
+                        synchronize_session=False,
+                    )
+                )
+                if taken:
+                    leased.append(item_id)
+            db.commit()
+            if not leased:
+                return []
+            return (
+                db.query(cls)
+                .filter(cls.id.in_(leased))
+                .order_by(cls.created_at, cls.task_offset)
+                .all()
+            )
+
+    @classmethod
+    @_retry_on_database_lock()
+    def heartbeat(cls, worker_id: str, item_ids: List[str], lease_seconds: float) -> int:
+        """
+        Extend the leases of a worker's items.
+
+        Returns:
+            Number of leases extended; items leased by another worker after
+            their lease expired are not extended
+        """
+        with db_context() as db:
+            extended = (
+                db.query(cls)
+                .filter(
+                    cls.id.in_(item_ids),
+                    cls.worker_id == worker_id,
+                    cls.status == cls.LEASED,
+                )
+                .update(
+                    {cls.lease_expires_at: time.time() + lease_seconds},
+                    synchronize_session=False,
+                )
+            )
+            db.commit()
+            return extended
+
+    @classmethod
+    @_retry_on_database_lock()
+    def complete(cls, worker_id: str, item_ids: List[str]):
+        """
+        Mark a worker's items as done.
+        """
+        with db_context() as db:
+            db.query(cls).filter(
+                cls.id.in_(item_ids), cls.worker_id == worker_id
+            ).update({cls.status: cls.DONE}, synchronize_session=False)
+            db.commit()
+
+    @classmethod
+    def count_open(cls, job_id: str) -> int:
+        """
+        Count the items of a job that are not done.
+        """
+        with db_context() as db:
+            return (
+                db.query(cls)
+                .filter(cls.job_id == job_id, cls.status != cls.DONE)
+                .count()
+            )
+
+    @classmethod
+    def list(cls, job_id: str) -> List["QueueItemModel"]:
+        """
+        List the items of a job.
+        """
+        with db_context() as db:
+            return (
+                db.query(cls)
+                .filter(cls.job_id == job_id)
+                .order_by(cls.task_offset)
+                .all()
+            )
+
+
 # Database session management
 
 # Global variable to store SessionLocal
@@ -527,6 +1227,26 @@ def init_db():
 
     # Create tables defined by the models
     Base.metadata.create_all(bind=_engine)
+    _add_missing_columns(_engine)
+
+
+def _add_missing_columns(engine):
+    """
+    Add the columns and indexes introduced since an existing database was
+    created. create_all only creates missing tables; new columns are all nullable.
+    """
+    inspector = inspect(engine)
+    with engine.begin() as connection:
+        for table in Base.metadata.sorted_tables:
+            existing = {column["name"] for column in inspector.get_columns(table.name)}
+            for column in table.columns:
+                if column.name not in existing:
+                    column_type = column.type.compile(dialect=engine.dialect)
+                    connection.execute(text(
+                        f'ALTER TABLE {table.name} ADD COLUMN "{column.name}" {column_type}'
+                    ))
+            for index in table.indexes:
+                index.create(bind=connection, checkfirst=True)
 
 
 def _create_session():
@@ -0,0 +1,189 @@
+"""
+Tasks streamed from dataset files or generated by task_runner.py, instead of
+listed in config.yaml.
+
+A group can take its tasks from a JSONL, CSV or Parquet file:
+
+    groups:
+      - id: qa
+        source:
+          path: data/qa.jsonl      # Relative to the project folder
+          input_field: question    # Column with the input (default: input)
+          id_field: qid            # Column with the task ID (optional)
+          defaults:                # Fields added to every task, e.g. evaluation
+            min_score: 0.8
+
+Every other column of a row is kept as a field of its task, like in a task
+listed in config.yaml. The file is read lazily, a row at a time, every time
+the tasks are iterated, so a large dataset is never held in memory. Reading
+Parquet files requires pyarrow.
+
+Tasks can also be generated, e.g. as cross products of templates and
+locales, by an optional generator in task_runner.py. They form the
+`generated` group, and start running as soon as the first ones are yielded:
+
+    def generate_tasks(config):
+        for template in TEMPLATES:
+            for locale in LOCALES:
+                yield {"id": f"{template.id}-{locale}", "input": template.render(locale)}
+"""
+
+from abc import ABC, abstractmethod
+from pathlib import Path
+from typing import Dict, Any, Callable, Iterable, Iterator, List, Optional, Union
+import copy
+import csv
+import json
+
+
+FORMATS = ("jsonl", "csv", "parquet")
+
+# Rows read from a Parquet file at a time
+PARQUET_BATCH_SIZE = 1024
+
+# Group of the tasks yielded by generate_tasks
+GENERATED_GROUP = "generated"
+
+
+class LazyTasks(ABC):
+    """
+    Re-iterable tasks produced on demand, optionally filtered.
+    """
+
+    def __init__(self):
+        self.predicates: List[Callable[[Dict[str, Any]], bool]] = []
+
+    def filter(self, predicate: Callable[[Dict[str, Any]], bool]) -> "LazyTasks":
+        """
+        The tasks that match a predicate, still produced lazily.
+        """
+        filtered = copy.copy(self)
+        filtered.predicates = self.predicates + [predicate]
+        return filtered
+
+    def __iter__(self) -> Iterator[Dict[str, Any]]:
+        for task in self._tasks():
+            if all(predicate(task) for predicate in self.predicates):
+                yield task
+
+    @abstractmethod
+    def _tasks(self) -> Iterator[Dict[str, Any]]:
+        """
+        Produce the tasks, before filtering.
+        """
+
+
+class TaskSource(LazyTasks):
+    """
+    Re-iterable, lazily read tasks of a group's `source`.
+    """
+
+    def __init__(self, settings: Dict[str, Any], base_path: Optional[Path] = None):
+        super().__init__()
+        if "path" not in settings:
+            raise ValueError("A task source needs a path")
+        self.settings = settings
+        self.base_path = Path(base_path or Path.cwd())
+        self.path = self.base_path / settings["path"]
+        self.format = settings.get("format", self.path.suffix.lstrip(".").lower())
+        if self.format not in FORMATS:
+            raise ValueError(
+                f"Unknown task source format '{self.format}', expected one of "
+                f"{', '.join(FORMATS)}"
+            )
+        self.input_field = settings.get("input_field", "input")
+        self.id_field = settings.get("id_field")
+        self.defaults = settings.get("defaults", {})
+
+    def _tasks(self) -> Iterator[Dict[str, Any]]:
+        for row in self._rows():
+            yield self._to_task(row)
+
+    def count(self) -> int:
+        """
+        Count the tasks, reading the file once.
+        """
+        return sum(1 for _ in self)
+
+    def _to_task(self, row: Dict[str, Any]) -> Dict[str, Any]:
+        if self.input_field not in row:
+            raise ValueError(f"Column '{self.input_field}' not found in {self.path}")
+        task = {**self.defaults}
+        task.update(
+            (k, v) for k, v in row.items() if k not in (self.input_field, self.id_field)
+        )
+        task["input"] = row[self.input_field]
+        if self.id_field and row.get(self.id_field) not in (None, ""):
+            task["id"] = str(row[self.id_field])
+        return task
+
+    def _rows(self) -> Iterator[Dict[str, Any]]:
+        if not self.path.exists():
+            raise FileNotFoundError(f"Task source not found at {self.path}")
+        if self.format == "jsonl":
+            with open(self.path, "r") as f:
+                for line in f:
+                    if line.strip():
+                        yield json.loads(line)
+        elif self.format == "csv":
+            with open(self.path, "r", newline="") as f:
+                yield from csv.DictReader(f)
+        else:
+            try:
+                import pyarrow.parquet as pq
+            except ImportError:
+                raise ImportError(
+                    "Reading Parquet task sources requires pyarrow: pip install pyarrow"
+                ) from None
+            for batch in pq.ParquetFile(self.path).iter_batches(PARQUET_BATCH_SIZE):
+                yield from batch.to_pylist()
+
+
+class GeneratedTasks(LazyTasks):
+    """
+    Tasks yielded by the `generate_tasks(config)` generator of task_runner.py,
+    produced again every time they are iterated.
+    """
+
+    def __init__(
+        self,
+        generate: Callable[[Dict[str, Any]], Iterable[Dict[str, Any]]],
+        config: Dict[str, Any],
+    ):
+        super().__init__()
+        self.generate = generate
+        self.config = config
+
+    def _tasks(self) -> Iterator[Dict[str, Any]]:
+        yield from self.generate(self.config)
+
+
+Tasks = Union[List[Dict[str, Any]], LazyTasks]
+
+
+def group_tasks(group: Dict[str, Any], base_path: Optional[Path] = None) -> Optional[Tasks]:
+    """
+    The tasks of a config group: its `tasks` list, or a TaskSource for its
+    `source`; None if it has neither.
+    """
+    if "tasks" in group:
+        return group["tasks"]
+    if "source" in group:
+        return TaskSource(group["source"], base_path)
+    return None
+
+
+def filter_tasks(tasks: Tasks, predicate: Callable[[Dict[str, Any]], bool]) -> Tasks:
+    """
+    Filter tasks, lazily for a source or generated tasks.
+    """
+    if isinstance(tasks, LazyTasks):
+        return tasks.filter(predicate)
+    return [task for task in tasks if predicate(task)]
+
+
+def has_tasks(tasks: Iterable[Dict[str, Any]]) -> bool:
+    """
+    Whether there is at least one task, reading a source only up to the first.
+    """
+    return any(True for _ in tasks)
@@ -1,5 +1,9 @@
 from openai import OpenAI
-from typing import List
+from typing import Any, List
+import hashlib
+import json
+
+from .rate_limit import create_chat_completion
 
 
 BASE_REPHRASE_PROMPT = """Rephrase the following text in a different way
@@ -12,11 +16,32 @@ IMPORTANT: Your rephrasing must be different from all previous variations listed
 Previous variations:
 {previous_variations}"""
 
+BATCH_EXTENSION = """
+Provide {count} rephrasings, each one different from all the others.
+Respond with a JSON object of the form {{"variations": ["...", "..."]}}."""
+
 FINAL_INPUT_TEMPLATE = """
 
 Provide a unique rephrasing of this text:
 {input}"""
 
+# Stored variations are only reused while the prompts they came from are unchanged
+REPHRASE_PROMPT_VERSION = hashlib.sha256(
+    (BASE_REPHRASE_PROMPT + BATCH_EXTENSION + FINAL_INPUT_TEMPLATE).encode()
+).hexdigest()[:12]
+
+
+def get_input_hash(input: Any) -> str:
+    """
+    Canonical hash of an input: the same input gives the same hash regardless of
+    key order or surrounding whitespace.
+    """
+    if isinstance(input, str):
+        input = input.strip()
+    return hashlib.sha256(
+        json.dumps(input, sort_keys=True, ensure_ascii=False).encode()
+    ).hexdigest()
+
 
 def rephrase_input(input: str, previous_variations: List[str] = None) -> str:
     """
@@ -41,7 +66,8 @@ def rephrase_input(input: str, previous_variations: List[str] = None) -> str:
     prompt += FINAL_INPUT_TEMPLATE.format(input=input)
 
     client = OpenAI()
-    response = client.chat.completions.create(
+    response = create_chat_completion(
+        client,
         model="gpt-4o-mini",
         messages=[
             {"role": "system", "content": prompt},
@@ -51,3 +77,57 @@ def rephrase_input(input: str, previous_variations: List[str] = None) -> str:
     )
 
     return response.choices[0].message.content.strip()
+
+
+def rephrase_input_batch(
+    input: str, count: int, previous_variations: List[str] = None
+) -> List[str]:
+    """
+    Generate several distinct variations of the input in a single request,
+    instead of one request per variation with all previous ones in the prompt.
+
+    Args:
+        input: The original input to be rephrased
+        count: Number of variations to generate
+        previous_variations: Existing variations the new ones must differ from
+
+    Returns:
+        List of `count` rephrased versions of the input
+    """
+    if count <= 0:
+        return []
+
+    prompt = BASE_REPHRASE_PROMPT + BATCH_EXTENSION.format(count=count)
+    if previous_variations:
+        variations_text = "\n".join(
+            f"{i+1}. {var}" for i, var in enumerate(previous_variations)
+        )
+        prompt += VARIATIONS_EXTENSION.format(previous_variations=variations_text)
+    prompt += FINAL_INPUT_TEMPLATE.format(input=input)
+
+    client = OpenAI()
+    response = create_chat_completion(
+        client,
+        model="gpt-4o-mini",
+        messages=[
+            {"role": "system", "content": prompt},
+            {"role": "user", "content": input}
+        ],
+        temperature=0.7,
+        response_format={"type": "json_object"},
+    )
+
+    try:
+        variations = json.loads(response.choices[0].message.content)["variations"]
+        variations = [v.strip() for v in variations if isinstance(v, str) and v.strip()]
+    except (json.JSONDecodeError, KeyError, TypeError):
+        variations = []
+
+    # Top up one by one if the model returned fewer variations than requested
+    variations = variations[:count]
+    while len(variations) < count:
+        variations.append(
+            rephrase_input(input, (previous_variations or []) + variations)
+        )
+
+    return variations
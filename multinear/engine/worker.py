@@ -0,0 +1,374 @@
+"""
+Pull-based workers consuming a durable queue of tasks.
+
+With `meta.queue: true`, running a job (from the CLI or the web UI) only
+queues its tasks in the `tasks_queue` table and reports progress, while any
+number of `multinear worker` processes, on one machine or on several sharing
+the project folder, pull the tasks and run them:
+
+    meta:
+      queue: true
+
+A worker leases a batch of tasks (`meta.max_workers` by default), runs them
+on its own scheduler and concurrency limits, and extends the lease with
+heartbeats meanwhile. The tasks of a worker that crashed are leased again
+once their lease expires; their finished repeats are kept. The worker that
+completes the last task of a job finishes the job and computes its
+aggregations.
+"""
+
+from datetime import datetime, timedelta
+from itertools import groupby
+from pathlib import Path
+from typing import Dict, Any, Iterator, List, Optional
+import asyncio
+import inspect
+import os
+import socket
+import statistics
+import threading
+import time
+import uuid
+
+from rich.console import Console
+
+from .aggregation import aggregate_job
+from .concurrency import get_worker_limits
+from .events import EventType, ProgressEvent
+from .output_cache import OutputCache
+from .process_pool import ProcessTaskRunner, load_task_runner
+from .rate_limit import configure_rate_limits
+from .resume import task_result
+from .run_group import get_challenge_id, get_repeats
+from .runner_state import end_run
+from .scheduler import JobScheduler
+from .storage import JobModel, QueueItemModel, TaskModel, TaskStatus
+
+
+# Seconds a lease lasts without a heartbeat; heartbeats are sent every third of it
+DEFAULT_LEASE_SECONDS = 60.0
+# Seconds between polls of the queue by an idle worker, and of a queued job's progress
+DEFAULT_POLL_INTERVAL = 2.0
+# Seconds before the latest finished task from which a queued job's progress is read again
+FOLLOW_OVERLAP = 60.0
+
+
+def queue_enabled(config: Dict[str, Any]) -> bool:
+    """
+    Whether jobs are queued for workers, from `meta.queue`.
+    """
+    return bool(config.get("meta", {}).get("queue", False))
+
+
+def enqueue_job(job: JobModel, task_groups: List[Dict[str, Any]], config: Dict[str, Any]) -> int:
+    """
+    Queue the tasks of a job for the workers. Task numbers are assigned up
+    front, every task reserving its maximum number of repeats.
+
+    Args:
+        job: The job
+        task_groups: Groups of tasks as returned by select_tasks
+        config: Configuration dictionary
+
+    Returns:
+        Number of queued items, one per task of the config
+    """
+    items = []
+    offset = 0
+    for group_data in task_groups:
+        for task in group_data["tasks"]:
+            items.append({
+                "group_id": group_data["group_id"],
+                "task": task,
+                "task_offset": offset,
+            })
+            offset += get_repeats(task, config)["max"]
+    # Workers may pick the tasks up right away
+    job.update(total_tasks=offset)
+    return QueueItemModel.enqueue(job.id, items)
+
+
+def follow_queued_job(
+    job: JobModel, total_tasks: int, poll_interval: float = DEFAULT_POLL_INTERVAL
+) -> Iterator[ProgressEvent]:
+    """
+    Report the progress of a queued job until a worker finishes it.
+
+    Yields:
+        The outcome and FINISHED events of each task finished by the workers
+    """
+    # Tasks reported, by when they finished, within the window read again
+    seen: Dict[str, datetime] = {}
+    since = None
+    while True:
+        # Read before the tasks, so that no task finished before the job is missed
+        done = JobModel.find(job.id).finished_at is not None
+        for task in TaskModel.list_finished(job.id, since):
+            if task.id in seen:
+                continue
+            seen[task.id] = task.finished_at
+            event = dict(
+                total=total_tasks,
+                task_number=task.task_number,
+                task_id=task.id,
+                challenge_id=task.challenge_id,
+            )
+            if task.eval_passed is not None:
+                yield ProgressEvent(
+                    EventType.EVALUATED, passed=task.eval_passed, score=task.eval_score,
+                    **event,
+                )
+            else:
+                yield ProgressEvent(
+                    EventType.TIMED_OUT if task.status == TaskStatus.TIMEOUT
+                    else EventType.FAILED,
+                    error=task.error,
+                    **event,
+                )
+            yield ProgressEvent(EventType.FINISHED, result=task_result(task), **event)
+        if done:
+            return
+        if seen:
+            # Only tasks finished since the latest one seen, give or take
+            # tasks committed late or by workers with a skewed clock
+            since = max(seen.values()) - timedelta(seconds=FOLLOW_OVERLAP)
+            seen = {task_id: at for task_id, at in seen.items() if at >= since}
+        time.sleep(poll_interval)
+
+
+def queued_job_finished(job: JobModel, total_tasks: int) -> ProgressEvent:
+    """
+    The final event of a queued job, once a worker finished it.
+    """
+    tasks = TaskModel.list_finished(job.id)
+    results = [task_result(task) for task in sorted(tasks, key=lambda t: t.task_number)]
+    if JobModel.find(job.id).status != TaskStatus.CANCELLED:
+        return ProgressEvent(EventType.JOB_COMPLETED, total=total_tasks, results=results)
+    summary = {
+        "reason": "cancelled",
+        "finished": len(tasks),
+        "skipped": total_tasks - len(tasks),
+    }
+    return ProgressEvent(
+        EventType.JOB_CANCELLED, total=total_tasks, results=results, summary=summary
+    )
+
+
+def run_worker(
+    project_config: Dict[str, Any],
+    config: Dict[str, Any],
+    worker_id: Optional[str] = None,
+    batch_size: Optional[int] = None,
+    lease_seconds: float = DEFAULT_LEASE_SECONDS,
+    poll_interval: float = DEFAULT_POLL_INTERVAL,
+    exit_when_idle: bool = False,
+    stop: Optional[threading.Event] = None,
+    console: Optional[Console] = None,
+) -> int:
+    """
+    Pull tasks from the queue and run them, until stopped.
+
+    Args:
+        project_config: Project configuration dictionary containing folder path
+        config: Configuration dictionary
+        worker_id: ID of the worker, unique by default
+        batch_size: Tasks leased at a time; `meta.max_workers` by default
+        lease_seconds: Seconds a lease lasts without a heartbeat
+        poll_interval: Seconds between polls of an empty queue
+        exit_when_idle: Return once the queue is empty instead of polling
+        stop: Event to stop the worker after its current batch
+        console: Console to report on
+
+    Returns:
+        Number of tasks the worker ran
+    """
+    console = console or Console()
+    stop = stop or threading.Event()
+    worker_id = worker_id or f"{socket.gethostname()}-{os.getpid()}-{uuid.uuid4().hex[:8]}"
+    project_folder = Path(project_config["folder"])
+    task_runner_path = project_folder / ".multinear" / "task_runner.py"
+    if not task_runner_path.exists():
+        raise FileNotFoundError(f"Task runner file not found at {task_runner_path}")
+
+    configure_rate_limits(config)
+    task_runner_module = load_task_runner(task_runner_path)
+    if not hasattr(task_runner_module, "run_task") and not hasattr(
+        task_runner_module, "run_tasks"
+    ):
+        raise AttributeError(f"run_task function not found in {task_runner_path}")
+
+    max_workers = get_worker_limits(config)["execution"]["max"]
+    batch_size = batch_size or max_workers
+    process_runner = None
+    if config.get("meta", {}).get("executor", "thread") == "process":
+        process_runner = ProcessTaskRunner(task_runner_path, task_runner_module, max_workers)
+    elif hasattr(task_runner_module, "start_run"):
+        # Once per worker (in process mode, each worker process calls it instead)
+        if inspect.iscoroutinefunction(task_runner_module.start_run):
+            asyncio.run(task_runner_module.start_run())
+        else:
+            task_runner_module.start_run()
+    output_cache = OutputCache.from_config(config, task_runner_path, project_folder)
+
+    console.print(f"[green bold]Worker {worker_id} waiting for tasks[/green bold]")
+    ran = 0
+    try:
+        while not stop.is_set():
+            items = QueueItemModel.lease(worker_id, batch_size, lease_seconds)
+            if not items:
+                if exit_when_idle:
+                    break
+                stop.wait(poll_interval)
+                continue
+            for job_id, job_items in groupby(items, key=lambda item: item.job_id):
+                ran += _run_batch(
+                    JobModel.find(job_id),
+                    list(job_items),
+                    process_runner or task_runner_module,
+                    config,
+                    worker_id,
+                    lease_seconds,
+                    output_cache,
+                    console,
+                )
+    finally:
+        if process_runner is not None:
+            process_runner.close()
+        else:
+            end_run(task_runner_module)
+    return ran
+
+
+def _run_batch(
+    job: JobModel,
+    items: List[QueueItemModel],
+    task_runner_module,
+    config: Dict[str, Any],
+    worker_id: str,
+    lease_seconds: float,
+    output_cache: Optional[OutputCache],
+    console: Console,
+) -> int:
+    """
+    Run leased tasks of a job, then finish the job if they were its last ones.
+
+    Returns:
+        Number of tasks run
+    """
+    item_ids = [item.id for item in items]
+    done = threading.Event()
+
+    def heartbeat():
+        while not done.wait(lease_seconds / 3):
+            try:
+                QueueItemModel.heartbeat(worker_id, item_ids, lease_seconds)
+            except Exception as e:
+                # E.g. a locked database; the next heartbeat may get through
+                # before the lease expires
+                console.print(f"[yellow]Heartbeat of worker {worker_id} failed:[/yellow] {e}")
+
+    heartbeat_thread = threading.Thread(target=heartbeat, daemon=True)
+    heartbeat_thread.start()
+    ran = 0
+    try:
+        if not JobModel.is_cancel_requested(job.id):
+            # Tasks leased again after a worker crashed keep their finished repeats
+            finished = {}
+            retried = [item for item in items if item.attempts > 1]
+            if retried:
+                challenge_ids = [
+                    get_challenge_id(item.task, repeat)
+                    for item in retried
+                    for repeat in range(get_repeats(item.task, config)["max"])
+                ]
+                TaskModel.delete_unfinished(job.id, challenge_ids)
+                finished = {
+                    task.challenge_id: task
+                    for task in TaskModel.list_finished(job.id)
+                    if task.challenge_id in challenge_ids
+                }
+
+            scheduler = JobScheduler(job, task_runner_module, config, output_cache=output_cache)
+            # Early stopping needs the results of the whole job, not of a batch
+            scheduler.early_stop = None
+            groups = [
+                {"group_id": item.group_id, "tasks": [item.task], "task_offset": item.task_offset}
+                for item in items
+            ]
+            for event in scheduler.run(groups, job.total_tasks, finished):
+                if event.type == EventType.FINISHED:
+                    ran += 1
+    finally:
+        done.set()
+        heartbeat_thread.join()
+
+    QueueItemModel.complete(worker_id, item_ids)
+    if QueueItemModel.count_open(job.id) == 0:
+        finish_queued_job(job, config, console)
+    return ran
+
+
+def finish_queued_job(job: JobModel, config: Dict[str, Any], console: Console) -> bool:
+    """
+    Finish a queued job whose tasks are all done, computing its aggregations.
+    Several workers may try at once; only one finishes the job.
+
+    Returns:
+        Whether this call finished the job
+    """
+    status = (
+        TaskStatus.CANCELLED
+        if JobModel.is_cancel_requested(job.id)
+        else TaskStatus.COMPLETED
+    )
+    if not job.finish_once(status):
+        return False
+
+    groups = queued_group_summaries(job.id, config)
+    finished = sum(group["finished"] for group in groups.values())
+    job.update(
+        total_tasks=job.total_tasks,
+        current_task=finished,
+        details={
+            "status": status,
+            "current": finished,
+            "status_map": TaskModel.get_status_map(job.id),
+            "groups": groups,
+        },
+    )
+    aggregate_job(job.id, config, groups, job.total_tasks, console)
+    return True
+
+
+def queued_group_summaries(job_id: str, config: Dict[str, Any]) -> Dict[str, Dict[str, Any]]:
+    """
+    Summaries of the groups of a queued job, from its finished tasks, in the
+    format of JobScheduler.get_group_summary.
+    """
+    tasks = {task.task_number: task for task in TaskModel.list_finished(job_id)}
+    groups: Dict[str, Dict[str, Any]] = {}
+    scores: Dict[str, List[float]] = {}
+    for item in QueueItemModel.list(job_id):
+        group = groups.setdefault(item.group_id, {
+            "total": 0, "finished": 0, "passed": 0, "failed": 0, "errors": 0,
+            "score": None,
+        })
+        repeats = get_repeats(item.task, config)["max"]
+        for number in range(item.task_offset + 1, item.task_offset + repeats + 1):
+            task = tasks.get(number)
+            if task is None:  # Not run: cancelled, or a converged adaptive repeat
+                continue
+            group["total"] += 1
+            group["finished"] += 1
+            if task.eval_passed is None:
+                group["errors"] += 1
+                continue
+            scores.setdefault(item.group_id, []).append(task.eval_score)
+            if task.eval_passed:
+                group["passed"] += 1
+            else:
+                group["failed"] += 1
+
+    for group_id, group_scores in scores.items():
+        groups[group_id]["score"] = round(statistics.mean(group_scores), 4)
+    return groups
@@ -1,7 +1,81 @@
 import sys
 import logging
+import threading
 import time
 import re
+from contextvars import ContextVar
+from typing import Optional
+
+
+# Regex pattern for ANSI escape codes to clean up logs
+_ANSI_ESCAPE = re.compile(r'\x1B(?:[@-Z\\-_]|\[[0-?]*[ -/]*[@-~])')
+
+# Capture of the task running in the current thread or asyncio task
+_current_capture: ContextVar[Optional['OutputCapture']] = ContextVar(
+    'multinear_output_capture', default=None
+)
+
+_install_lock = threading.Lock()
+_log_handler = None
+
+
+class _StdoutDispatcher:
+    """
+    Replacement of sys.stdout, installed once, that records writes in the
+    capture of the current task and passes them on to the original stdout.
+    """
+    def __init__(self, stream):
+        self._stream = stream
+
+    def write(self, text):
+        capture = _current_capture.get()
+        if capture is not None:
+            capture.write(text)
+        return self._stream.write(text)
+
+    def flush(self):
+        self._stream.flush()
+
+    def isatty(self):
+        # Task runners print as to a terminal while captured
+        if _current_capture.get() is not None:
+            return True
+        return self._stream.isatty()
+
+    def __getattr__(self, name):
+        return getattr(self._stream, name)
+
+
+class _LogDispatcher(logging.Handler):
+    """
+    Root logging handler, installed once, that records log messages in the
+    capture of the current task.
+    """
+    def emit(self, record):
+        capture = _current_capture.get()
+        if capture is not None:
+            capture.logs.append({
+                'level': record.levelname,
+                'message': self.format(record),
+                'timestamp': record.created,
+                'module': record.module
+            })
+
+
+def _install():
+    """
+    Install the stdout and logging dispatchers, unless already in place.
+    """
+    global _log_handler
+    if isinstance(sys.stdout, _StdoutDispatcher) and _log_handler is not None:
+        return
+    with _install_lock:
+        # sys.stdout may have been replaced since, e.g. by a test runner
+        if not isinstance(sys.stdout, _StdoutDispatcher):
+            sys.stdout = _StdoutDispatcher(sys.stdout)
+        if _log_handler is None:
+            _log_handler = _LogDispatcher(logging.DEBUG)
+            logging.getLogger().addHandler(_log_handler)
 
 
 class OutputCapture:
@@ -10,75 +84,39 @@ class OutputCapture:
 
     This allows capturing all outputs generated by the task execution
     and evaluation processes, including print statements and logs.
+
+    Captures are bound to the current thread or asyncio task through a
+    context variable, so concurrent tasks each get only their own output.
+    Output of threads started by a task is not captured.
     """
     def __init__(self):
         self.logs = []
-        self._original_stdout = None
-        self._log_handler = None
-        # Regex pattern for ANSI escape codes to clean up logs
-        self._ansi_escape = re.compile(r'\x1B(?:[@-Z\\-_]|\[[0-?]*[ -/]*[@-~])')
-    
-    def _create_log_handler(self):
-        """
-        Create a custom logging handler to capture logs.
-        """
-        handler = logging.Handler()
-        handler.setLevel(logging.DEBUG)
-        
-        def emit(record):
-            self.logs.append({
-                'level': record.levelname,
-                'message': handler.format(record),
-                'timestamp': record.created,
-                'module': record.module
-            })
-        handler.emit = emit
-        return handler
-    
+        self._token = None
+
     def write(self, text):
         """
         Capture text written to stdout.
         """
         if text.strip():
             # Strip ANSI escape codes before storing
-            clean_text = self._ansi_escape.sub('', text.strip())
+            clean_text = _ANSI_ESCAPE.sub('', text.strip())
             self.logs.append({
                 'level': 'PRINT',
                 'message': clean_text,
                 'timestamp': time.time(),
                 'module': 'stdout'
             })
-        self._original_stdout.write(text)
-
-    def flush(self):
-        """
-        Flush the original stdout buffer.
-        """
-        self._original_stdout.flush()
 
     def __enter__(self):
         """
-        Enter the context manager, setting up the capture.
+        Enter the context manager, making this the capture of the current context.
         """
-        # Setup stdout capture
-        self._original_stdout = sys.stdout
-        sys.stdout = self
-        
-        # Setup logging capture
-        self._log_handler = self._create_log_handler()
-        logging.getLogger().addHandler(self._log_handler)
+        _install()
+        self._token = _current_capture.set(self)
         return self
 
     def __exit__(self, exc_type, exc_val, exc_tb):
         """
-        Exit the context manager, restoring original stdout and removing log handler.
+        Exit the context manager, restoring the capture of the enclosing context.
         """
-        # Restore stdout
-        sys.stdout = self._original_stdout
-        
-        # Remove the log handler
-        if self._log_handler:
-            logging.getLogger().removeHandler(self._log_handler)
-
-    def isatty(self):
-        return True
+        _current_capture.reset(self._token)
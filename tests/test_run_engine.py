@@ -0,0 +1,1438 @@
+"""
+Tests for the task execution engine.
+
+These tests run real task runner modules against a temporary SQLite database
+and only use evaluators that do not call an LLM.
+"""
+
+import asyncio
+import json
+import logging
+import os
+import threading
+import time
+import types
+
+import pytest
+import sqlalchemy
+import yaml
+
+import multinear.engine.run_group as run_group
+import multinear.engine.storage as storage
+from multinear.engine.storage import (
+    JobModel, QueueItemModel, TaskModel, TaskStatus, VariationModel,
+)
+from multinear.engine.evaluate import evaluate, evaluate_async
+from multinear.engine.scheduler import JobScheduler
+from multinear.engine.events import EventBus, EventType, JobStatusSink
+from multinear.engine.process_pool import ProcessTaskRunner, load_task_runner
+from multinear.engine.rate_limit import MAX_RATE_LIMIT_RETRIES, RateLimiter, parse_reset
+from multinear.engine.concurrency import StageLimit
+from multinear.engine.resume import job_stopped, prepare_resume, prepare_rerun_failed
+from multinear.engine.output_cache import OutputCache
+from multinear.engine.run import reevaluate_experiment, run_experiment
+from multinear.engine.cancellation import get_timeouts
+from multinear.engine.early_stop import EarlyStop
+from multinear.engine.export import export_job
+from multinear.engine.shards import merge_shards, parse_shard, select_shard
+from multinear.engine.run_select import select_tasks
+from multinear.engine.task_source import LazyTasks, TaskSource
+from multinear.engine.worker import enqueue_job, run_worker
+from multinear.engine.ordering import longest_first
+from multinear.utils.capture import OutputCapture
+
+
+@pytest.fixture
+def project_db(tmp_path, monkeypatch):
+    """Point the storage layer at a fresh database in a temporary project."""
+    monkeypatch.chdir(tmp_path)
+    (tmp_path / ".multinear").mkdir()
+    monkeypatch.setattr(storage, "_SessionLocal", None)
+    monkeypatch.setattr(storage, "_engine", None)
+    storage.init_db()
+    storage.ProjectModel.save(
+        id="test-project", name="Test", description="", folder=str(tmp_path)
+    )
+    return tmp_path
+
+
+def make_module(**functions):
+    """Build a task runner module from the given functions."""
+    module = types.ModuleType("task_runner")
+    for name, function in functions.items():
+        setattr(module, name, function)
+    return module
+
+
+def drain(events):
+    """Consume a run's progress events, returning them and the results."""
+    events = list(events)
+    assert events[-1].type == EventType.RESULTS
+    return events[:-1], events[-1].results
+
+
+def test_evaluate_async_matches_sync():
+    """The async evaluation path returns the same results as the sync one."""
+    spec = {
+        "metrics": [
+            {"type": "has_a", "list": {"includes": ["a"]}},
+            {"type": "has_z", "list": {"includes": ["z"]}},
+        ]
+    }
+    output = ["a", "b"]
+
+    sync_result = evaluate(spec, None, output, None)
+    async_result = asyncio.run(evaluate_async(spec, None, output, None))
+
+    assert async_result == sync_result
+    assert async_result["score"] == 0.5
+    assert async_result["passed"] is False
+    assert [m["metric_type"] for m in async_result["details"]["metrics"]] == [
+        "has_a", "has_z"
+    ]
+
+
+def test_async_custom_evaluator():
+    """An async evaluate_custom is awaited on the async path and run on the sync one."""
+    async def evaluate_custom(input, output, spec):
+        return {"score": 1.0, "metadata": {"evaluations": [{"criterion": spec}]}}
+
+    module = make_module(evaluate_custom=evaluate_custom)
+    spec = {"list": {"includes": ["a"]}, "custom": "always"}
+
+    sync_result = evaluate(spec, None, ["a"], module)
+    async_result = asyncio.run(evaluate_async(spec, None, ["a"], module))
+
+    assert sync_result["details"]["evaluations"] == [{"criterion": "always"}]
+    assert async_result["details"]["evaluations"] == [{"criterion": "always"}]
+
+
+def test_scheduler_async_bounds_concurrency(project_db):
+    """Async tasks run concurrently, bounded by meta.max_workers."""
+    in_flight = 0
+    peak = 0
+
+    async def run_task(input):
+        nonlocal in_flight, peak
+        in_flight += 1
+        peak = max(peak, in_flight)
+        await asyncio.sleep(0.02)
+        in_flight -= 1
+        return {"output": input, "details": {"model": "test"}}
+
+    module = make_module(run_task=run_task)
+    config = {"meta": {"max_workers": 3}}
+    tasks = [
+        {"id": f"t{i}", "input": ["a"], "list": {"includes": ["a"]}}
+        for i in range(8)
+    ]
+    job = JobModel.find(JobModel.start("test-project"))
+
+    groups = [{"group_id": "g", "tasks": tasks}]
+    events, results = drain(JobScheduler(job, module, config).run(groups, 8))
+
+    assert len(results) == 8
+    assert peak == 3
+    assert [e.type for e in events].count(EventType.FINISHED) == 8
+    statuses = TaskModel.get_status_map(job.id).values()
+    assert list(statuses) == [TaskStatus.COMPLETED] * 8
+
+
+def test_process_task_runner(tmp_path):
+    """run_task executes in worker processes, each initialized with start_run."""
+    runner_path = tmp_path / "task_runner.py"
+    runner_path.write_text(
+        "import os\n"
+        "STARTED = False\n"
+        "def start_run():\n"
+        "    global STARTED\n"
+        "    STARTED = True\n"
+        "def run_task(input):\n"
+        "    print('working on', input)\n"
+        "    return {'output': input * 2, 'details': {'pid': os.getpid(), 'started': STARTED}}\n"
+        "def evaluate_custom(input, output, spec):\n"
+        "    return {'score': 1.0, 'metadata': {'evaluations': []}}\n"
+    )
+    module = load_task_runner(runner_path)
+    runner = ProcessTaskRunner(runner_path, module, max_workers=2)
+    try:
+        task_result, logs = runner.run_task_captured(21)
+    finally:
+        runner.close()
+
+    assert task_result["output"] == 42
+    assert task_result["details"]["started"] is True
+    assert task_result["details"]["pid"] != os.getpid()
+    assert any("working on" in log["message"] for log in logs)
+    # Other attributes come from the module loaded in the parent
+    assert runner.evaluate_custom is module.evaluate_custom
+
+
+def test_scheduler_publishes_events_to_sinks(project_db):
+    """Workers publish typed events; sinks see them and results are delivered."""
+    def run_task(input):
+        if input == "boom":
+            raise RuntimeError("boom")
+        return {"output": [input], "details": {}}
+
+    module = make_module(run_task=run_task)
+    config = {"meta": {"max_workers": 2}}
+    tasks = [
+        {"id": "ok", "input": "a", "list": {"includes": ["a"]}},
+        {"id": "bad", "input": "boom", "list": {"includes": ["a"]}},
+    ]
+    job = JobModel.find(JobModel.start("test-project"))
+
+    bus = EventBus()
+    seen = []
+    status_sink = JobStatusSink(job, min_interval=0)
+    bus.subscribe(seen.append)
+    bus.subscribe(status_sink)
+
+    groups = [{"group_id": "g", "tasks": tasks}]
+    events, results = drain(JobScheduler(job, module, config, bus).run(groups, 2))
+
+    # Every event reached the sinks before being relayed
+    assert [e.type for e in seen] == [e.type for e in events] + [EventType.RESULTS]
+    assert events[-1].type == EventType.GROUP_FINISHED
+    ok_events = [e.type for e in events if e.challenge_id == "ok"]
+    assert ok_events == [
+        EventType.STARTED, EventType.EXECUTED, EventType.EVALUATED, EventType.FINISHED
+    ]
+    bad_events = [e.type for e in events if e.challenge_id == "bad"]
+    assert bad_events == [EventType.STARTED, EventType.FAILED, EventType.FINISHED]
+
+    assert len(results) == 2
+    assert {"error": "boom"} in results
+    # The sink's status map matches the database without querying it per event
+    assert status_sink.status_map == TaskModel.get_status_map(job.id)
+    assert JobModel.find(job.id).details["error"] == "boom"
+
+
+def test_scheduler_shares_pool_across_groups(project_db):
+    """Tasks of the next group start while the previous group is still running."""
+    release = threading.Event()
+
+    def run_task(input):
+        if input == "slow":
+            # Only finishes once a task of the second group has run
+            assert release.wait(timeout=5)
+        else:
+            release.set()
+        return {"output": [input], "details": {}}
+
+    module = make_module(run_task=run_task)
+    config = {"meta": {"max_workers": 2}}
+    groups = [
+        {"group_id": "first", "tasks": [
+            {"id": "slow", "input": "slow", "list": {"includes": ["slow"]}},
+        ]},
+        {"group_id": "second", "tasks": [
+            {"id": "fast", "input": "fast", "list": {"includes": ["nope"]}},
+        ]},
+    ]
+    job = JobModel.find(JobModel.start("test-project"))
+    scheduler = JobScheduler(job, module, config)
+
+    events, results = drain(scheduler.run(groups, 2))
+
+    # The slow task could only complete because the second group ran alongside it
+    assert len(results) == 2
+    assert all("error" not in r for r in results)
+    finished = {
+        e.group_id: e.summary for e in events if e.type == EventType.GROUP_FINISHED
+    }
+    assert finished["second"]["passed"] == 0
+    assert finished["first"] == {
+        "total": 1, "finished": 1, "passed": 1, "failed": 0, "errors": 0, "score": 1.0
+    }
+    # Results are ordered by task number, regardless of completion order
+    assert [r[0]["output"] for r in results] == [["slow"], ["fast"]]
+
+
+def test_scheduler_stage_limits(project_db):
+    """Execution and evaluation have their own limits, and judging throttles execution."""
+    counts = {"running": 0, "judging": 0, "started": 0, "judged": 0}
+    peaks = {"running": 0, "judging": 0, "backlog": 0}
+
+    async def run_task(input):
+        counts["running"] += 1
+        counts["started"] += 1
+        peaks["running"] = max(peaks["running"], counts["running"])
+        peaks["backlog"] = max(peaks["backlog"], counts["started"] - counts["judged"])
+        await asyncio.sleep(0.005)
+        counts["running"] -= 1
+        return {"output": input, "details": {}}
+
+    async def evaluate_custom(input, output, spec):
+        counts["judging"] += 1
+        peaks["judging"] = max(peaks["judging"], counts["judging"])
+        await asyncio.sleep(0.02)
+        counts["judging"] -= 1
+        counts["judged"] += 1
+        return {"score": 1.0, "metadata": {"evaluations": []}}
+
+    module = make_module(run_task=run_task, evaluate_custom=evaluate_custom)
+    config = {"meta": {"max_workers": 3, "max_eval_workers": 1}}
+    tasks = [
+        {"id": f"t{i}", "input": ["a"], "list": {"includes": ["a"]}, "custom": "judge"}
+        for i in range(12)
+    ]
+    job = JobModel.find(JobModel.start("test-project"))
+
+    groups = [{"group_id": "g", "tasks": tasks}]
+    events, results = drain(JobScheduler(job, module, config).run(groups, 12))
+
+    assert len(results) == 12
+    assert all("error" not in r for r in results)
+    assert peaks["running"] == 3
+    assert peaks["judging"] == 1
+    # At most max_workers executing, plus twice max_eval_workers queued or judging
+    assert peaks["backlog"] <= 3 + 2
+
+
+def test_scheduler_prefetches_variations_in_one_request(project_db, monkeypatch):
+    """All rephrased variations of a challenge come from a single request."""
+    calls = []
+
+    def rephrase_input_batch(input, count, previous_variations=None):
+        calls.append((input, count))
+        return [f"{input} #{i + 1}" for i in range(count)]
+
+    monkeypatch.setattr(run_group, "rephrase_input_batch", rephrase_input_batch)
+
+    inputs = []
+
+    def run_task(input):
+        inputs.append(input)
+        return {"output": ["a"], "details": {}}
+
+    module = make_module(run_task=run_task)
+    config = {"meta": {"max_workers": 2, "repeat": 3, "rephrase": True}}
+    tasks = [
+        {"id": "plain", "input": "hi", "list": {"includes": ["a"]}},
+        {"id": "dict", "input": {"question": "why", "lang": "en"}, "list": {"includes": ["a"]}},
+    ]
+    job = JobModel.find(JobModel.start("test-project"))
+
+    groups = [{"group_id": "g", "tasks": tasks}]
+    events, results = drain(JobScheduler(job, module, config).run(groups, 6))
+
+    assert len(results) == 6
+    assert sorted(calls) == [("hi", 2), ("why", 2)]
+    assert sorted(i for i in inputs if isinstance(i, str)) == ["hi", "hi #1", "hi #2"]
+    assert {"question": "why #2", "lang": "en"} in inputs
+
+
+def test_variation_library_reuses_stored_variations(project_db, monkeypatch):
+    """Stored variations are reused, topped up when short, and pinned sets kept."""
+    calls = []
+
+    def rephrase_input_batch(input, count, previous_variations=None):
+        calls.append((count, list(previous_variations or [])))
+        offset = len(previous_variations or [])
+        return [f"{input} #{offset + i + 1}" for i in range(count)]
+
+    monkeypatch.setattr(run_group, "rephrase_input_batch", rephrase_input_batch)
+
+    assert run_group.get_variations("hi", 2) == ["hi #1", "hi #2"]
+    # Same input (modulo whitespace): served from the library
+    assert run_group.get_variations(" hi ", 2) == ["hi #1", "hi #2"]
+    assert len(calls) == 1
+
+    # More repeats: only the missing variations are generated
+    assert run_group.get_variations("hi", 3) == ["hi #1", "hi #2", "hi #3"]
+    assert calls[-1] == (1, ["hi #1", "hi #2"])
+
+    # A pinned set is never extended nor cleared
+    input_hash = VariationModel.list_sets()[0]["input_hash"]
+    assert VariationModel.set_pinned(input_hash) == 3
+    assert run_group.get_variations("hi", 4) == ["hi #1", "hi #2", "hi #3", "hi #1"]
+    assert len(calls) == 2
+    assert VariationModel.clear() == 0
+
+    # Regenerating an unpinned set starts from scratch
+    VariationModel.set_pinned(input_hash, False)
+    assert VariationModel.clear(input_hash[:8]) == 3
+    assert run_group.get_variations("hi", 1) == ["hi #1"]
+    assert calls[-1] == (1, [])
+
+
+def test_rate_limiter_shares_budget(project_db):
+    """Limiters of different processes draw from the same buckets."""
+    limits = {"model": {"requests_per_minute": 2, "tokens_per_minute": 1000}}
+    first, second = RateLimiter(limits), RateLimiter(limits)
+
+    assert first._try_acquire("model", 400) == 0
+    assert second._try_acquire("model", 400) == 0
+    # Out of requests: the wait is about one refill interval
+    assert 25 < first._try_acquire("model", 10) <= 30
+    # Not configured, not throttled
+    assert first._try_acquire("other", 10**6) == 0
+
+
+def test_rate_limiter_adapts_to_headers(project_db):
+    """Exhausted quotas and Retry-After pause the bucket, 429s are retried."""
+    assert parse_reset("6m0s") == 360
+    assert parse_reset("250ms") == 0.25
+
+    limiter = RateLimiter({"model": {"requests_per_minute": 100}})
+    limiter.observe("model", {"x-ratelimit-remaining-requests": "0", "x-ratelimit-reset-requests": "20s"})
+    assert 15 < limiter._try_acquire("model", 0) <= 20
+
+    class RateLimitError(Exception):
+        response = types.SimpleNamespace(headers={"retry-after-ms": "10"})
+
+    calls = []
+
+    def flaky():
+        calls.append(1)
+        if len(calls) < 3:
+            raise RateLimitError()
+        return "ok"
+
+    assert limiter.call("other", 0, flaky) == "ok"
+    assert len(calls) == 3
+    with pytest.raises(ValueError):
+        limiter.call("other", 0, lambda: (_ for _ in ()).throw(ValueError()))
+
+
+def test_stage_limit_aimd():
+    """An adaptive limit grows while healthy and halves on overload."""
+    class RateLimitError(Exception):
+        pass
+
+    async def scenario():
+        limit = StageLimit("execution", 2, 8, adaptive=True)
+
+        async def call(error=None):
+            async with limit:
+                async def work():
+                    await asyncio.sleep(0.01)
+                    if error:
+                        raise error
+                try:
+                    await limit.measure(work())
+                except Exception:
+                    pass
+
+        await asyncio.gather(*(call() for _ in range(40)))
+        grown = limit.limit
+        await asyncio.gather(*(call(RateLimitError()) for _ in range(grown)))
+        return grown, limit.limit, limit.history
+
+    grown, backed_off, history = asyncio.run(scenario())
+    assert grown > 2
+    # Errors of the calls in flight only back off once
+    assert backed_off == grown // 2
+    assert history[0] == {"time": history[0]["time"], "limit": 2, "reason": "initial"}
+    assert history[-1]["reason"] == "RateLimitError"
+
+
+def test_scheduler_records_auto_concurrency(project_db):
+    """With max_workers: auto, the chosen concurrency is saved in the job details."""
+    async def run_task(input):
+        await asyncio.sleep(0.01)
+        return {"output": input, "details": {}}
+
+    module = make_module(run_task=run_task)
+    config = {"meta": {"max_workers": "auto", "auto_workers": {"initial": 1, "max": 4}}}
+    tasks = [
+        {"id": f"t{i}", "input": ["a"], "list": {"includes": ["a"]}}
+        for i in range(20)
+    ]
+    job = JobModel.find(JobModel.start("test-project"))
+
+    groups = [{"group_id": "g", "tasks": tasks}]
+    events, results = drain(JobScheduler(job, module, config).run(groups, 20))
+
+    assert len(results) == 20
+    concurrency = JobModel.find(job.id).details["concurrency"]
+    limits = [entry["limit"] for entry in concurrency["execution"]]
+    assert limits[0] == 1
+    assert max(limits) > 1
+    assert concurrency["evaluation"][0]["limit"] == 1
+
+
+def test_retry_transient_failures(project_db):
+    """Transient errors are retried per stage and the attempts recorded."""
+    calls = {"run": 0, "custom": 0, "limited": 0}
+
+    class RateLimitError(Exception):
+        response = types.SimpleNamespace(headers={"retry-after-ms": "10"})
+
+    def run_task(input):
+        if input == "limited":
+            calls["limited"] += 1
+            raise RateLimitError()
+        calls["run"] += 1
+        if input == "flaky" and calls["run"] < 3:
+            raise ConnectionError("connection reset")
+        if input == "broken":
+            raise ValueError("bug")
+        return {"output": ["a"], "details": {}}
+
+    def evaluate_custom(input, output, spec):
+        calls["custom"] += 1
+        if calls["custom"] == 1:
+            raise TimeoutError("judge timed out")
+        return {"score": 1, "metadata": {"evaluations": []}}
+
+    module = make_module(run_task=run_task, evaluate_custom=evaluate_custom)
+    config = {"meta": {"max_workers": 1, "retry": {"backoff": 0, "run_task": {"max_attempts": 4}}}}
+    tasks = [
+        {"id": "flaky", "input": "flaky", "list": {"includes": ["a"]}, "custom": "evaluate_custom"},
+        {"id": "broken", "input": "broken", "list": {"includes": ["a"]}},
+        {"id": "limited", "input": "limited", "list": {"includes": ["a"]}},
+    ]
+    job = JobModel.find(JobModel.start("test-project"))
+
+    groups = [{"group_id": "g", "tasks": tasks}]
+    events, results = drain(JobScheduler(job, module, config).run(groups, 3))
+
+    rows = {t.challenge_id: t for t in TaskModel.list(job.id)}
+    assert rows["flaky"].status == TaskStatus.COMPLETED
+    assert rows["flaky"].task_attempts == 3
+    # The list evaluator once, the custom evaluator twice
+    assert rows["flaky"].eval_attempts == 3
+    # Not retryable: a single attempt
+    assert rows["broken"].status == TaskStatus.FAILED
+    assert rows["broken"].task_attempts == 1
+    assert rows["broken"].error == "bug"
+    # 429s are retried by the rate limiter only, not again by the policy
+    assert rows["limited"].status == TaskStatus.FAILED
+    assert rows["limited"].task_attempts == 1
+    assert calls["limited"] == MAX_RATE_LIMIT_RETRIES + 1
+
+
+def test_init_db_adds_missing_columns(tmp_path, monkeypatch):
+    """Databases created before a column was added are upgraded in place."""
+    import sqlite3
+
+    monkeypatch.chdir(tmp_path)
+    (tmp_path / ".multinear").mkdir()
+    connection = sqlite3.connect(tmp_path / ".multinear" / "multinear.db")
+    connection.execute("CREATE TABLE tasks (id VARCHAR PRIMARY KEY, job_id VARCHAR)")
+    connection.close()
+
+    monkeypatch.setattr(storage, "_SessionLocal", None)
+    monkeypatch.setattr(storage, "_engine", None)
+    storage.init_db()
+
+    connection = sqlite3.connect(tmp_path / ".multinear" / "multinear.db")
+    columns = {row[1] for row in connection.execute("PRAGMA table_info(tasks)")}
+    connection.close()
+    assert {"task_attempts", "eval_attempts", "eval_score"} <= columns
+
+
+def test_resume_and_rerun_failed(project_db):
+    """Only unfinished or failed tasks run again; finished results are carried over."""
+    inputs = []
+
+    def run_task(input):
+        inputs.append(input)
+        return {"output": [input], "details": {}}
+
+    module = make_module(run_task=run_task)
+    config = {"meta": {"max_workers": 2, "repeat": 2}}
+    tasks = [
+        {"id": f"t{i}", "input": "a" if i < 2 else "b", "list": {"includes": ["a"]}}
+        for i in range(3)
+    ]
+    groups = [{"group_id": "g", "tasks": tasks}]
+    job = JobModel.find(JobModel.start("test-project"))
+    drain(JobScheduler(job, module, config).run(groups, 6))
+    assert len(inputs) == 6
+
+    # Interrupt: t0 never ran, one repeat of t1 was still running
+    with storage.db_context() as db:
+        db.query(TaskModel).filter(TaskModel.challenge_id.in_(["t0", "t0_1"])).delete()
+        db.query(TaskModel).filter(TaskModel.challenge_id == "t1_1").update({"finished_at": None})
+        db.commit()
+
+    # A job still running can not be resumed
+    from fastapi import FastAPI
+    from fastapi.testclient import TestClient
+    from multinear.api.router import api_router
+
+    app = FastAPI()
+    app.include_router(api_router)
+    assert not job_stopped(JobModel.find(job.id))
+    response = TestClient(app).post(f"/api/jobs/test-project/{job.id}/resume")
+    assert response.status_code == 409
+    assert len(TaskModel.list(job.id)) == 4
+    job.update(status=TaskStatus.FAILED)
+    assert job_stopped(JobModel.find(job.id))
+
+    inputs.clear()
+    finished = prepare_resume(job.id)
+    assert sorted(finished) == ["t1", "t2", "t2_1"]
+    events, results = drain(JobScheduler(job, module, config).run(groups, 6, finished))
+    assert len(inputs) == 3
+    assert len(results) == 6
+    challenges = sorted(t.challenge_id for t in TaskModel.list(job.id))
+    assert challenges == ["t0", "t0_1", "t1", "t1_1", "t2", "t2_1"]
+    assert [e.type for e in events].count(EventType.CARRIED_OVER) == 3
+
+    # Both repeats of t2 failed: only they run again, in a new job
+    inputs.clear()
+    new_job = JobModel.find(JobModel.start("test-project"))
+    finished = prepare_rerun_failed(job.id, new_job.id)
+    assert sorted(finished) == ["t0", "t0_1", "t1", "t1_1"]
+    sink = JobStatusSink(new_job, min_interval=0)
+    bus = EventBus()
+    bus.subscribe(sink)
+    scheduler = JobScheduler(new_job, module, config, bus)
+    events, results = drain(scheduler.run(groups, 6, finished))
+    assert inputs == ["b", "b"]
+    assert len(TaskModel.list(new_job.id)) == 6
+    assert len(sink.status_map) == 6
+    summary = scheduler.get_group_summary("g")
+    assert (summary["finished"], summary["passed"], summary["failed"]) == (6, 4, 2)
+
+
+def test_output_cache(project_db):
+    """Cached outputs skip run_task until the code changes; hits are marked."""
+    runner = project_db / ".multinear" / "task_runner.py"
+    runner.write_text("def run_task(input):\n    return {'output': input}\n")
+    calls = []
+
+    def run_task(input):
+        calls.append(input)
+        return {"output": [input.upper()], "details": {"model": "m"}}
+
+    module = make_module(run_task=run_task)
+    config = {"meta": {"repeat": 2, "cache": {"max_entries": 4}}}
+    groups = [{"group_id": "g", "tasks": [
+        {"id": "t0", "input": "a", "list": {"includes": ["A"]}},
+        {"id": "t1", "input": "b", "list": {"includes": ["B"]}},
+    ]}]
+
+    def run(mode=None):
+        calls.clear()
+        cache = OutputCache.from_config(config, runner, project_db, mode)
+        if cache is not None:
+            cache.evict()
+        job = JobModel.find(JobModel.start("test-project"))
+        drain(JobScheduler(job, module, config, output_cache=cache).run(groups, 4))
+        return TaskModel.list(job.id)
+
+    assert OutputCache.from_config({"meta": {}}, runner, project_db) is None
+    run()
+    assert len(calls) == 4
+    tasks = run()
+    assert calls == []
+    assert all(t.task_details["cache"]["hit"] for t in tasks)
+    assert all(t.task_details["model"] == "m" for t in tasks)
+    assert all(t.eval_passed for t in tasks)
+
+    # Evicted down to max_entries: the least recently used output runs again
+    config["meta"]["cache"]["max_entries"] = 3
+    assert len(run()) == 4 and len(calls) == 1
+
+    assert len(run("refresh")) == 4 and len(calls) == 4
+    assert len(run("off")) == 4 and len(calls) == 4
+
+    # Changing the task runner invalidates its outputs
+    runner.write_text("def run_task(input):\n    return {'output': input * 2}\n")
+    tasks = run()
+    assert len(calls) == 4
+    assert not any("cache" in t.task_details for t in tasks)
+
+
+def test_reevaluate_stored_outputs(project_db):
+    """Re-evaluation scores the stored outputs under the new config, without run_task."""
+    calls = []
+
+    def run_task(input):
+        calls.append(input)
+        return {"output": [input.upper()], "details": {}}
+
+    tasks = [
+        {"id": "t0", "input": "a", "list": {"includes": ["A"]}},
+        {"id": "t1", "input": "b", "list": {"includes": ["B"]}},
+    ]
+    config = {"meta": {"repeat": 2}, "tasks": tasks}
+    source = JobModel.find(JobModel.start("test-project"))
+    drain(JobScheduler(source, make_module(run_task=run_task), config).run(
+        [{"group_id": "g", "tasks": tasks}], 4
+    ))
+    assert len(calls) == 4
+
+    # The checklist changed and a task was added, which has no stored output
+    tasks[1]["list"] = {"includes": ["C"]}
+    tasks.append({"id": "t2", "input": "c", "list": {"includes": ["C"]}})
+    (project_db / ".multinear" / "config.yaml").write_text(yaml.safe_dump(config))
+
+    calls.clear()
+    job = JobModel.find(JobModel.start("test-project"))
+    updates = list(reevaluate_experiment(
+        {"folder": str(project_db)}, job, source.id, sinks=[JobStatusSink(job)]
+    ))
+    assert updates[-1]["status"] == "completed"
+    assert calls == []
+    results = {t.challenge_id: t for t in TaskModel.list(job.id)}
+    assert sorted(results) == ["t0", "t0_1", "t1", "t1_1"]
+    assert results["t0"].eval_passed and not results["t1"].eval_passed
+    assert results["t1_1"].task_output == ["B"]
+    assert results["t0"].task_details["reevaluated_from"]["job_id"] == source.id
+    assert JobModel.find(job.id).details["reevaluated_from"] == source.id
+
+
+def test_reuse_evaluations(project_db, monkeypatch):
+    """Identical outputs under the same spec take the latest evaluation."""
+    judged = []
+    evaluate = run_group.evaluate
+
+    def counting_evaluate(spec, input, output, *args, **kwargs):
+        judged.append(output)
+        return evaluate(spec, input, output, *args, **kwargs)
+
+    monkeypatch.setattr(run_group, "evaluate", counting_evaluate)
+    outputs = {"a": ["A"], "b": ["B"]}
+    module = make_module(run_task=lambda input: {"output": outputs[input]})
+    tasks = [
+        {"id": "t0", "input": "a", "list": {"includes": ["A"]}},
+        {"id": "t1", "input": "b", "list": {"includes": ["B"]}},
+    ]
+    config = {"meta": {"reuse_evaluations": True}}
+    groups = [{"group_id": "g", "tasks": tasks}]
+
+    def run():
+        judged.clear()
+        job = JobModel.find(JobModel.start("test-project"))
+        drain(JobScheduler(job, module, config).run(groups, 2))
+        return {t.challenge_id: t for t in TaskModel.list(job.id)}
+
+    first = run()
+    assert len(judged) == 2
+
+    # Only the changed output is judged again
+    outputs["b"] = ["C"]
+    second = run()
+    assert judged == [["C"]]
+    assert second["t0"].eval_passed and not second["t1"].eval_passed
+    assert second["t0"].eval_details["reused"]["task_id"] == first["t0"].id
+    assert "reused" not in second["t1"].eval_details
+
+    # A changed spec is judged again
+    tasks[0]["list"] = {"includes": ["B"]}
+    assert not run()["t0"].eval_passed
+    assert judged == [["A"]]
+
+    indexes = sqlalchemy.inspect(storage._engine).get_indexes("tasks")
+    assert any(i["column_names"] == ["eval_key", "evaluated_at"] for i in indexes)
+
+
+def test_task_timeouts(project_db):
+    """Timed-out stages get the TIMEOUT status; late results are not recorded."""
+    called = []
+
+    def run_task(input):
+        called.append(input)
+        if input == "slow":
+            time.sleep(1)
+        return {"output": [input]}
+
+    # The tasks behind the slow one wait for its thread, not for their timeout
+    config = {"meta": {"max_workers": 1, "timeout": 0.3}}
+    tasks = [{"id": "slow", "input": "slow", "list": {"includes": ["slow"]}}] + [
+        {"id": f"f{i}", "input": f"f{i}", "list": {"includes": [f"f{i}"]}}
+        for i in range(3)
+    ]
+    job = JobModel.find(JobModel.start("test-project"))
+    events, results = drain(JobScheduler(job, make_module(run_task=run_task), config).run(
+        [{"group_id": "g", "tasks": tasks}], 4
+    ))
+
+    assert sorted(called) == ["f0", "f1", "f2", "slow"]
+    statuses = {t.challenge_id: t.status for t in TaskModel.list(job.id)}
+    assert statuses == {
+        "slow": TaskStatus.TIMEOUT,
+        "f0": TaskStatus.COMPLETED,
+        "f1": TaskStatus.COMPLETED,
+        "f2": TaskStatus.COMPLETED,
+    }
+    assert [e.type for e in events].count(EventType.TIMED_OUT) == 1
+    slow = next(t for t in TaskModel.list(job.id) if t.challenge_id == "slow")
+    assert "run_task timed out" in slow.error and slow.task_output is None
+
+    task = {"timeout": {"evaluators": 30}}
+    assert get_timeouts(task, config) == {"run_task": 0.3, "evaluators": 30}
+
+
+def test_cancel_job(project_db):
+    """A cancelled job drains the tasks in flight and starts no new ones."""
+    job = JobModel.find(JobModel.start("test-project"))
+    started = []
+
+    def run_task(input):
+        started.append(input)
+        if len(started) == 1:
+            assert JobModel.request_cancel(job.id)
+            time.sleep(1.5)  # Until the scheduler polls the request
+        return {"output": [input]}
+
+    tasks = [
+        {"id": f"t{i}", "input": str(i), "list": {"includes": [str(i)]}}
+        for i in range(5)
+    ]
+    scheduler = JobScheduler(job, make_module(run_task=run_task), {"meta": {}})
+    events, results = drain(scheduler.run([{"group_id": "g", "tasks": tasks}], 5))
+
+    assert scheduler.stopped and scheduler.stop_reason == "cancelled"
+    assert len(started) == 1 and scheduler.skipped_tasks == 4
+    assert len(results) == 1 and results[0][1]["passed"]
+    assert len(TaskModel.list(job.id)) == 1
+
+    job.finish()
+    assert not JobModel.request_cancel(job.id)
+
+
+def test_early_stop_sequential_test():
+    """The pass rate test decides once the evidence reaches the confidence."""
+    above = EarlyStop(min_tasks=5, target_pass_rate=0.5, confidence=0.9, margin=0.2)
+    reasons = [above.observe(True) for _ in range(20)]
+    decided = next(i for i, reason in enumerate(reasons) if reason)
+    assert decided >= 4 and all(r is None for r in reasons[decided + 1:])
+    assert above.decision["direction"] == "above"
+
+    below = EarlyStop(min_tasks=1, target_pass_rate=0.5, confidence=0.9, margin=0.2)
+    assert any(below.observe(i % 5 == 0) for i in range(50))
+    assert below.decision["direction"] == "below"
+
+    undecided = EarlyStop(min_tasks=1, target_pass_rate=0.5, confidence=0.99, margin=0.05)
+    assert not any(undecided.observe(i % 2 == 0) for i in range(50))
+
+
+def test_scheduler_early_stop(project_db):
+    """Past the failure rate, the job stops scheduling and reports why."""
+    started = []
+
+    def run_task(input):
+        started.append(input)
+        return {"output": ["wrong"]}
+
+    tasks = [
+        {"id": f"t{i}", "input": str(i), "list": {"includes": ["right"]}}
+        for i in range(20)
+    ]
+    config = {"meta": {"early_stop": {"min_tasks": 3, "max_failure_rate": 0.5, "seed": 1}}}
+    job = JobModel.find(JobModel.start("test-project"))
+    scheduler = JobScheduler(job, make_module(run_task=run_task), config)
+    events, _ = drain(scheduler.run([{"group_id": "g", "tasks": tasks}], 20))
+
+    assert scheduler.early_stop.decision["rule"] == "failure_rate"
+    assert "after 3 tasks" in scheduler.stop_reason
+    assert len(started) <= 5
+    assert scheduler.skipped_tasks == 20 - len(started)
+    # The group still finishes, without its skipped tasks
+    finished = [e for e in events if e.type == EventType.GROUP_FINISHED]
+    assert len(finished) == 1
+    assert finished[0].summary["finished"] == len(started)
+    assert finished[0].summary["total"] == 20
+    # Tasks ran in random order
+    assert started != [str(i) for i in range(len(started))]
+
+
+def test_adaptive_repeats(project_db):
+    """Repeats stop once a task's score converges; noisy tasks use up to max."""
+    calls = {"stable": 0, "noisy": 0}
+
+    def run_task(input):
+        calls[input] += 1
+        if input == "noisy":
+            return {"output": ["A" if calls[input] % 2 else "B"]}
+        return {"output": ["A"]}
+
+    tasks = [
+        {"id": "stable", "input": "stable", "list": {"includes": ["A"]}},
+        {"id": "noisy", "input": "noisy", "list": {"includes": ["A"]}},
+    ]
+    config = {"meta": {
+        "max_workers": 4,
+        "repeat": {"min": 2, "max": 6, "target_ci": 0.1},
+    }}
+    assert run_group.get_repeats(tasks[0], config)["adaptive"]
+    assert run_group.get_repeats({"repeat": 3}, config)["max"] == 3
+
+    job = JobModel.find(JobModel.start("test-project"))
+    bus = EventBus()
+    scheduler = JobScheduler(job, make_module(run_task=run_task), config, bus)
+    events, results = drain(scheduler.run([{"group_id": "g", "tasks": tasks}], 12))
+
+    assert calls == {"stable": 2, "noisy": 6}
+    assert scheduler.saved_repeats == 4
+    assert len(results) == 8
+    group_finished = [e for e in events if e.type == EventType.GROUP_FINISHED]
+    assert len(group_finished) == 1 and group_finished[0].summary["total"] == 8
+    assert JobModel.find(job.id).details["saved_repeats"] == 4
+
+
+def test_sharded_run_and_merge(project_db, tmp_path, monkeypatch):
+    """Shards partition the tasks; merging them gives one job with all tasks."""
+    tasks = [
+        {"id": f"t{i}", "input": str(i), "list": {"includes": [str(i % 3)]}}
+        for i in range(12)
+    ]
+    config = {
+        "meta": {"repeat": 2},
+        "groups": [{"id": "a", "tasks": tasks[:6]}, {"id": "b", "tasks": tasks[6:]}],
+    }
+    groups = [{"group_id": g["id"], "tasks": g["tasks"]} for g in config["groups"]]
+    shards = [select_shard(groups, index, 3) for index in (1, 2, 3)]
+    ids = [t["id"] for shard in shards for group in shard for t in group["tasks"]]
+    assert sorted(ids) == sorted(t["id"] for t in tasks)
+    assert select_shard(groups, 2, 3) == shards[1]
+    with pytest.raises(ValueError):
+        parse_shard("4/3")
+
+    def use_project(folder):
+        (folder / ".multinear").mkdir(parents=True, exist_ok=True)
+        (folder / ".multinear" / "config.yaml").write_text(yaml.safe_dump(config))
+        (folder / ".multinear" / "task_runner.py").write_text(
+            "def run_task(input):\n    return {'output': [input]}\n"
+        )
+        monkeypatch.chdir(folder)
+        storage._SessionLocal = None
+        storage.init_db()
+        storage.ProjectModel.save(
+            id="test-project", name="Test", description="", folder=str(folder)
+        )
+
+    # Each shard runs in its own checkout, with its own database
+    exports = []
+    for index in (1, 2, 3):
+        use_project(tmp_path / f"shard{index}")
+        job = JobModel.find(JobModel.start("test-project", "sharded-job"))
+        updates = list(run_experiment(
+            {"folder": str(tmp_path / f"shard{index}")}, job,
+            sinks=[JobStatusSink(job)], shard=(index, 3),
+        ))
+        assert updates[-1]["status"] == "completed"
+        job.finish()
+        exports.append(export_job(JobModel.find(job.id)))
+        assert len(exports[-1]["tasks"]) == 2 * sum(
+            len(group["tasks"]) for group in shards[index - 1]
+        )
+
+    use_project(tmp_path / "merged")
+    job = merge_shards(exports, "test-project", config)
+    merged = TaskModel.list(job.id)
+    assert job.id == "sharded-job" and job.status == "completed"
+    assert len(merged) == 24
+    assert sorted(t.task_number for t in merged) == list(range(1, 25))
+    groups = JobModel.find(job.id).details["groups"]
+    assert groups["a"]["total"] == groups["b"]["total"] == 12
+    assert (groups["a"]["passed"], groups["b"]["passed"]) == (6, 0)
+    assert groups["a"]["score"] == 0.5
+    assert JobModel.find(job.id).total_tasks == 24
+
+    # Merging again is idempotent
+    merge_shards(exports, "test-project", config)
+    assert len(TaskModel.list(job.id)) == 24
+
+
+def test_queue_workers(project_db):
+    """Workers pull queued tasks; expired leases of a crashed worker are re-queued."""
+    (project_db / ".multinear" / "task_runner.py").write_text(
+        "def run_task(input):\n    return {'output': [input]}\n"
+    )
+    tasks = [
+        {"id": f"t{i}", "input": str(i), "list": {"includes": ["0"]}} for i in range(5)
+    ]
+    config = {
+        "meta": {"repeat": 2, "queue": True},
+        "groups": [{"id": "a", "tasks": tasks[:2]}, {"id": "b", "tasks": tasks[2:]}],
+    }
+    project = {"folder": str(project_db)}
+    job = JobModel.find(JobModel.start("test-project"))
+    assert enqueue_job(job, select_tasks(config), config) == 5
+    assert JobModel.find(job.id).total_tasks == 10
+
+    # A worker leases two tasks and dies without a heartbeat
+    crashed = QueueItemModel.lease("crashed", 2, lease_seconds=0.05)
+    assert [item.task["id"] for item in crashed] == ["t0", "t1"]
+    assert len(QueueItemModel.lease("other", 5, lease_seconds=60)) == 3
+    assert QueueItemModel.lease("other", 5, lease_seconds=60) == []
+    time.sleep(0.1)
+
+    # The leases of "other" are still valid: only the crashed worker's tasks run
+    ran = run_worker(project, config, exit_when_idle=True)
+    assert ran == 4
+    assert JobModel.find(job.id).finished_at is None
+    assert QueueItemModel.count_open(job.id) == 3
+
+    # Two workers share the rest once "other" disappears as well
+    with storage.db_context() as db:
+        db.query(QueueItemModel).update({QueueItemModel.lease_expires_at: 0.0})
+        db.commit()
+    counts = []
+    threads = [
+        threading.Thread(target=lambda: counts.append(
+            run_worker(project, config, batch_size=1, exit_when_idle=True)
+        ))
+        for _ in range(2)
+    ]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert sum(counts) == 6
+
+    job = JobModel.find(job.id)
+    assert job.status == "completed" and job.finished_at is not None
+    results = TaskModel.list(job.id)
+    assert sorted(t.task_number for t in results) == list(range(1, 11))
+    assert job.details["groups"]["a"] == {
+        "total": 4, "finished": 4, "passed": 2, "failed": 2, "errors": 0, "score": 0.5,
+    }
+    assert job.details["groups"]["b"]["total"] == 6
+    # Progress is followed from the latest finished task on
+    latest = TaskModel.list_finished(job.id)[-1]
+    since = [t.id for t in TaskModel.list_finished(job.id, since=latest.finished_at)]
+    assert latest.id in since and len(since) < 10
+
+
+def test_worker_heartbeat_survives_errors(project_db, monkeypatch):
+    """A failed heartbeat is reported and the next ones are still sent."""
+    (project_db / ".multinear" / "task_runner.py").write_text(
+        "import time\n"
+        "def run_task(input):\n    time.sleep(0.3)\n    return {'output': [input]}\n"
+    )
+    config = {"meta": {"queue": True}, "tasks": [{"id": "t0", "input": "a"}]}
+    job = JobModel.find(JobModel.start("test-project"))
+    enqueue_job(job, select_tasks(config), config)
+
+    beats = []
+    heartbeat = QueueItemModel.heartbeat
+
+    def flaky_heartbeat(*args):
+        beats.append(args)
+        if len(beats) == 1:
+            raise sqlalchemy.exc.OperationalError("UPDATE", {}, Exception("database is locked"))
+        heartbeat(*args)
+
+    monkeypatch.setattr(QueueItemModel, "heartbeat", flaky_heartbeat)
+    ran = run_worker(
+        {"folder": str(project_db)}, config, lease_seconds=0.15, exit_when_idle=True
+    )
+    assert ran == 1
+    assert len(beats) >= 3
+    assert JobModel.find(job.id).status == "completed"
+
+
+def test_run_queued_job(project_db):
+    """A queued run only enqueues its tasks and reports the workers' progress."""
+    (project_db / ".multinear" / "task_runner.py").write_text(
+        "def run_task(input):\n    return {'output': [input]}\n"
+    )
+    config = {
+        "meta": {"queue": True},
+        "tasks": [{"id": "t0", "input": "a", "list": {"includes": ["a"]}}],
+    }
+    (project_db / ".multinear" / "config.yaml").write_text(yaml.safe_dump(config))
+    project = {"folder": str(project_db)}
+    stop = threading.Event()
+    worker = threading.Thread(
+        target=run_worker, args=(project, config), kwargs={"poll_interval": 0.05, "stop": stop}
+    )
+    worker.start()
+    try:
+        job = JobModel.find(JobModel.start("test-project"))
+        updates = list(run_experiment(project, job, sinks=[JobStatusSink(job)]))
+    finally:
+        stop.set()
+        worker.join()
+    assert updates[-1]["status"] == "completed"
+    assert [u["event"] for u in updates if u.get("event")] == ["evaluated", "finished"]
+    assert JobModel.find(job.id).details["status_map"] == {
+        t.id: "completed" for t in TaskModel.list(job.id)
+    }
+
+
+def test_run_queued_generated_tasks(project_db):
+    """Tasks yielded by generate_tasks are queued for the workers too."""
+    (project_db / ".multinear" / "task_runner.py").write_text(
+        "def generate_tasks(config):\n"
+        "    for locale in ('en', 'fr'):\n"
+        "        yield {'id': locale, 'input': locale, 'list': {'includes': [locale]}}\n"
+        "def run_task(input):\n    return {'output': [input]}\n"
+    )
+    config = {"meta": {"queue": True}}
+    (project_db / ".multinear" / "config.yaml").write_text(yaml.safe_dump(config))
+    project = {"folder": str(project_db)}
+    stop = threading.Event()
+    worker = threading.Thread(
+        target=run_worker, args=(project, config), kwargs={"poll_interval": 0.05, "stop": stop}
+    )
+    worker.start()
+    try:
+        job = JobModel.find(JobModel.start("test-project"))
+        updates = list(run_experiment(project, job, sinks=[JobStatusSink(job)]))
+    finally:
+        stop.set()
+        worker.join()
+    assert updates[-1]["status"] == "completed" and updates[-1]["total"] == 2
+    assert sorted(t.challenge_id for t in TaskModel.list(job.id) if t.eval_passed) == [
+        "en", "fr",
+    ]
+
+
+def test_longest_tasks_first(project_db):
+    """Tasks start longest first by their recent durations; unseen ones in the middle."""
+    delays = {"fast": 0.0, "medium": 0.05, "slow": 0.1}
+    started = []
+
+    def run_task(input):
+        started.append(input)
+        time.sleep(delays.get(input, 0.0))
+        return {"output": [input]}
+
+    module = make_module(run_task=run_task)
+    config = {"meta": {"max_workers": 1, "schedule": "history"}}
+
+    def run(inputs):
+        started.clear()
+        groups = [{"group_id": "g", "tasks": [
+            {"id": name, "input": name, "list": {"includes": [name]}} for name in inputs
+        ]}]
+        job = JobModel.find(JobModel.start("test-project"))
+        drain(JobScheduler(job, module, config).run(groups, len(inputs)))
+        return list(started)
+
+    # No history yet: config order
+    assert run(["fast", "medium", "slow"]) == ["fast", "medium", "slow"]
+    # "new" is predicted to take the median ("medium"), and comes first in the config
+    assert run(["fast", "new", "slow", "medium"]) == ["slow", "new", "medium", "fast"]
+
+    # Config order by default
+    del config["meta"]["schedule"]
+    assert run(["fast", "slow"]) == ["fast", "slow"]
+
+    group = {"executions": []}
+    assert longest_first([("g", group)], {"a": 1.0}) == [("g", group)]
+
+
+def test_task_sources(project_db):
+    """Groups stream their tasks from JSONL and CSV files, filtered lazily."""
+    data = project_db / "data"
+    data.mkdir()
+    (data / "qa.jsonl").write_text("".join(
+        json.dumps({"qid": i, "question": f"q{i}", "tag": "x"}) + "\n" for i in range(6)
+    ))
+    (data / "qa.csv").write_text("question,expected\nc0,c0\nc1,other\n")
+    config = {
+        "meta": {"repeat": 2},
+        "groups": [
+            {"id": "jsonl", "source": {
+                "path": "data/qa.jsonl", "input_field": "question", "id_field": "qid",
+                "defaults": {"list": {"includes": ["q1"]}},
+            }},
+            {"id": "csv", "source": {"path": "data/qa.csv", "input_field": "question"}},
+        ],
+    }
+    groups = select_tasks(config, base_path=project_db)
+    assert all(isinstance(group["tasks"], TaskSource) for group in groups)
+    assert list(groups[0]["tasks"])[1] == {
+        "id": "1", "input": "q1", "tag": "x", "list": {"includes": ["q1"]},
+    }
+    assert groups[1]["tasks"].count() == 2
+    # A lazy task type that does not produce tasks fails when created
+    with pytest.raises(TypeError):
+        type("Broken", (LazyTasks,), {})()
+
+    # Filters by group and challenge stay lazy
+    only = select_tasks(config, challenge_id="3_1", group_id="jsonl", base_path=project_db)
+    assert [task["id"] for task in only[0]["tasks"]] == ["3"]
+    shard = select_shard(groups, 1, 2)
+    assert isinstance(shard[0]["tasks"], TaskSource)
+
+    (project_db / ".multinear" / "config.yaml").write_text(yaml.safe_dump(config))
+    (project_db / ".multinear" / "task_runner.py").write_text(
+        "def run_task(input):\n    return {'output': [input]}\n"
+    )
+    job = JobModel.find(JobModel.start("test-project"))
+    updates = list(run_experiment(
+        {"folder": str(project_db)}, job, group_id="jsonl", sinks=[JobStatusSink(job)]
+    ))
+    assert updates[-1]["status"] == "completed" and updates[-1]["total"] == 12
+    results = TaskModel.list(job.id)
+    assert len(results) == 12
+    assert sorted(t.challenge_id for t in results if t.eval_passed) == ["1", "1_1"]
+    summary = JobModel.find(job.id).details["groups"]["jsonl"]
+    assert summary["total"] == 12 and summary["passed"] == 2
+
+
+def test_scheduler_streams_with_bounded_lookahead(project_db):
+    """Streamed tasks are read only a bounded number of challenges ahead."""
+    read = []
+
+    class Stream:
+        def __iter__(self):
+            for i in range(40):
+                read.append(i)
+                yield {"id": f"t{i}", "input": str(i), "list": {"includes": [str(i)]}}
+
+    seen = []
+
+    def run_task(input):
+        seen.append(len(read))
+        return {"output": [input]}
+
+    job = JobModel.find(JobModel.start("test-project"))
+    config = {"meta": {"max_workers": 1}}
+    events, results = drain(JobScheduler(job, make_module(run_task=run_task), config).run(
+        [{"group_id": "g", "tasks": Stream()}], 40
+    ))
+    assert len(results) == 40 and all(r[1]["passed"] for r in results)
+    # One execution slot: at most 4 challenges are read ahead
+    assert max(count - n for n, count in enumerate(seen)) <= 5
+    finished = [e for e in events if e.type == EventType.GROUP_FINISHED]
+    assert len(finished) == 1 and finished[0].summary["total"] == 40
+
+
+def test_scheduler_stops_reading_streams_early(project_db):
+    """Streamed tasks are read off the event loop, and no longer once the job stops."""
+    read, threads = [], set()
+
+    class Stream:
+        def __iter__(self):
+            for i in range(200):
+                read.append(i)
+                threads.add(threading.get_ident())
+                yield {"id": f"t{i}", "input": str(i), "list": {"includes": ["right"]}}
+
+    loop_threads = set()
+
+    async def run_task(input):
+        loop_threads.add(threading.get_ident())
+        return {"output": ["wrong"]}
+
+    config = {"meta": {"max_workers": 1, "early_stop": {"min_tasks": 3, "max_failure_rate": 0.5}}}
+    job = JobModel.find(JobModel.start("test-project"))
+    scheduler = JobScheduler(job, make_module(run_task=run_task), config)
+    events, _ = drain(scheduler.run([{"group_id": "g", "tasks": Stream()}], None))
+    assert scheduler.stop_reason is not None
+    assert len(read) < 20
+    assert loop_threads and not loop_threads & threads
+    finished = [e for e in events if e.type == EventType.GROUP_FINISHED]
+    assert len(finished) == 1 and finished[0].summary["total"] == len(read)
+
+
+def test_streamed_early_stop_summary(project_db):
+    """A source stopped early reports the tasks that ran, not the rows never read."""
+    data = project_db / "data"
+    data.mkdir()
+    (data / "qa.jsonl").write_text("".join(
+        json.dumps({"input": f"q{i}"}) + "\n" for i in range(300)
+    ))
+    config = {
+        "meta": {"max_workers": 1, "early_stop": {"min_tasks": 3, "max_failure_rate": 0.5}},
+        "groups": [{"id": "qa", "source": {
+            "path": "data/qa.jsonl", "defaults": {"list": {"includes": ["x"]}},
+        }}],
+    }
+    (project_db / ".multinear" / "config.yaml").write_text(yaml.safe_dump(config))
+    (project_db / ".multinear" / "task_runner.py").write_text(
+        "def run_task(input):\n    return {'output': ['wrong']}\n"
+    )
+    job = JobModel.find(JobModel.start("test-project"))
+    updates = list(run_experiment({"folder": str(project_db)}, job))
+
+    # Not read in full up front
+    assert updates[0]["total"] is None
+    final = updates[-1]
+    ran = len(TaskModel.list(job.id))
+    assert final["status"] == "completed" and ran < 20
+    assert final["summary"]["finished"] == final["current"] == ran
+    assert final["total"] == ran + final["summary"]["skipped"]
+
+
+def test_generated_tasks(project_db):
+    """Tasks yielded by generate_tasks start running before all are generated."""
+    config = {"meta": {"max_workers": 1, "repeat": 2}}
+    (project_db / ".multinear" / "config.yaml").write_text(yaml.safe_dump(config))
+    (project_db / ".multinear" / "task_runner.py").write_text(
+        "GENERATED = []\n"
+        "def generate_tasks(config):\n"
+        "    for locale in ('en', 'fr', 'de', 'es', 'it', 'pt', 'nl', 'pl', 'sv', 'fi'):\n"
+        "        GENERATED.append(locale)\n"
+        "        yield {'id': 'greet-' + locale, 'input': locale,\n"
+        "               'list': {'includes': [locale]}}\n"
+        "def run_task(input):\n"
+        "    return {'output': [input, str(len(GENERATED))]}\n"
+    )
+    job = JobModel.find(JobModel.start("test-project"))
+    updates = list(run_experiment(
+        {"folder": str(project_db)}, job, sinks=[JobStatusSink(job)]
+    ))
+    assert updates[0]["total"] is None
+    assert updates[-1]["status"] == "completed" and updates[-1]["total"] == 20
+    tasks = sorted(TaskModel.list(job.id), key=lambda t: t.task_number)
+    assert len(tasks) == 20 and all(t.eval_passed for t in tasks)
+    # The first task ran while the generator was still yielding
+    assert int(tasks[0].task_output[1]) < 10
+    job = JobModel.find(job.id)
+    assert job.total_tasks == 20 and job.details["groups"]["generated"]["passed"] == 20
+
+    only = list(run_experiment(
+        {"folder": str(project_db)}, JobModel.find(JobModel.start("test-project")),
+        challenge_id="greet-fr", group_id="generated",
+    ))
+    assert only[-1]["status"] == "completed" and only[-1]["total"] == 2
+
+
+def test_batched_run_tasks(project_db):
+    """run_tasks gets the inputs in flight in batches, and each task its own result."""
+    batches = []
+
+    def run_tasks(inputs):
+        batches.append(list(inputs))
+        return [
+            ValueError("bad input") if input == "bad" else {"output": [input]}
+            for input in inputs
+        ]
+
+    names = ["a", "b", "c", "d", "e", "bad", "f"]
+    groups = [{"group_id": "g", "tasks": [
+        {"id": name, "input": name, "list": {"includes": [name]}} for name in names
+    ]}]
+    config = {"meta": {"max_workers": 4, "batch_size": 3, "batch_wait": 0.05}}
+    job = JobModel.find(JobModel.start("test-project"))
+    scheduler = JobScheduler(job, make_module(run_tasks=run_tasks), config)
+    events, results = drain(scheduler.run(groups, len(names)))
+
+    assert sorted(sum(batches, [])) == sorted(names)
+    assert max(len(batch) for batch in batches) == 3 and len(batches) < len(names)
+    passed = {t.challenge_id: t.eval_passed for t in TaskModel.list(job.id)}
+    assert passed.pop("bad") is None and all(passed.values())
+    assert sum(1 for e in events if e.type == EventType.FAILED) == 1
+
+    # A failing batch fails each of its tasks, retried on their own
+    calls = []
+
+    async def flaky(inputs):
+        calls.append(len(inputs))
+        if len(calls) == 1:
+            raise ConnectionError("server busy")
+        return [{"output": [input]} for input in inputs]
+
+    config["meta"]["retry"] = {"max_attempts": 2, "backoff": 0}
+    job = JobModel.find(JobModel.start("test-project"))
+    drain(JobScheduler(job, make_module(run_tasks=flaky), config).run(groups[:1], len(names)))
+    assert all(t.eval_passed or t.challenge_id == "bad" for t in TaskModel.list(job.id))
+    assert len(calls) > 1
+
+
+def test_worker_state(project_db):
+    """init_worker gives each worker its own state, torn down by end_worker."""
+    created, ended = [], []
+
+    def init_worker():
+        state = {"thread": threading.get_ident(), "calls": 0}
+        created.append(state)
+        return state
+
+    def run_task(input, state):
+        # Never shared by two threads
+        assert state["thread"] == threading.get_ident()
+        state["calls"] += 1
+        time.sleep(0.01)
+        return {"output": [input]}
+
+    groups = [{"group_id": "g", "tasks": [
+        {"id": str(i), "input": str(i), "list": {"includes": [str(i)]}} for i in range(12)
+    ]}]
+    def end_worker(state):
+        # On the thread that owns the state
+        assert state["thread"] == threading.get_ident()
+        ended.append(state)
+
+    config = {"meta": {"max_workers": 3}}
+    module = make_module(init_worker=init_worker, run_task=run_task, end_worker=end_worker)
+    job = JobModel.find(JobModel.start("test-project"))
+    _, results = drain(JobScheduler(job, module, config).run(groups, 12))
+    assert all(r[1]["passed"] for r in results)
+    assert 1 <= len(created) <= 3 and sum(s["calls"] for s in created) == 12
+    assert sorted(map(id, ended)) == sorted(map(id, created))
+
+    # The state of a thread still running a timed-out task ends once it returns
+    created.clear()
+    ended.clear()
+
+    def slow_task(input, state):
+        if input == "0":
+            time.sleep(0.5)
+        return run_task(input, state)
+
+    config = {"meta": {"max_workers": 2, "timeout": 0.2}}
+    module = make_module(init_worker=init_worker, run_task=slow_task, end_worker=end_worker)
+    job = JobModel.find(JobModel.start("test-project"))
+    drain(JobScheduler(job, module, config).run(groups[:1], 12))
+    time.sleep(0.5)
+    assert sorted(map(id, ended)) == sorted(map(id, created))
+
+    # Async task runners share one state on the event loop
+    created.clear()
+
+    async def init_async():
+        return {"client": object()}
+
+    async def run_async(input, state):
+        created.append(state["client"])
+        return {"output": [input]}
+
+    job = JobModel.find(JobModel.start("test-project"))
+    drain(JobScheduler(
+        job, make_module(init_worker=init_async, run_task=run_async), config
+    ).run(groups, 12))
+    assert len(created) == 12 and len(set(map(id, created))) == 1
+
+
+def test_output_capture_per_task():
+    """Concurrent captures, in threads and asyncio tasks, get only their own output."""
+    logger = logging.getLogger("task")
+    logger.setLevel(logging.INFO)
+    barrier = threading.Barrier(4)
+    captured = {}
+
+    def task(name):
+        with OutputCapture() as capture:
+            barrier.wait()
+            for step in range(3):
+                print(f"{name} step {step}")
+                logger.info(f"{name} logged {step}")
+                time.sleep(0.001)
+        captured[name] = capture.logs
+
+    threads = [threading.Thread(target=task, args=(f"t{i}",)) for i in range(4)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    async def async_task(name):
+        with OutputCapture() as capture:
+            for step in range(3):
+                print(f"{name} step {step}")
+                logger.info(f"{name} logged {step}")
+                await asyncio.sleep(0.001)
+        captured[name] = capture.logs
+
+    async def run_all():
+        await asyncio.gather(*(async_task(f"a{i}") for i in range(4)))
+
+    asyncio.run(run_all())
+
+    for name, logs in captured.items():
+        assert [log["message"].split()[0] for log in logs] == [name] * 6
+        assert [log["level"] for log in logs] == ["PRINT", "INFO"] * 3
+    # A nested capture restores the enclosing one on exit
+    with OutputCapture() as outer:
+        print("outer")
+        with OutputCapture() as inner:
+            print("inner")
+        print("outer again")
+    assert [log["message"] for log in outer.logs] == ["outer", "outer again"]
+    assert [log["message"] for log in inner.logs] == ["inner"]